@@ -2,8 +2,9 @@
 
 
 from .step import get_action, Step, StepPlan, get_registered_actions, clear_registered_actions
-from .observer import Observer, merge_plan, get_observer
+from .observer import Observer, ObserverHost, merge_plan, get_observer
 
-from .utils import smart_launch, smart_run, create_dispatcher, detect_observer, detect_action
+from .utils import smart_launch, smart_run, smart_submit, create_dispatcher, detect_observer, detect_action, \
+    async_smart_run, async_dispatch
 
 __version__ = '0.1.3'
@@ -1,8 +1,18 @@
 # coding: utf-8
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
 from logging import Logger, getLogger
 from typing import Any, Dict, List, Deque, Callable, Literal, Tuple, Optional, Type, Union
 
 from observer_toolkit import Step, StepPlan
+from observer_toolkit.step import get_action_generation
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 OBSERVER_EXECUTE_STATUS = Literal[-1, 0, 1]
 """status of observer execute"""
@@ -24,6 +34,16 @@ OBSERVER_TRIGGER_STATUS_MAPPER = {
 GLOBAL_OBSERVER_CLASS_MAPPER: Dict[str, Type['Observer']] = {}
 """global observer mapper."""
 
+MERGED_PLAN_CACHE_SIZE = 128
+"""max number of cached plans of merge_plan."""
+_MERGED_PLAN_CACHE: 'OrderedDict[tuple, Tuple[tuple, StepPlan]]' = OrderedDict()
+_MERGED_PLAN_CACHE_LOCK = threading.Lock()
+
+OBSERVER_HOST_NAME = 'ObserverHost'
+"""default action name of ObserverHost."""
+FRAME_ID_KEY = 'frame_id'
+"""key of frame id in parameter, set by the runs of plans (``PlanRun``)."""
+
 # TODO:
 SUPER_NAMES = ['Observer', 'BaseObserver', 'ObserverMeta', 'JudgeMixin', 'TriggerMixin']
 """Fixed names of observer super class."""
@@ -81,39 +101,284 @@ class BaseObserver(object, metaclass=ObserverMeta):
     logger: Logger
 
 
-class SlidingWindowDeque(Deque[bool]):
+class SlidingWindowDeque(object):
+    """滑动窗口 - 环形数组, 统计量增量更新, 所有操作均为O(1)
+
+    除窗口中True的比例外, 还统计连续True的长度, 判断结果的指数加权平均, 以及时间窗口中True的比例.
+    """
+
+    def __init__(self, maxlen: int = 10, ewma_alpha: float = 0.2, time_window: Optional[float] = None):
+        """
+        Args:
+            maxlen: 窗口长度
+            ewma_alpha: 指数加权平均的系数
+            time_window: 时间窗口(秒), None则不统计
+        """
+        assert maxlen > 0, f'maxlen {maxlen} must be positive.'
+        self.maxlen = maxlen
+        self.ewma_alpha = ewma_alpha
+        self.time_window = time_window
+
+        # epoch * 2 + value, the slots of earlier epochs are the fill value, so refill is O(1).
+        self._slots = array('q', bytes(8 * maxlen))
+        self._epoch = 0
+        self._fill_value = False
+        self._index = 0
+
+        self.true_count = 0
+        """窗口中True的数量"""
+        self.current_run = 0
+        """当前连续True的长度"""
+        self.longest_run = 0
+        """填充后最长连续True的长度"""
+        self.ewma = 0.0
+        """判断结果的指数加权平均"""
+
+        self._time_deque: Deque[Tuple[float, bool]] = deque()
+        self._time_true_count = 0
 
-    def __init__(self, maxlen: int = 10):
-        super().__init__(maxlen=maxlen)
         self.refill()
 
+    def __len__(self):
+        return self.maxlen
+
+    def __iter__(self):
+        """从旧到新"""
+        return (self._slot_value((self._index + offset) % self.maxlen) for offset in range(self.maxlen))
+
+    def _slot_value(self, index: int) -> bool:
+        slot = self._slots[index]
+        return bool(slot & 1) if slot >> 1 == self._epoch else self._fill_value
+
+    def append(self, value: bool) -> None:
+        """添加判断结果"""
+        value = bool(value)
+
+        self.true_count += value - self._slot_value(self._index)
+        self._slots[self._index] = self._epoch * 2 + value
+        self._index = (self._index + 1) % self.maxlen
+
+        self.current_run = self.current_run + 1 if value else 0
+        self.longest_run = max(self.longest_run, self.current_run)
+        self.ewma += self.ewma_alpha * (value - self.ewma)
+
+        if self.time_window is not None:
+            now = time.time()
+            self._time_deque.append((now, value))
+            self._time_true_count += value
+            self._expire(now)
+
     def append_true(self):
         """添加True"""
         self.append(True)
 
     def get_rate(self, round_num: int = 2) -> float:
         """获取队列中True的比例, 默认保留两位小数"""
-        return round(len(list(filter(lambda x: x, self))) / self.maxlen, round_num)
+        return round(self.true_count / self.maxlen, round_num)
+
+    def get_time_rate(self, round_num: int = 2) -> float:
+        """获取时间窗口中True的比例, 窗口为空时为0"""
+        self._expire(time.time())
+        return round(self._time_true_count / len(self._time_deque), round_num) if self._time_deque else 0.0
+
+    def _expire(self, now: float) -> None:
+        while self._time_deque and self._time_deque[0][0] <= now - self.time_window:
+            self._time_true_count -= self._time_deque.popleft()[1]
 
     def refill(self, fill_value: Any = False, ) -> None:
         """重新填充"""
-        [self.append(fill_value) for _ in range(self.maxlen)]
+        self._epoch += 1
+        self._fill_value = bool(fill_value)
+
+        self.true_count = self.maxlen if self._fill_value else 0
+        self.current_run = self.longest_run = self.true_count
+        self.ewma = float(self._fill_value)
+
+        self._time_deque = deque()
+        self._time_true_count = 0
 
     def clear(self) -> None:
         self.refill()
 
 
+class SlidingWindowArray(object):
+    """滑动窗口数组 - 同类observer的滑动窗口, 每行一个, 按行批量更新 (依赖numpy)
+
+    统计量同SlidingWindowDeque (不含时间窗口), 每次更新的行不能重复.
+    """
+
+    def __init__(self, maxlen: int = 10, ewma_alpha: float = 0.2, number: int = 0):
+        assert numpy is not None, 'SlidingWindowArray requires numpy.'
+        assert maxlen > 0, f'maxlen {maxlen} must be positive.'
+        self.maxlen = maxlen
+        self.ewma_alpha = ewma_alpha
+
+        self.windows = numpy.zeros((number, maxlen), dtype=bool)
+        self.indexes = numpy.zeros(number, dtype=numpy.int64)
+        """下一次写入的位置"""
+        self.true_counts = numpy.zeros(number, dtype=numpy.int64)
+        self.current_runs = numpy.zeros(number, dtype=numpy.int64)
+        self.longest_runs = numpy.zeros(number, dtype=numpy.int64)
+        self.ewmas = numpy.zeros(number, dtype=numpy.float64)
+
+        self._row_number = 0
+        self._free_rows: List[int] = []
+
+    def add_row(self) -> int:
+        """分配一行 (已清空)"""
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self.refill([row])
+            return row
+
+        if self._row_number == len(self.windows):
+            self._grow(max(len(self.windows) * 2, 1))
+        self._row_number += 1
+        return self._row_number - 1
+
+    def remove_row(self, row: int) -> None:
+        """释放一行"""
+        self._free_rows.append(row)
+
+    def _grow(self, number: int) -> None:
+        for name in ['windows', 'indexes', 'true_counts', 'current_runs', 'longest_runs', 'ewmas']:
+            value = getattr(self, name)
+            grown = numpy.zeros((number, *value.shape[1:]), dtype=value.dtype)
+            grown[:len(value)] = value
+            setattr(self, name, grown)
+
+    def append(self, rows: List[int], values: List[bool]) -> None:
+        """每行添加一个判断结果"""
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        values = numpy.asarray(values, dtype=bool)
+        indexes = self.indexes[rows]
+
+        self.true_counts[rows] += values.astype(numpy.int64) - self.windows[rows, indexes]
+        self.windows[rows, indexes] = values
+        self.indexes[rows] = (indexes + 1) % self.maxlen
+
+        self.current_runs[rows] = numpy.where(values, self.current_runs[rows] + 1, 0)
+        self.longest_runs[rows] = numpy.maximum(self.longest_runs[rows], self.current_runs[rows])
+        self.ewmas[rows] += self.ewma_alpha * (values - self.ewmas[rows])
+
+    def get_rates(self, rows: List[int], round_num: int = 2) -> 'numpy.ndarray':
+        """获取各行中True的比例, 默认保留两位小数"""
+        return numpy.round(self.true_counts[rows] / self.maxlen, round_num)
+
+    def refill(self, rows: List[int], fill_value: Any = False) -> None:
+        """重新填充各行"""
+        fill_value = bool(fill_value)
+
+        self.windows[rows] = fill_value
+        self.true_counts[rows] = self.current_runs[rows] = self.longest_runs[rows] = self.maxlen if fill_value else 0
+        self.ewmas[rows] = float(fill_value)
+
+
+class SlidingWindowRow(object):
+    """滑动窗口数组中的一行, 接口同SlidingWindowDeque"""
+
+    def __init__(self, window_array: SlidingWindowArray, row: int):
+        self.window_array = window_array
+        self.row = row
+
+    @property
+    def maxlen(self) -> int:
+        return self.window_array.maxlen
+
+    @property
+    def true_count(self) -> int:
+        return int(self.window_array.true_counts[self.row])
+
+    @property
+    def current_run(self) -> int:
+        return int(self.window_array.current_runs[self.row])
+
+    @property
+    def longest_run(self) -> int:
+        return int(self.window_array.longest_runs[self.row])
+
+    @property
+    def ewma(self) -> float:
+        return float(self.window_array.ewmas[self.row])
+
+    def __len__(self):
+        return self.maxlen
+
+    def __iter__(self):
+        """从旧到新"""
+        window = self.window_array.windows[self.row]
+        return iter(numpy.roll(window, -int(self.window_array.indexes[self.row])).tolist())
+
+    def append(self, value: bool) -> None:
+        self.window_array.append([self.row], [value])
+
+    def append_true(self):
+        self.append(True)
+
+    def get_rate(self, round_num: int = 2) -> float:
+        return float(self.window_array.get_rates([self.row], round_num)[0])
+
+    def refill(self, fill_value: Any = False, ) -> None:
+        self.window_array.refill([self.row], fill_value)
+
+    def clear(self) -> None:
+        self.refill()
+
+
+def stack_results(values: List[Any]) -> 'numpy.ndarray':
+    """堆叠各observer的结果, 形状不一致时为object数组"""
+    try:
+        return numpy.asarray(values)
+    except ValueError:
+        stacked = numpy.empty(len(values), dtype=object)
+        for index, value in enumerate(values):
+            stacked[index] = value
+        return stacked
+
+
+def copy_arrays(value: Any) -> Any:
+    """复制结果中的numpy数组 (包括dict, list, tuple中的)"""
+    if numpy is not None and isinstance(value, numpy.ndarray):
+        return value.copy()
+    if type(value) is dict:
+        return {key: copy_arrays(_value) for key, _value in value.items()}
+    if type(value) in (list, tuple):
+        return type(value)(copy_arrays(_value) for _value in value)
+    return value
+
+
 class JudgeMixin(BaseObserver):
-    receive_action_names: List[str]
-    """接收的节点名称"""
+    receive_action_names: List[str] = None
+    """接收的节点名称, 默认为steps的名称. merge_plan中observer只依赖这些节点"""
 
     result_mapper_buffer: Dict[str, Any] = None
-    """结果缓存"""
+    """结果缓存 - 当前帧"""
+
+    frame_key: str = FRAME_ID_KEY
+    """帧id在参数中的键, 结果按帧缓存, 并发执行的帧不会混合. 没有帧id的结果缓存在同一帧中"""
+
+    result_buffer_frames: int = 16
+    """最多缓存的未完成帧数, 超过时淘汰最早的帧"""
+
+    result_buffer_timeout: Optional[float] = None
+    """未完成帧的最长缓存时间(秒), None则不限制"""
+
+    frame_buffer_mapper: 'OrderedDict[Any, Tuple[float, Dict[str, Any]]]' = None
+    """帧id: (创建时间, 结果缓存), 按创建顺序"""
+
+    evicted_frame_count: int = 0
+    """淘汰的未完成帧数"""
 
     judge_result_mapper: Dict[str, Any] = None
     _judge_result_deque: SlidingWindowDeque = None
     """判断结果和识别结果缓存队列 - 滑动窗口"""
 
+    batch_judge_callback: Optional[Callable] = None
+    """批量判断 - 同类多个observer一次判断, 见Observer.batch_do_action
+
+    参数为observers, parameters, 以及接收节点的堆叠结果(numpy数组, 以节点名称为键), 返回布尔向量
+    """
+
     def __init__(self,
                  receive_node_names: List[str],
                  judge_callback: Callable = None,
@@ -123,15 +388,48 @@ class JudgeMixin(BaseObserver):
 
         # init
         self.result_mapper_buffer: Dict[str, Any] = {}
+        self.frame_buffer_mapper = OrderedDict()
+        self._buffer_frame_id = None
 
     def _update_result_buffer(self, result_mapper: Dict[str, Any]) -> None:
         """更新结果"""
+        self._buffer_frame_id = result_mapper.get(self.frame_key)
+        self.result_mapper_buffer = self._get_frame_buffer(self._buffer_frame_id)
 
-        [
-            self.result_mapper_buffer.__setitem__(node_name, result_mapper[node_name])
-            for node_name in self.receive_action_names
+        added_names = [
+            node_name for node_name in self.receive_action_names
             if node_name in result_mapper and node_name not in self.result_mapper_buffer
         ]
+        [self.result_mapper_buffer.__setitem__(node_name, result_mapper[node_name]) for node_name in added_names]
+
+        # the frame is pending, the arrays may be views of shared memory which are reused by the next frames.
+        if not self._ready_to_judge():
+            [
+                self.result_mapper_buffer.__setitem__(node_name, copy_arrays(self.result_mapper_buffer[node_name]))
+                for node_name in added_names
+            ]
+
+    def _get_frame_buffer(self, frame_id: Any) -> Dict[str, Any]:
+        """帧的结果缓存, 新建时淘汰超时和超出数量的未完成帧"""
+        if (frame_buffer := self.frame_buffer_mapper.get(frame_id)) is not None:
+            return frame_buffer[1]
+
+        now = time.time()
+        while self.frame_buffer_mapper and (
+                len(self.frame_buffer_mapper) >= self.result_buffer_frames or
+                self.result_buffer_timeout is not None and
+                next(iter(self.frame_buffer_mapper.values()))[0] <= now - self.result_buffer_timeout
+        ):
+            self.frame_buffer_mapper.popitem(last=False)
+            self.evicted_frame_count += 1
+
+        frame_buffer = self.frame_buffer_mapper[frame_id] = (now, {})
+        return frame_buffer[1]
+
+    def _clear_result_buffer(self) -> None:
+        """清除当前帧的结果缓存"""
+        self.result_mapper_buffer.clear()
+        self.frame_buffer_mapper.pop(self._buffer_frame_id, None)
 
     def _ready_to_judge(self) -> bool:
         """检查是否执行"""
@@ -160,7 +458,7 @@ class JudgeMixin(BaseObserver):
             else:
                 return 1, result
             finally:
-                self.result_mapper_buffer.clear()
+                self._clear_result_buffer()
         return 0, None
 
 
@@ -173,6 +471,12 @@ class TriggerMixin(BaseObserver):
     trigger_rate: float = 0.5
     """滑动窗口中的达到触发预警的比例"""
 
+    trigger_ewma_alpha: float = 0.2
+    """滑动窗口中判断结果指数加权平均的系数"""
+
+    trigger_time_window: Optional[float] = None
+    """滑动窗口的时间窗口(秒), None则不统计"""
+
     _judge_result_deque: SlidingWindowDeque = None
     """判断结果和识别结果缓存队列 - 滑动窗口"""
 
@@ -184,6 +488,11 @@ class TriggerMixin(BaseObserver):
         # initial
         self.trigger_callback = trigger_callback
 
+    @property
+    def judge_window(self) -> SlidingWindowDeque:
+        """判断结果的滑动窗口, 回调中可通过ob读取其统计量"""
+        return self._judge_result_deque
+
     def trigger(self, parameter: dict) -> Tuple[OBSERVER_EXECUTE_STATUS, Optional[Any]]:
         """检查是否触发报警"""
 
@@ -191,14 +500,17 @@ class TriggerMixin(BaseObserver):
 
             # clear judge result
             self._judge_result_deque.clear()
-            try:
-                result = self.trigger_callback(**{**parameter, **self.judge_result_mapper, 'ob': self})
-            except Exception as e:
-                return -1, e
-            else:
-                return 1, result
+            return self._call_trigger_callback(parameter)
         return 0, None
 
+    def _call_trigger_callback(self, parameter: dict) -> Tuple[OBSERVER_EXECUTE_STATUS, Optional[Any]]:
+        try:
+            result = self.trigger_callback(**{**parameter, **self.judge_result_mapper, 'ob': self})
+        except Exception as e:
+            return -1, e
+        else:
+            return 1, result
+
 
 class Observer(JudgeMixin, TriggerMixin):
     ready_status: bool = True
@@ -213,9 +525,13 @@ class Observer(JudgeMixin, TriggerMixin):
         [plan.append(step) for step in self.steps]
 
         # common init
-        self._judge_result_deque = SlidingWindowDeque(maxlen=self.trigger_cache_length)
+        self._judge_result_deque = SlidingWindowDeque(
+            maxlen=self.trigger_cache_length,
+            ewma_alpha=self.trigger_ewma_alpha,
+            time_window=self.trigger_time_window,
+        )
 
-        JudgeMixin.__init__(self, [step.name for step in self.steps], self.callback[0])
+        JudgeMixin.__init__(self, list(receive_action_names(self)), self.callback[0])
         TriggerMixin.__init__(self, self.callback[1])
 
     def ready(self) -> bool:
@@ -227,17 +543,260 @@ class Observer(JudgeMixin, TriggerMixin):
             trigger_status = self.trigger(parameter)
             return judge_status, trigger_status
 
+    @classmethod
+    def batch_do_action(cls,
+                        observers: List['Observer'],
+                        parameters: List[Dict],
+                        ) -> List[Optional[Tuple[Tuple[int, Any], Tuple[int, Any]]]]:
+        """``do_action`` of observers of the class in bulk, each observer with a parameter.
+
+        The ready observers are judged by one ``batch_judge_callback`` call with the stacked results, and their windows
+        (rows of the same SlidingWindowArray, see ``ObserverHost``) are updated and checked by their ``trigger_rate`` in
+        bulk. The trigger callbacks are called one by one.
+        """
+        assert cls.batch_judge_callback is not None, f'{cls.name} has no batch_judge_callback.'
+        statuses: List[Optional[list]] = [None] * len(observers)
+
+        ready_indexes = [index for index, observer in enumerate(observers) if observer.ready()]
+        judged_indexes = []
+        for index in ready_indexes:
+            statuses[index] = [(0, None), (0, None)]
+            observers[index]._update_result_buffer(parameters[index])
+            if observers[index]._ready_to_judge():
+                judged_indexes.append(index)
+
+        window_array: Optional[SlidingWindowArray] = None
+        if ready_indexes:
+            window_array = observers[ready_indexes[0]]._judge_result_deque.window_array
+
+        # judge
+        if judged_indexes:
+            judged_observers = [observers[index] for index in judged_indexes]
+            stacked = {
+                name: stack_results([observer.result_mapper_buffer[name] for observer in judged_observers])
+                for name in judged_observers[0].receive_action_names
+            }
+            for observer in judged_observers:
+                observer.judge_result_mapper = observer.result_mapper_buffer.copy()
+                observer._clear_result_buffer()
+
+            try:
+                results = numpy.asarray(cls.batch_judge_callback(
+                    observers=judged_observers,
+                    parameters=[parameters[index] for index in judged_indexes],
+                    **stacked,
+                ), dtype=bool)
+                assert results.shape == (len(judged_indexes),), f'wrong shape of judge results {results.shape}.'
+            except Exception as e:
+                judged_observers[0].logger.error(f'Observer Batch Judge Error: {e}')
+                for index in judged_indexes:
+                    statuses[index][0] = (-1, e)
+            else:
+                window_array.append([observers[index]._judge_result_deque.row for index in judged_indexes], results)
+                for index, result in zip(judged_indexes, results.tolist()):
+                    statuses[index][0] = (1, result)
+
+        # trigger
+        if ready_indexes:
+            rows = numpy.asarray([observers[index]._judge_result_deque.row for index in ready_indexes])
+            trigger_rates = numpy.asarray([observers[index].trigger_rate for index in ready_indexes])
+            triggered = window_array.get_rates(rows) >= trigger_rates
+            window_array.refill(rows[triggered])
+
+            for index in numpy.asarray(ready_indexes)[triggered].tolist():
+                statuses[index][1] = observers[index]._call_trigger_callback(parameters[index])
+
+        return [status if status is None else tuple(status) for status in statuses]
+
+
+class ObserverHost(object):
+    """Observers of many streams in one process, keyed by stream id and observer name.
+
+    The observers of a stream are created from ``observer_classes`` at its first frame (or added by ``add``), and all of
+    them are judged and triggered by one ``do_action`` call for each frame.
+
+    The windows of observers with ``batch_judge_callback`` are rows of a SlidingWindowArray of their class, so the
+    frames of many streams are judged by class in bulk by ``do_batch``. At runtime, ``do_batch`` is called with the
+    frames of a micro batch (``register_observer_host`` with ``batch_size``), ``do_action`` judges a frame alone.
+    """
+
+    def __init__(self,
+                 observer_classes: List[Type[Observer]] = (),
+                 stream_key: str = 'stream_id',
+                 logger: Logger = getLogger(__name__),
+                 ):
+        """
+        Args:
+            stream_key: key of stream id in parameter of frame.
+        """
+        self.observer_classes = list(observer_classes)
+        self.stream_key = stream_key
+        self.logger = logger
+
+        self.observer_mapper: Dict[Any, Dict[str, Observer]] = {}
+        """stream id: {observer name: observer}"""
+        self.window_array_mapper: Dict[str, SlidingWindowArray] = {}
+        """observer name: windows of the observers with batch_judge_callback"""
+
+    def __len__(self):
+        return sum(len(observers) for observers in self.observer_mapper.values())
+
+    def add(self, stream_id: Any, observer: Observer) -> None:
+        """add (or replace) an observer of stream, the observers of a new stream are not created from classes."""
+        observers = self.observer_mapper.setdefault(stream_id, {})
+        if (replaced := observers.get(observer.name)) is not None:
+            self._detach(replaced)
+        observers[observer.name] = self._attach(observer)
+
+    def remove(self, stream_id: Any, observer_name: str = None) -> None:
+        """remove an observer of stream, or all of them if observer_name is None."""
+        if observer_name is None:
+            removed = list(self.observer_mapper.pop(stream_id, {}).values())
+        else:
+            removed = [self.observer_mapper.get(stream_id, {}).pop(observer_name, None)]
+        [self._detach(observer) for observer in removed if observer is not None]
+
+    def get_observers(self, stream_id: Any) -> Dict[str, Observer]:
+        """observers of stream, created at the first time."""
+        if (observers := self.observer_mapper.get(stream_id)) is None:
+            observers = self.observer_mapper[stream_id] = {
+                observer_class.name: self._attach(observer_class(logger=self.logger))
+                for observer_class in self.observer_classes
+            }
+        return observers
+
+    def _attach(self, observer: Observer) -> Observer:
+        """replace the window of observer with batch_judge_callback by a row of the window array of its class."""
+        if type(observer).batch_judge_callback is not None:
+            assert observer.trigger_time_window is None, \
+                f'{observer.name} with batch_judge_callback does not support trigger_time_window.'
+
+            if (window_array := self.window_array_mapper.get(observer.name)) is None:
+                window_array = self.window_array_mapper[observer.name] = SlidingWindowArray(
+                    maxlen=observer.trigger_cache_length, ewma_alpha=observer.trigger_ewma_alpha,
+                )
+            assert (window_array.maxlen, window_array.ewma_alpha) == \
+                   (observer.trigger_cache_length, observer.trigger_ewma_alpha), \
+                f'{observer.name} must have the same window of the other observers of its class.'
+            observer._judge_result_deque = SlidingWindowRow(window_array, window_array.add_row())
+        return observer
+
+    @staticmethod
+    def _detach(observer: Observer) -> None:
+        if isinstance(window := observer._judge_result_deque, SlidingWindowRow):
+            window.window_array.remove_row(window.row)
+
+    def do_action(self, parameter: Dict) -> Dict[str, Optional[Tuple[Tuple[int, Any], Tuple[int, Any]]]]:
+        """judge and trigger all the observers of the stream of frame, the results are keyed by observer name."""
+        return self.do_batch([parameter])[0]
+
+    def do_batch(self, parameters: List[Dict]) -> List[Dict[str, Optional[Tuple[Tuple[int, Any], Tuple[int, Any]]]]]:
+        """``do_action`` of frames of many streams. The observers with batch_judge_callback are run by class in bulk
+        (``Observer.batch_do_action``), the others one by one."""
+        results = [{} for _ in parameters]
+
+        # the frames of a stream are run in order, by rounds which have a frame of each stream at most.
+        rounds: List[List[int]] = []
+        stream_round_mapper: Dict[Any, int] = {}
+        for index, parameter in enumerate(parameters):
+            stream_id = parameter.get(self.stream_key)
+            round_index = stream_round_mapper[stream_id] = stream_round_mapper.get(stream_id, -1) + 1
+            if round_index == len(rounds):
+                rounds.append([])
+            rounds[round_index].append(index)
+
+        for indexes in rounds:
+            batch_mapper: Dict[str, Tuple[List[int], List[Observer]]] = {}
+            for index in indexes:
+                for name, observer in self.get_observers(parameters[index].get(self.stream_key)).items():
+                    if isinstance(observer._judge_result_deque, SlidingWindowRow):
+                        batch_indexes, batch_observers = batch_mapper.setdefault(name, ([], []))
+                        batch_indexes.append(index)
+                        batch_observers.append(observer)
+                    else:
+                        results[index][name] = observer.do_action(parameters[index])
+
+            for name, (batch_indexes, batch_observers) in batch_mapper.items():
+                batch_results = type(batch_observers[0]).batch_do_action(
+                    batch_observers, [parameters[index] for index in batch_indexes],
+                )
+                for index, result in zip(batch_indexes, batch_results):
+                    results[index][name] = result
+
+        return results
+
+
+def receive_action_names(observer: Union[Observer, Type[Observer], ObserverMeta]) -> List[str]:
+    """The actions received by observer, its ``receive_action_names`` or the names of its steps."""
+    if observer.receive_action_names is not None:
+        return observer.receive_action_names
+    return [step.name for step in observer.steps]
+
+
+def merge_plan(observers: List[Union[Observer, Type[Observer], ObserverMeta]],
+               observer_action: bool = True,
+               observer_host: str = None,
+               ):
+    """Merge the plans of ready observers.
+
+    If ``observer_host`` (name of ObserverHost action) is provided, the observers are run by one step of the host
+    instead of a step of each observer.
+
+    The plans are cached by the identities and ready status of observers, and the generation of actions (changed
+    when the actions are re-detected). So the same plan (compiled once) is returned for the steady frames, it must
+    not be modified.
+    """
+    observers = tuple(observers)
+    key = (
+        tuple((id(observer), bool(observer.ready())) for observer in observers),
+        observer_action,
+        observer_host,
+        get_action_generation(),
+    )
+
+    with _MERGED_PLAN_CACHE_LOCK:
+        if (cached := _MERGED_PLAN_CACHE.get(key)) is not None:
+            _MERGED_PLAN_CACHE.move_to_end(key)
+            return cached[1]
+
+    plan = _merge_plan(observers, observer_action, observer_host)
+
+    with _MERGED_PLAN_CACHE_LOCK:
+        # the observers are kept with the plan, so their ids are not reused.
+        _MERGED_PLAN_CACHE[key] = (observers, plan)
+        while len(_MERGED_PLAN_CACHE) > MERGED_PLAN_CACHE_SIZE:
+            _MERGED_PLAN_CACHE.popitem(last=False)
+    return plan
+
+
+def clear_merged_plans():
+    """Clear the cached plans of merge_plan."""
+    with _MERGED_PLAN_CACHE_LOCK:
+        _MERGED_PLAN_CACHE.clear()
+
 
-def merge_plan(observers: List[Union[Observer, Type[Observer], ObserverMeta]], observer_action: bool = True):
+def _merge_plan(observers: Tuple[Union[Observer, Type[Observer], ObserverMeta], ...],
+                observer_action: bool,
+                observer_host: Optional[str]):
     plan = StepPlan()
 
     # ready observers' plan
     ready_observers = [observer for observer in observers if observer.ready()]
     [plan.extend(observer.steps) for observer in ready_observers]
 
-    # add observer action
-    if observer_action:
-        current_dependencies = plan.current_dependencies()
-        [plan.append(Step(action=observer.name, dependency_actions=current_dependencies))
-         for observer in observers if observer.ready()]
+    # add observer action, which depends on the actions received by itself only, so it's not delayed by the
+    # steps of other observers.
+    if observer_action and observer_host:
+        current_dependencies = set(plan.current_dependencies())
+        plan.append(Step(action=observer_host, dependency_actions=list(dict.fromkeys(
+            name for observer in ready_observers for name in receive_action_names(observer)
+            if name in current_dependencies
+        ))))
+    elif observer_action:
+        current_dependencies = set(plan.current_dependencies())
+        [plan.append(Step(action=observer.name, dependency_actions=[
+            name for name in receive_action_names(observer) if name in current_dependencies
+        ])) for observer in ready_observers]
+
+    plan.compile()
     return plan
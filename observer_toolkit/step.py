@@ -3,12 +3,19 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
+from functools import wraps, cached_property, lru_cache
 from itertools import chain
-from typing import Optional, List, Dict, Any, Sequence, Set, Union, Iterable
+from typing import Optional, List, Dict, Any, Sequence, Set, Union, Iterable, Tuple
 from types import FunctionType
 
 GLOBAL_ACTION_REGISTRY: Dict[str, Action] = {}
 
+_ACTION_GENERATION = 0
+"""generation of registered actions, increased when actions are cleared or re-detected."""
+
+DEFAULT_MICRO_BATCH_DELAY = 0.005
+"""seconds to collect the frames of a micro batch from its first one."""
+
 
 def DEFAULT_EXECUTE_FUNCTION(*args, **kwargs):
     """Default func func."""
@@ -21,8 +28,8 @@ def DEFAULT_STEP_TASK_EXPEND_FUNCTION(**kwargs) -> list:
 
 
 def DEFAULT_STEP_FIXED_WORKER_FUNCTION(**kwargs) -> Optional[int]:
-    """Default step fixed worker func."""
-    return 0
+    """Default step fixed worker func, None means not pinned and routed by the executor manager."""
+    return None
 
 
 def DEFAULT_ACTION_INITIAL_FUNCTION():
@@ -35,6 +42,13 @@ def DEFAULT_ACTION_FINAL_FUNCTION():
     return None
 
 
+def select_action_inputs(parameter: Dict[str, Any], action_inputs: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Select the declared inputs (and expend) from parameter, all of parameter if not declared."""
+    if action_inputs is None:
+        return parameter
+    return {key: parameter[key] for key in (*action_inputs, 'expend') if key in parameter}
+
+
 def get_registered_actions() -> Dict[str, Action]:
     """Get all registered actions."""
     return GLOBAL_ACTION_REGISTRY
@@ -43,6 +57,18 @@ def get_registered_actions() -> Dict[str, Action]:
 def clear_registered_actions():
     """Clear all registered actions."""
     GLOBAL_ACTION_REGISTRY.clear()
+    update_action_generation()
+
+
+def get_action_generation() -> int:
+    """Get the generation of registered actions, the caches built on actions are invalid when it's changed."""
+    return _ACTION_GENERATION
+
+
+def update_action_generation():
+    """Increase the generation of registered actions."""
+    global _ACTION_GENERATION
+    _ACTION_GENERATION += 1
 
 
 def get_action(action_name: str) -> Action:
@@ -62,6 +88,20 @@ class Action(object):
     step_task_expend_function: FunctionType = field(default=DEFAULT_STEP_TASK_EXPEND_FUNCTION)
     step_fixed_worker_function: FunctionType = field(default=DEFAULT_STEP_FIXED_WORKER_FUNCTION)
 
+    action_inputs: Optional[List[str]] = field(default=None)
+    """keys of parameter consumed by action_function, None means all of them."""
+
+    fused_outputs: Optional[List[str]] = field(default=None)
+    """names of steps returned (as a dict) by the fused action, None if the action is not fused."""
+
+    zero_copy_inputs: bool = field(default=False)
+    """receive the arrays of parameter as views of shared memory, only valid during the call (see ``Executor``)."""
+
+    micro_batch_size: int = field(default=1)
+    """frames of concurrent plans run by one call with ``frames`` (see ``MicroBatchExecutor``), 1 means no batch."""
+    micro_batch_delay: float = field(default=DEFAULT_MICRO_BATCH_DELAY)
+    """seconds to collect the frames of a micro batch."""
+
     def __new__(cls, *args, **kwargs):
         # create instance
         instance = super().__new__(cls)
@@ -83,6 +123,10 @@ class Action(object):
     def __str__(self):
         return self.__repr__()
 
+    def select_inputs(self, parameter: Dict[str, Any]) -> Dict[str, Any]:
+        """Select the parameter sent to action_function."""
+        return select_action_inputs(parameter, self.action_inputs)
+
     def __hash__(self):
         return hash(
             (
@@ -125,24 +169,193 @@ class Step(object):
         return hash((self.name, tuple(self.dependency_actions)))
 
 
+@dataclass(frozen=True)
+class CompiledPlan(object):
+    """Immutable execution plan of StepPlan, the steps are referred by their indexes in ``steps``."""
+    steps: Tuple[Step, ...]
+    """reachable steps in topological order (by levels)."""
+    levels: Tuple[Tuple[Step, ...], ...]
+    """same as ``StepPlan.walk()``"""
+    dependencies: Tuple[Tuple[int, ...], ...]
+    """indexes of the dependencies of each step."""
+    dependents: Tuple[Tuple[int, ...], ...]
+    """indexes of the steps depending on each step."""
+    name_index: Dict[str, int] = field(compare=False, hash=False, repr=False)
+
+    @property
+    def names(self) -> List[str]:
+        return [step.name for step in self.steps]
+
+    def index(self, name: str) -> int:
+        return self.name_index[name]
+
+    def linear_chains(self) -> List[List[str]]:
+        """names of the maximal chains, each step of them is the only dependent of the previous one and depends
+        only on it."""
+        def _linked(index: int) -> bool:
+            return len(self.dependents[index]) == 1 and len(self.dependencies[self.dependents[index][0]]) == 1
+
+        chains = []
+        for index in range(len(self.steps)):
+            # the head of chain
+            if len(self.dependencies[index]) == 1 and _linked(self.dependencies[index][0]):
+                continue
+
+            indexes = [index]
+            while _linked(indexes[-1]):
+                indexes.append(self.dependents[indexes[-1]][0])
+            if len(indexes) > 1:
+                chains.append([self.steps[_].name for _ in indexes])
+        return chains
+
+    @cached_property
+    def spec(self) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+        """names of steps and their dependencies, to rebuild the plan by ``StepPlan.from_spec`` in other process."""
+        return tuple(
+            (step.name, tuple(self.steps[dependency].name for dependency in dependencies))
+            for step, dependencies in zip(self.steps, self.dependencies)
+        )
+
+    def __len__(self):
+        return len(self.steps)
+
+
+def _invalidate_plan(method):
+    """clear the caches of StepPlan before the list is mutated."""
+
+    @wraps(method)
+    def wrapper(self: StepPlan, *args, **kwargs):
+        self._compiled = None
+        self._name_index = None
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class StepPlan(List[Step]):
+    """Steps with unique names.
+
+    The plan is compiled once and cached until it's mutated by the methods of list. The changes of steps in place
+    (e.g. ``step.dependency_actions.add``) are not detected, ``invalidate`` the plan after them.
+    """
+    _compiled: Optional[CompiledPlan] = None
+    _name_index: Optional[Dict[str, int]] = None
+    _fused_chains: Tuple[Tuple[Tuple[str, ...], Optional[Tuple[str, ...]]], ...] = ()
+    """names of fused steps and their outputs."""
+
+    __setitem__ = _invalidate_plan(list.__setitem__)
+    __delitem__ = _invalidate_plan(list.__delitem__)
+    insert = _invalidate_plan(list.insert)
+    remove = _invalidate_plan(list.remove)
+    pop = _invalidate_plan(list.pop)
+    clear = _invalidate_plan(list.clear)
+    sort = _invalidate_plan(list.sort)
+    reverse = _invalidate_plan(list.reverse)
+    __imul__ = _invalidate_plan(list.__imul__)
+
+    @classmethod
+    def from_spec(cls, spec: Iterable[Tuple[str, Iterable[str]]]) -> StepPlan:
+        """Build the plan from ``CompiledPlan.spec`` with the registered actions."""
+        plan = cls()
+        plan.extend(Step(name, dependency_actions=list(dependencies)) for name, dependencies in spec)
+        return plan
+
+    @property
+    def name_index(self) -> Dict[str, int]:
+        """name: index of step in list."""
+        if self._name_index is None:
+            self._name_index = {step.name: index for index, step in enumerate(self)}
+        return self._name_index
 
     @property
     def names(self):
-        return [step.name for step in self]
+        return list(self.name_index)
+
+    def invalidate(self) -> None:
+        """clear the compiled plan."""
+        self._compiled = None
+
+    def fuse(self, *names: str, outputs: Iterable[str] = None) -> None:
+        """Fuse the steps into one step, they are run by an executor and the intermediate results are not sent.
+
+        The fused step returns the outputs, by default the results used by the other steps and the result of the last
+        step. The fused action (named by joining names with '+' and its outputs, see ``fused_action_name``) must be
+        registered into the executor manager (``ExecutorManager.register_fused``).
+        """
+        assert len(names) > 1, 'fuse at least two steps.'
+        assert not set(names) & set(chain(*[fused_names for fused_names, _ in self._fused_chains])), \
+            f'steps {names} are fused already.'
+
+        self._fused_chains = (*self._fused_chains, (tuple(names), None if outputs is None else tuple(outputs)))
+        self._compiled = None
+
+    def fuse_linear_chains(self) -> List[List[str]]:
+        """Fuse the linear chains (see ``CompiledPlan.linear_chains``) of steps, return the names of them."""
+        chains = [
+            names for names in self._compile_steps().linear_chains()
+            if not set(names) & set(chain(*[fused_names for fused_names, _ in self._fused_chains]))
+        ]
+        [self.fuse(*names) for names in chains]
+        return chains
+
+    def _fused_plan(self) -> StepPlan:
+        """the plan with the fused steps replaced by fused actions."""
+        compiled_plan = self._compile_steps()
+        fused_plan = StepPlan()
+
+        # fused action of step names
+        fused_action_mapper: Dict[str, Action] = {}
+        for names, outputs in self._fused_chains:
+            for name in names:
+                assert name in compiled_plan.name_index, f'fused step {name} is not reachable in plan.'
+
+            if outputs is None:
+                # used by other steps, and the last one
+                outputs = [
+                    name for name in names
+                    if any(
+                        compiled_plan.steps[dependent].name not in names
+                        for dependent in compiled_plan.dependents[compiled_plan.index(name)]
+                    )
+                ]
+                last_name = max(names, key=compiled_plan.index)
+                outputs = outputs if last_name in outputs else [*outputs, last_name]
+
+            fused_action = fuse_actions([compiled_plan.steps[compiled_plan.index(name)] for name in names], outputs)
+            fused_action_mapper.update({name: fused_action for name in names})
+
+        for step in compiled_plan.steps:
+            action = fused_action_mapper.get(step.name, step.action)
+            dependency_actions = set(
+                fused_action_mapper.get(dependency.name, dependency) for dependency in step.dependency_actions
+            ) - {action}
+            fused_plan.append(Step(action, dependency_actions=list(dependency_actions)))
+
+        if len(fused_plan._compile_steps()) != len(fused_plan):
+            raise ValueError(f'fused steps {[names for names, _ in self._fused_chains]} depend on each other by '
+                             f'other steps.')
+        return fused_plan
 
     def append(self, __object: Step) -> None:
-        if __object.name not in self.names:
+        name_index = self.name_index
+        self._compiled = None
+
+        if (index := name_index.get(__object.name)) is None:
+            name_index[__object.name] = len(self)
             super().append(__object)
         else:
-            self[self.names.index(__object.name)].dependency_actions.update(__object.dependency_actions)
+            self[index].dependency_actions.update(__object.dependency_actions)
 
     def extend(self, __iterable: Iterable[Step]) -> None:
         [self.append(step) for step in __iterable]
 
+    def __iadd__(self, __iterable: Iterable[Step]) -> StepPlan:
+        self.extend(__iterable)
+        return self
+
     def current_dependencies(self) -> List[str]:
         """Get the current dependencies."""
-        return [step.name for step in chain(*self.walk())]
+        return self.compile().names
 
     def check_if_isolated(self, step: Step) -> bool:
         """Check if the step is isolated."""
@@ -150,35 +363,132 @@ class StepPlan(List[Step]):
         return False
         # TODO:
 
+    def compile(self) -> CompiledPlan:
+        """Compile the plan by levels (Kahn's algorithm), the steps with missing or circular dependencies are
+        excluded. The fused steps are replaced by their fused actions."""
+        if self._compiled is None:
+            self._compiled = self._fused_plan()._compile_steps() if self._fused_chains else self._compile_steps()
+        return self._compiled
+
+    def _compile_steps(self) -> CompiledPlan:
+        name_index = self.name_index
+
+        # dependencies in the plan, None if missing
+        dependencies = [
+            [name_index.get(action.name) for action in step.dependency_actions]
+            for step in self
+        ]
+        dependents = [[] for _ in self]
+        dependency_counts = [len(step_dependencies) for step_dependencies in dependencies]
+        for index, step_dependencies in enumerate(dependencies):
+            if None not in step_dependencies:
+                [dependents[dependency].append(index) for dependency in step_dependencies]
+
+        step_levels = [0 if not count else None for count in dependency_counts]
+        queue = [index for index, count in enumerate(dependency_counts) if not count]
+        for index in queue:
+            for dependent in dependents[index]:
+                step_levels[dependent] = max(step_levels[dependent] or 0, step_levels[index] + 1)
+                dependency_counts[dependent] -= 1
+                if not dependency_counts[dependent]:
+                    queue.append(dependent)
+
+        # reachable steps by levels, in the order of plan in each level
+        level_indexes = [[] for _ in range(max(filter(lambda _: _ is not None, step_levels), default=-1) + 1)]
+        for index, (step_level, count) in enumerate(zip(step_levels, dependency_counts)):
+            if not count:
+                level_indexes[step_level].append(index)
+        order = list(chain(*level_indexes))
+        position = {index: position for position, index in enumerate(order)}
+
+        return CompiledPlan(
+            steps=tuple(self[index] for index in order),
+            levels=tuple(tuple(self[index] for index in indexes) for indexes in level_indexes),
+            dependencies=tuple(
+                tuple(sorted(position[dependency] for dependency in dependencies[index]))
+                for index in order
+            ),
+            dependents=tuple(
+                tuple(sorted(position[dependent] for dependent in dependents[index] if dependent in position))
+                for index in order
+            ),
+            name_index={self[index].name: position for position, index in enumerate(order)},
+        )
+
     def walk(self) -> Sequence[Sequence[Step]]:
         """Walk the step."""
+        return self.compile().levels
 
-        step_sequence = []
 
-        while True:
-            # get current set of steps and actions
-            current_steps = list(chain(*step_sequence))
-            current_actions = set([step.action for step in current_steps])
+@lru_cache(maxsize=128)
+def plan_from_spec(spec: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> StepPlan:
+    """cached ``StepPlan.from_spec``"""
+    return StepPlan.from_spec(spec)
 
-            if next_steps := [
-                step for step in self
-                if step.dependency_actions.issubset(current_actions) and step not in current_steps
-            ]:
-                step_sequence.append(next_steps)
-            else:
-                break
 
-        return step_sequence
+def execute_plan(plan: StepPlan, parameters: Dict[str, Any] = None, result_mapper: Dict[str, Any] = None):
+    """Execute the plan in this process, step by step in topological order.
 
+    Args:
+        result_mapper: results of the steps out of plan.
+    """
+    parameters = parameters or {}
+    result_mapper = dict(result_mapper or {})
 
-def execute_plan(plan: StepPlan, parameters: Dict[str, Any] = None):
-    """Execute the plan."""
+    for step in plan.compile().steps:
+        current_parameter = {**parameters, **result_mapper}
+        expends = step.action.step_task_expend_function(**current_parameter)
 
-    result_mapper = {}
+        step_results = [
+            step.action.action_function(**step.action.select_inputs({
+                **current_parameter,
+                'result_mapper': {**result_mapper},
+                'expend': expend,
+            }))
+            for expend in expends
+        ]
 
-    for step_sequence in plan.walk():
-        for step in step_sequence:
-            result = step.action.action_function(**parameters)
-            result_mapper[step.name] = result
+        # expend
+        if step.action.fused_outputs is not None:
+            result_mapper.update(step_results[0])
+        else:
+            result_mapper[step.name] = step_results if step.action.step_merged_flag else step_results[0]
 
     return result_mapper
+
+
+def fused_action_name(names: Sequence[str], outputs: Sequence[str]) -> str:
+    """name of the fused action, e.g. 'step_1+step_2[step_2]'. The chains fused with other outputs are other actions."""
+    return f"{'+'.join(names)}[{','.join(outputs)}]"
+
+
+def fuse_actions(steps: Sequence[Step], outputs: Sequence[str]) -> Action:
+    """The action running the steps in this process, and returning the results of outputs as a dict."""
+    names = [step.name for step in steps]
+
+    # the dependencies out of steps are given by parameter
+    spec = tuple(
+        (step.name, tuple(sorted(action.name for action in step.dependency_actions if action.name in names)))
+        for step in steps
+    )
+    outputs = list(outputs)
+
+    def fused_function(**kwargs):
+        kwargs.pop('expend', None)
+        outer_result_mapper = kwargs.pop('result_mapper', None) or {}
+
+        result_mapper = execute_plan(plan_from_spec(spec), kwargs, result_mapper=outer_result_mapper)
+        return {name: result_mapper[name] for name in outputs}
+
+    def fused_initial_function():
+        [step.action.action_initial_function() for step in steps]
+
+    input_lists = [step.action.action_inputs for step in steps]
+
+    action = get_action(fused_action_name(names, outputs))
+    action.action_function = fused_function
+    action.action_initial_function = fused_initial_function
+    action.fused_outputs = outputs
+    action.action_inputs = None if None in input_lists else sorted(set(chain(*input_lists), ['result_mapper']))
+    action.zero_copy_inputs = all(step.action.zero_copy_inputs for step in steps)
+    return action
@@ -8,4 +8,4 @@ GLOBAL_EXECUTOR_MANAGER = ExecutorManager()
 # common
 
 from ._detect import detect_action, detect_observer
-from .libs import smart_launch, smart_run, create_dispatcher
+from .libs import smart_launch, smart_run, smart_submit, create_dispatcher, async_smart_run, async_dispatch
@@ -6,7 +6,7 @@ from typing import Iterable, Tuple, Type, List
 
 from observer_toolkit.step import Action, get_action, get_registered_actions, DEFAULT_STEP_FIXED_WORKER_FUNCTION, \
     DEFAULT_STEP_TASK_EXPEND_FUNCTION, DEFAULT_EXECUTE_FUNCTION, DEFAULT_ACTION_INITIAL_FUNCTION, \
-    DEFAULT_ACTION_FINAL_FUNCTION
+    DEFAULT_ACTION_FINAL_FUNCTION, DEFAULT_MICRO_BATCH_DELAY, update_action_generation
 from observer_toolkit.observer import Observer
 
 
@@ -65,6 +65,10 @@ def detect_action(
         step_task_expend_function = getattr(sub_module, 'step_task_expend_function', DEFAULT_STEP_TASK_EXPEND_FUNCTION)
         step_fixed_worker_function = getattr(sub_module, 'step_fixed_worker_function',
                                              DEFAULT_STEP_FIXED_WORKER_FUNCTION)
+        action_inputs = getattr(sub_module, 'action_inputs', None)
+        zero_copy_inputs = getattr(sub_module, 'zero_copy_inputs', False)
+        micro_batch_size = getattr(sub_module, 'micro_batch_size', 1)
+        micro_batch_delay = getattr(sub_module, 'micro_batch_delay', DEFAULT_MICRO_BATCH_DELAY)
 
         action = get_action(action_name)
         action.action_function = action_function
@@ -73,9 +77,16 @@ def detect_action(
         action.step_merged_flag = step_merged_flag
         action.step_task_expend_function = step_task_expend_function
         action.step_fixed_worker_function = step_fixed_worker_function
+        action.action_inputs = list(action_inputs) if action_inputs is not None else None
+        action.zero_copy_inputs = zero_copy_inputs
+        action.micro_batch_size = micro_batch_size
+        action.micro_batch_delay = micro_batch_delay
 
         actions.append(action)
 
+    # the plans built on the previous actions are invalid.
+    update_action_generation()
+
     return actions
 
 
@@ -1,8 +1,18 @@
 # coding : utf-8
+import asyncio
+import collections
 import ctypes
+import functools
+import hashlib
+import itertools
+import mmap
+import os
 import queue
+import random
 import signal
+import struct
 import sys
+import tempfile
 import threading
 import multiprocessing
 
@@ -13,23 +23,74 @@ import time
 import traceback
 
 from inspect import signature, Parameter
-from typing import Iterable, Any, Callable, Union, Dict, List, NamedTuple
+from logging import getLogger
+from typing import Iterable, Any, Callable, Union, Dict, List, NamedTuple, Tuple, Optional, Set
 from threading import Thread
-from multiprocessing import Array, Value, Barrier, Process, RawArray
+from multiprocessing import Array, Value, Barrier, Process, RawArray, RawValue, Semaphore
 
-from observer_toolkit.step import Action, get_registered_actions
+from observer_toolkit.step import Action, get_registered_actions, select_action_inputs, get_action, execute_plan, \
+    StepPlan, CompiledPlan, plan_from_spec, DEFAULT_MICRO_BATCH_DELAY
 
 DEFAULT_INITIAL_CALLBACK = lambda: None
 DEFAULT_EXECUTE_CALLBACK = lambda **kwargs: kwargs
 DEFAULT_FINAL_CALLBACK = lambda: None
 
+DEFAULT_LOGGER = getLogger(__name__)
+
 DEFAULT_SHARED_MEMORY_SIZE = 64 * 1024 * 1024
+DEFAULT_PIPELINE_DEPTH = 2
+"""number of tasks in flight of an executor, each of them has a slot in the shared ring."""
+
+DEFAULT_SHARED_ARENA_SIZE = 1024 * 1024 * 1024
+"""virtual size of the arena shared by executors, the memory is committed only when it's used."""
+DEFAULT_SHARED_ARENA_BLOCK_SIZE = 64 * 1024
+"""unit of arena allocation."""
+DEFAULT_SHARED_ARENA_TIMEOUT = 10
+"""seconds to wait for free blocks when the arena is full."""
+DEFAULT_SHARED_RING_SLOT_SIZE = 256 * 1024
+"""size of ring slot with arena, the larger messages are saved in arena blocks."""
+DEFAULT_SPILL_DIR = None
+"""directory of spilled frames, default is the temporary directory."""
+DEFAULT_SHARED_OBJECT_THRESHOLD = 64 * 1024
+"""objects smaller than it are sent in parameter directly instead of SharedObjectStore."""
+DEFAULT_SHARED_OBJECT_DIGEST = 'sha1'
+"""digest of content in SharedObjectStore."""
+DEFAULT_AUTOSCALE_INTERVAL = 1.0
+"""seconds between checks of autoscaler."""
+EXECUTION_TIME_ALPHA = 0.2
+"""weight of the latest execution time in its moving average."""
+RETIRE_CHECK_INTERVAL = 0.01
+"""seconds between checks of the tasks in flight of a retired executor."""
+
+PICKLE_PROTOCOL = 5
+"""pickle protocol 5 supports out-of-band buffers (PEP 574)."""
+SHARED_VALUE_HEADER = struct.Struct('<QI')
+"""header of SharedValue: pickle length, buffer count."""
+SHARED_VALUE_BUFFER_HEADER = struct.Struct('<Q')
+"""length of each out-of-band buffer."""
+SHARED_VALUE_ALIGNMENT = 64
+"""out-of-band buffers are aligned to cache line."""
+
+ARENA_BLOCK_FREE = b'\x00'
+ARENA_BLOCK_USED = b'\x01'
+ARENA_RETRY_INTERVAL = 0.001
+"""seconds between retries of allocation when the arena is full."""
 
 
 class SharedValue(object):
-    """save Python object into shared memory."""
+    """save Python object into shared memory.
+
+    Layout::
+
+        | pickle length (8) | buffer count (4) | buffer lengths (8 * n) | pickle | buffer 0 | buffer 1 | ...
+
+    Objects are pickled by protocol 5, the ``PickleBuffer`` (e.g. numpy.ndarray) are written out-of-band after the
+    pickle. So the arrays could be rebuilt as views of the shared memory by ``get_object(copy=False)``.
+
+    The frame larger than ``size`` is spilled into a temporary file, and only the ``SpilledBlock`` is saved.
+    """
 
-    def __init__(self, value=None, size: int = None):
+    def __init__(self, value=None, size: int = None, offset: int = 0):
 
         size = size or DEFAULT_SHARED_MEMORY_SIZE
 
@@ -40,48 +101,513 @@ class SharedValue(object):
 
         # self._value = Value('i', 0)
         self.size = size
+        self.offset = offset
 
-    def _set(self, bytes_data: bytes) -> None:
-        """set bytes_data into memory(bytes).
+    @property
+    def _view(self) -> memoryview:
+        return memoryview(self._array).cast('B')[self.offset:self.offset + self.size]
+
+    def _set(self, bytes_data: bytes, buffers: List[memoryview] = ()) -> None:
+        """set bytes_data and out-of-band buffers into memory(bytes).
 
-        The head 4 bytes is the length of bytes_data and the rest is bytes_data.
+        The head 12 bytes are the length of bytes_data and number of buffers, then lengths of buffers.
         """
-        # slice cost slow when set object
+        header_size = SHARED_VALUE_HEADER.size + SHARED_VALUE_BUFFER_HEADER.size * len(buffers)
+        buffer_offsets = _align_offsets(header_size + len(bytes_data), [buffer.nbytes for buffer in buffers])
 
-        length = len(bytes_data)
+        length = frame_length(bytes_data, buffers)
         assert length <= self.size, f'bytes_data length {length} > {self.size}.'
 
-        # length_bytes = length.to_bytes(4, 'big')
-        # self._value.value = length
-        self._array.value = bytes_data
+        view = self._view
+        SHARED_VALUE_HEADER.pack_into(view, 0, len(bytes_data), len(buffers))
+        for index, buffer in enumerate(buffers):
+            SHARED_VALUE_BUFFER_HEADER.pack_into(
+                view, SHARED_VALUE_HEADER.size + SHARED_VALUE_BUFFER_HEADER.size * index, buffer.nbytes
+            )
 
-    def _get(self) -> bytes:
-        """get bytes_data from memory(bytes).
+        view[header_size:header_size + len(bytes_data)] = bytes_data
+        for offset, buffer in zip(buffer_offsets, buffers):
+            view[offset:offset + buffer.nbytes] = buffer
 
-        Load the head 4 bytes as the length of bytes_data and slice the rest as bytes_data.
-        """
-        # slice cost slow when set object
+    def _get(self) -> Tuple[memoryview, List[memoryview]]:
+        """get bytes_data and out-of-band buffers from memory(bytes).
 
-        # length = int.from_bytes(self._array[:4], 'big')
-        # return bytes(self._array[4:length + 4])
-
-        # return self._array.raw[:int(self._value.value)]
-        # TODO: wtf it works
-        # https://stackoverflow.com/questions/37705974/why-are-multiprocessing-sharedctypes-assignments-so-slow
-        # https://stackoverflow.com/questions/47380366/dramatic-slow-down-using-multiprocess-and-numpy-in-python
-        return memoryview(self._array)
+        Both of them are memoryview of the shared memory, no copy here.
+        """
+        view = self._view
+        length, buffer_number = SHARED_VALUE_HEADER.unpack_from(view, 0)
+        buffer_lengths = [
+            SHARED_VALUE_BUFFER_HEADER.unpack_from(
+                view, SHARED_VALUE_HEADER.size + SHARED_VALUE_BUFFER_HEADER.size * index
+            )[0]
+            for index in range(buffer_number)
+        ]
+
+        header_size = SHARED_VALUE_HEADER.size + SHARED_VALUE_BUFFER_HEADER.size * buffer_number
+        buffer_offsets = _align_offsets(header_size + length, buffer_lengths)
+
+        return view[header_size:header_size + length], [
+            view[offset:offset + buffer_length] for offset, buffer_length in zip(buffer_offsets, buffer_lengths)
+        ]
+
+    def set_frame(self, bytes_data: bytes, buffers: List[memoryview] = ()) -> None:
+        """set the pickled frame, spill it into a temporary file if it's larger than size."""
+        if frame_length(bytes_data, buffers) > self.size:
+            bytes_data, buffers = dumps_object(spill_frame(bytes_data, buffers))
+        self._set(bytes_data, buffers)
 
     def set_object(self, obj) -> None:
         if isinstance(obj, bytes):
-            self._set(obj)
+            self.set_frame(obj)
         else:
-            self._set(pickle.dumps(obj))
+            self.set_frame(*dumps_object(obj))
+
+    def get_object(self, copy: bool = True):
+        """load object from memory.
+
+        Args:
+            copy: copy the out-of-band buffers out of the shared memory. Without copy, the arrays in object are
+                read-only views of the shared memory (which may be shared by other readers) and only valid until the
+                next ``set_object``.
+        """
+        bytes_data, buffers = self._get()
+        if copy:
+            buffers = [bytearray(buffer) for buffer in buffers]
+        else:
+            buffers = [buffer.toreadonly() for buffer in buffers]
+        obj = pickle.loads(bytes_data, buffers=buffers)
+
+        if isinstance(obj, SpilledBlock):
+            obj = load_spilled(obj, copy=copy)
+        return obj
+
+
+class SpilledBlock(NamedTuple):
+    """Frame spilled into a temporary file."""
+    path: str
+    size: int
+
+
+def spill_frame(bytes_data: bytes, buffers: List[memoryview] = ()) -> SpilledBlock:
+    """save the frame into a temporary file by mmap, the file is removed by ``load_spilled``."""
+    length = frame_length(bytes_data, buffers)
+
+    fd, path = tempfile.mkstemp(prefix='observer-toolkit-', suffix='.spill', dir=DEFAULT_SPILL_DIR)
+    try:
+        os.ftruncate(fd, length)
+        with mmap.mmap(fd, length) as buffer:
+            SharedValue(value=buffer, size=length)._set(bytes_data, buffers)
+    except:
+        os.unlink(path)
+        raise
+    finally:
+        os.close(fd)
+
+    return SpilledBlock(path=path, size=length)
+
+
+def load_spilled(block: SpilledBlock, copy: bool = True):
+    """load the object from the spilled file and remove it.
+
+    The file is unlinked at once, the mapping (and the views in object without copy) is valid until it's collected.
+    """
+    with open(block.path, 'r+b') as f:
+        buffer = mmap.mmap(f.fileno(), block.size)
+    os.unlink(block.path)
+
+    return SharedValue(value=buffer, size=block.size).get_object(copy=copy)
+
+
+def dumps_object(obj) -> Tuple[bytes, List[memoryview]]:
+    """pickle obj by protocol 5, return the pickle and the raw out-of-band buffers."""
+    buffers = []
+    bytes_data = pickle.dumps(obj, protocol=PICKLE_PROTOCOL, buffer_callback=buffers.append)
+    return bytes_data, [buffer.raw() for buffer in buffers]
+
+
+def frame_length(bytes_data: bytes, buffers: List[memoryview] = ()) -> int:
+    """length of memory used by ``SharedValue._set(bytes_data, buffers)``."""
+    header_size = SHARED_VALUE_HEADER.size + SHARED_VALUE_BUFFER_HEADER.size * len(buffers)
+    if buffers:
+        return _align_offsets(header_size + len(bytes_data), [buffer.nbytes for buffer in buffers])[-1] + \
+            buffers[-1].nbytes
+    return header_size + len(bytes_data)
+
+
+def _align_offsets(start: int, lengths: List[int]) -> List[int]:
+    """offsets of buffers which start from ``start`` and are aligned by ``SHARED_VALUE_ALIGNMENT``."""
+    offsets = []
+    for length in lengths:
+        start = -(-start // SHARED_VALUE_ALIGNMENT) * SHARED_VALUE_ALIGNMENT
+        offsets.append(start)
+        start += length
+    return offsets
+
+
+class ArenaBlock(NamedTuple):
+    """Blocks leased from SharedArena."""
+    offset: int
+    size: int
+
+
+class SharedArena(object):
+    """pool of shared memory, executors lease blocks from it for each message and release them after used.
+
+    The memory is an anonymous shared mmap inherited by the forked executors, so only the pages touched are committed.
+    Blocks are allocated first-fit by a bitmap in shared memory which is guarded by a lock, so both the main process
+    and the executors could allocate and free.
+    """
+
+    def __init__(self, size: int = None, block_size: int = None):
+        size = size or DEFAULT_SHARED_ARENA_SIZE
+        self.block_size = block_size or DEFAULT_SHARED_ARENA_BLOCK_SIZE
+
+        self.block_number = size // self.block_size
+        self.size = self.block_number * self.block_size
+        assert self.block_number > 0, f'size {size} < block size {self.block_size}.'
+
+        self._buffer = mmap.mmap(-1, self.size)
+        self._bitmap = RawArray('c', self.block_number)
+        self._lock = multiprocessing.Lock()
 
-    def get_object(self):
-        bytes_data = self._get()
-        obj = pickle.loads(bytes_data)
+    @property
+    def used(self) -> int:
+        """bytes leased."""
+        return self._bitmap.raw.count(ARENA_BLOCK_USED) * self.block_size
+
+    def allocate(self, length: int, timeout: Union[int, float] = DEFAULT_SHARED_ARENA_TIMEOUT) -> ArenaBlock:
+        """lease a block at least ``length`` bytes, wait for other blocks released when the arena is full."""
+        number = max(-(-length // self.block_size), 1)
+        assert number <= self.block_number, f'length {length} > arena size {self.size}.'
+
+        deadline = time.time() + timeout
+        while True:
+            with self._lock:
+                index = self._bitmap.raw.find(ARENA_BLOCK_FREE * number)
+                if index >= 0:
+                    memoryview(self._bitmap).cast('B')[index:index + number] = ARENA_BLOCK_USED * number
+                    return ArenaBlock(offset=index * self.block_size, size=number * self.block_size)
+
+            if time.time() > deadline:
+                raise MemoryError(f'SharedArena has no {length} bytes in {timeout} seconds.')
+            time.sleep(ARENA_RETRY_INTERVAL)
+
+    def free(self, block: ArenaBlock) -> None:
+        """release the block."""
+        index, number = block.offset // self.block_size, block.size // self.block_size
+        with self._lock:
+            memoryview(self._bitmap).cast('B')[index:index + number] = ARENA_BLOCK_FREE * number
+
+    def shared_value(self, block: ArenaBlock) -> SharedValue:
+        """SharedValue over the block."""
+        return SharedValue(value=self._buffer, size=block.size, offset=block.offset)
+
+
+class SharedRing(object):
+    """ring of SharedValue slots in one shared memory, for single producer and single consumer.
+
+    The producer ``put`` objects into slots at head, the consumer ``get`` them at tail and ``release`` the slot after
+    used. Two semaphores count the free and filled slots, so the producer only blocks when all slots are in flight.
+
+    With an arena, slots are small and only hold small messages. Larger messages are saved into arena blocks and only
+    the ``ArenaBlock`` is in the slot, the block is freed with the slot.
+    """
+
+    def __init__(self, depth: int = DEFAULT_PIPELINE_DEPTH, size: int = None, arena: SharedArena = None):
+        size = size or (DEFAULT_SHARED_RING_SLOT_SIZE * depth if arena else DEFAULT_SHARED_MEMORY_SIZE)
+        assert depth > 0, f'depth {depth} must be positive.'
+
+        self.depth = depth
+        self.slot_size = size // depth
+        self.arena = arena
+
+        array = RawArray('c', self.slot_size * depth)
+        self._slots = [
+            SharedValue(value=array, size=self.slot_size, offset=self.slot_size * index) for index in range(depth)
+        ]
+
+        self._head = RawValue('Q', 0)
+        """number of objects put."""
+        self._tail = RawValue('Q', 0)
+        """number of slots released."""
+        self._read_index = 0
+        """number of objects got, only used by the consumer."""
+        self._read_blocks = collections.deque()
+        """arena blocks of the slots got and not released, only used by the consumer."""
+
+        self._free_semaphore = Semaphore(depth)
+        self._filled_semaphore = Semaphore(0)
+
+    def __len__(self):
+        """number of slots in use."""
+        return self._head.value - self._tail.value
+
+    def put(self, obj: Any) -> None:
+        """save obj into the slot at head, block when the ring is full.
+
+        The message is serialized before a slot is acquired, the slot and the block (or spilled file) are released if
+        it fails.
+        """
+        bytes_data, buffers = dumps_object(obj)
+
+        # lease an arena block for the large message, the message is spilled if arena is not enough.
+        block, spilled, acquired = None, None, False
+        try:
+            if self.arena and (length := frame_length(bytes_data, buffers)) > self.slot_size:
+                try:
+                    block = self.arena.allocate(length, timeout=0)
+                except (AssertionError, MemoryError):
+                    pass
+                else:
+                    self.arena.shared_value(block)._set(bytes_data, buffers)
+                    bytes_data, buffers = dumps_object(block)
+
+            if frame_length(bytes_data, buffers) > self.slot_size:
+                spilled = spill_frame(bytes_data, buffers)
+                bytes_data, buffers = dumps_object(spilled)
+
+            self._free_semaphore.acquire()
+            acquired = True
+
+            self._slots[self._head.value % self.depth]._set(bytes_data, buffers)
+        except BaseException:
+            if acquired:
+                self._free_semaphore.release()
+            if block is not None:
+                self.arena.free(block)
+            if spilled is not None and os.path.exists(spilled.path):
+                os.remove(spilled.path)
+            raise
+
+        self._head.value += 1
+        self._filled_semaphore.release()
+
+    def get(self, copy: bool = True, release: bool = True) -> Any:
+        """load obj from the next slot, block when the ring is empty.
+
+        Args:
+            copy: see ``SharedValue.get_object``.
+            release: release the slot at once. Otherwise, the slot is kept until ``release`` and the views in obj are
+                valid until then.
+        """
+        self._filled_semaphore.acquire()
+
+        slot = self._slots[self._read_index % self.depth]
+        self._read_index += 1
+
+        # the slot is consumed even if the object can not be loaded.
+        block = None
+        try:
+            obj = slot.get_object(copy=copy)
+            if isinstance(obj, ArenaBlock):
+                block = obj
+                obj = self.arena.shared_value(block).get_object(copy=copy)
+        finally:
+            self._read_blocks.append(block)
+            if release:
+                self.release()
         return obj
 
+    def release(self) -> None:
+        """release the oldest slot got."""
+        assert self._tail.value < self._read_index, 'no slot to release.'
+
+        if block := self._read_blocks.popleft():
+            self.arena.free(block)
+
+        self._tail.value += 1
+        self._free_semaphore.release()
+
+
+class SharedObjectHandle(NamedTuple):
+    """Handle of object in SharedObjectStore, executors resolve it from the arena."""
+    key: bytes
+    block: ArenaBlock
+
+
+class SharedObjectStore(object):
+    """content-addressed objects in the arena, each of them is written once and shared by handles.
+
+    ``put`` returns a handle with one reference (held by the frame). Each task holds one more reference until it's
+    finished. The arena block is freed when the last reference is released.
+
+    Objects should not be modified after ``put``.
+    """
+
+    def __init__(self,
+                 arena: SharedArena,
+                 threshold: int = DEFAULT_SHARED_OBJECT_THRESHOLD,
+                 digest: str = DEFAULT_SHARED_OBJECT_DIGEST,
+                 ):
+        self.arena = arena
+        self.threshold = threshold
+        self.digest = digest
+
+        self._entries: Dict[bytes, list] = {}
+        """key: [handle, reference count, object]"""
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, obj: Any) -> Union[SharedObjectHandle, Any]:
+        """save obj into the arena and return its handle, the small obj (or arena is full) is returned as it is.
+
+        The object is always digested, so a reused buffer (e.g. frame buffer of camera) with new content is a new
+        object.
+        """
+        bytes_data, buffers = dumps_object(obj)
+        if (length := frame_length(bytes_data, buffers)) < self.threshold:
+            return obj
+
+        hasher = hashlib.new(self.digest, bytes_data)
+        [hasher.update(buffer) for buffer in buffers]
+        key = hasher.digest()
+
+        with self._lock:
+            if entry := self._entries.get(key):
+                entry[1] += 1
+                return entry[0]
+
+        try:
+            block = self.arena.allocate(length, timeout=0)
+        except (AssertionError, MemoryError):
+            return obj
+        self.arena.shared_value(block)._set(bytes_data, buffers)
+
+        with self._lock:
+            # the same content may be put by other thread meanwhile.
+            if entry := self._entries.get(key):
+                entry[1] += 1
+                self.arena.free(block)
+                return entry[0]
+
+            handle = SharedObjectHandle(key=key, block=block)
+            self._entries[key] = [handle, 1, obj]
+            return handle
+
+    def get(self, handle: SharedObjectHandle) -> Any:
+        """the object of handle in this process, the adopted one is loaded from the arena."""
+        with self._lock:
+            obj = self._entries[handle.key][2]
+        return self.arena.shared_value(handle.block).get_object() if obj is None else obj
+
+    def adopt(self, *handles: SharedObjectHandle) -> None:
+        """add the handles saved into the arena by executors (``share_result``), with one reference of each."""
+        with self._lock:
+            for handle in handles:
+                if entry := self._entries.get(handle.key):
+                    entry[1] += 1
+                else:
+                    self._entries[handle.key] = [handle, 1, None]
+
+    def acquire(self, *handles: SharedObjectHandle) -> None:
+        """add a reference of each handle."""
+        with self._lock:
+            for handle in handles:
+                self._entries[handle.key][1] += 1
+
+    def release(self, *handles: SharedObjectHandle) -> None:
+        """remove a reference of each handle, free the block without reference."""
+        with self._lock:
+            for handle in handles:
+                entry = self._entries[handle.key]
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._entries[handle.key]
+                    self.arena.free(handle.block)
+
+    def submit(self, executor: 'Executor', parameter: dict) -> 'ExecutorFuture':
+        """submit parameter with handles, the handles are referenced until the task is finished."""
+        handles = collect_handles(parameter)
+
+        self.acquire(*handles)
+        future = executor.submit(parameter)
+        future.add_done_callback(lambda _: self.release(*handles))
+        return future
+
+    def submit_batch(self, executor: 'Executor', parameter: dict, expends: Iterable[Any]) -> List['ExecutorFuture']:
+        """``Executor.submit_batch`` with handles, the handles are referenced until the batch is finished."""
+        handles = collect_handles(parameter)
+
+        self.acquire(*handles)
+        if futures := executor.submit_batch(parameter, expends):
+            # results of batch are set in order.
+            futures[-1].add_done_callback(lambda _: self.release(*handles))
+        else:
+            self.release(*handles)
+        return futures
+
+
+def collect_handles(parameter: dict) -> List[SharedObjectHandle]:
+    """unique handles in values of parameter, and in the dicts, lists and tuples of them."""
+    handles = set()
+
+    def _collect(value):
+        if isinstance(value, SharedObjectHandle):
+            handles.add(value)
+        elif type(value) is dict:
+            [_collect(_) for _ in value.values()]
+        elif type(value) in (list, tuple):
+            [_collect(_) for _ in value]
+
+    _collect(parameter)
+    return list(handles)
+
+
+def resolve_handles(parameter: dict, arena: SharedArena, copy: bool = False) -> dict:
+    """replace handles in values of parameter (see ``collect_handles``) by objects in arena."""
+    return map_handles(parameter, lambda handle: arena.shared_value(handle.block).get_object(copy=copy))
+
+
+def map_handles(parameter: dict, function: Callable[[SharedObjectHandle], Any]) -> dict:
+    """replace handles in values of parameter (see ``collect_handles``) by ``function(handle)``."""
+    objects = {}
+
+    def _resolve(value):
+        if isinstance(value, SharedObjectHandle):
+            if value.key not in objects:
+                objects[value.key] = function(value)
+            return objects[value.key]
+        if type(value) is dict:
+            return {_key: _resolve(_value) for _key, _value in value.items()}
+        if type(value) in (list, tuple):
+            return type(value)(_resolve(_) for _ in value)
+        return value
+
+    return {key: _resolve(value) for key, value in parameter.items()}
+
+
+def share_result(result: Any, arena: SharedArena, threshold: int = DEFAULT_SHARED_OBJECT_THRESHOLD) -> Any:
+    """save the large result (or each value of a dict result) into the arena in executor and return its handle.
+
+    The handle is adopted by the store of main process (``SharedObjectStore.adopt``), so the result is sent to the
+    next steps without being loaded and saved again by main process. The small result is returned as it is.
+    """
+    if type(result) is dict:
+        return {key: share_result(value, arena, threshold) for key, value in result.items()}
+
+    try:
+        bytes_data, buffers = dumps_object(result)
+    except Exception:
+        # the error is reported by the result ring.
+        return result
+    if (length := frame_length(bytes_data, buffers)) < threshold:
+        return result
+
+    try:
+        block = arena.allocate(length, timeout=0)
+    except (AssertionError, MemoryError):
+        return result
+    arena.shared_value(block)._set(bytes_data, buffers)
+
+    # the content is not digested, each result is a new object.
+    return SharedObjectHandle(key=os.urandom(16), block=block)
+
+
+class SendError(Exception):
+    """Failed to send a parameter or result into shared memory."""
+
 
 class ExecutorResult(NamedTuple):
     """Result from Executor."""
@@ -91,6 +617,12 @@ class ExecutorResult(NamedTuple):
     end_time: float = 0
 
 
+class ExecutorBatch(NamedTuple):
+    """Tasks sharing the same parameter with different expends."""
+    parameter: dict
+    expends: List[Any]
+
+
 class ExecutorFuture(object):
     _result = ExecutorResult
     """Result from Executor."""
@@ -101,14 +633,22 @@ class ExecutorFuture(object):
     def finished(self):
         return self._event.is_set()
 
+    @property
+    def has_result(self) -> bool:
+        """the result is set, the waiters may be not notified yet (in done callbacks)."""
+        return self._result is not None
+
     def __init__(self):
         self._result = None
         self._event = threading.Event()
 
         self._name = None
 
+        self._lock = threading.Lock()
+        self._done_callbacks: List[Callable[['ExecutorFuture'], Any]] = []
+
     def get_result(self, timeout: int = None, auto_raise: bool = True, executor_result: bool = False) -> Any:
-        assert self._event.wait(timeout=timeout), f'ExecutorFuture timeout. name {self._name}'
+        assert self.has_result or self._event.wait(timeout=timeout), f'ExecutorFuture timeout. name {self._name}'
 
         if auto_raise and self._result.exception is not None:
             # TODO
@@ -120,47 +660,115 @@ class ExecutorFuture(object):
             return self._result.result
 
     def set_result(self, result: Any) -> None:
-        self._result = result
-        self._event.set()
+        with self._lock:
+            self._result = result
+            callbacks, self._done_callbacks = self._done_callbacks, None
+
+        # callbacks are finished before the waiters are notified.
+        try:
+            [self._call_callback(callback) for callback in callbacks]
+        finally:
+            self._event.set()
+
+    def add_done_callback(self, callback: Callable[['ExecutorFuture'], Any]) -> None:
+        """call ``callback(future)`` when the result is set, or at once if it's already set.
+
+        The callbacks are called in the thread setting the result (e.g. the ``send_result`` thread of executor), so
+        they should not block. The result is available in callbacks, and their errors are logged instead of raised.
+        """
+        with self._lock:
+            if self._done_callbacks is not None:
+                self._done_callbacks.append(callback)
+                return
+        self._call_callback(callback)
+
+    def _call_callback(self, callback: Callable[['ExecutorFuture'], Any]) -> None:
+        """the error of callback is logged, so the thread setting the result is not broken."""
+        try:
+            callback(self)
+        except Exception as e:
+            DEFAULT_LOGGER.error(f'done callback of ExecutorFuture failed. name {self._name}', exc_info=e)
+
+    def __await__(self):
+        return wrap_executor_future(self).__await__()
+
+
+def wrap_executor_future(future: ExecutorFuture, loop: asyncio.AbstractEventLoop = None) -> asyncio.Future:
+    """wrap ExecutorFuture into asyncio.Future of the (running) event loop, no thread is blocked for it."""
+    loop = loop or asyncio.get_running_loop()
+    asyncio_future = loop.create_future()
+
+    def _set_result(_future: ExecutorFuture):
+        if asyncio_future.cancelled():
+            return
+        if (exception := _future._result.exception) is not None:
+            asyncio_future.set_exception(exception)
+        else:
+            asyncio_future.set_result(_future._result.result)
+
+    def _done_callback(_future: ExecutorFuture):
+        try:
+            loop.call_soon_threadsafe(_set_result, _future)
+        except RuntimeError:
+            # the event loop is closed, nobody awaits it.
+            pass
+
+    future.add_done_callback(_done_callback)
+    return asyncio_future
 
 
 def send_parameter(
         parameter_queue: queue.Queue,
-        shared_value: SharedValue,
-        parameter_ready_event: multiprocessing.Event,
-        parameter_received_event: multiprocessing.Event,
+        parameter_ring: SharedRing,
 ):
     while True:
-        # get parameter and save it into shared memory
+        # get parameter and save it into shared memory, block when all slots are in flight.
         parameter = parameter_queue.get()
-        shared_value.set_object(parameter)
-
-        # notify executor the parameter is ready.
-        parameter_ready_event.set()
-
-        # wait for executor has received the parameter.
-        parameter_received_event.wait()
-        parameter_received_event.clear()
+        try:
+            parameter_ring.put(parameter)
+        except Exception as e:
+            # keep the order of futures, executor returns the exception as result.
+            parameter_ring.put(SendError(f'Send parameter failed: <{type(e).__name__}> {e}'))
 
 
 def send_result(
         future_queue: """queue.Queue[ExecutorFuture]""",
-        shared_value: SharedValue,
-        result_ready_event: multiprocessing.Event,
-        result_received_event: multiprocessing.Event
+        result_ring: SharedRing,
 ):
     while True:
-        # wait for executor has finished the task.
-        result_ready_event.wait()
-        result_ready_event.clear()
-
-        # get result from shared memory and set it into future.
-        result = shared_value.get_object()
+        # wait for executor has finished the task, get result from shared memory and set it into future.
+        try:
+            result = result_ring.get()
+        except Exception as e:
+            result = ExecutorResult(exception=SendError(f'Receive result failed: <{type(e).__name__}> {e}'))
         future = future_queue.get()
-        future.set_result(result)
+        if isinstance(future, list):
+            # batch: the results of futures, or one failure for all of them.
+            results = result if isinstance(result, list) else [result] * len(future)
+            [_future.set_result(_result) for _future, _result in zip(future, results)]
+        else:
+            future.set_result(result)
+
 
-        # notify executor the result is received.
-        result_received_event.set()
+def receive_parameter(
+        parameter_ring: SharedRing,
+        received_queue: queue.Queue,
+        zero_copy: bool = False,
+):
+    while True:
+        # with zero_copy, arrays in parameter are views of shared memory, the slot is released after the task is
+        # finished.
+        try:
+            parameter = parameter_ring.get(copy=not zero_copy, release=False)
+            if isinstance(parameter, dict) and parameter_ring.arena:
+                parameter = resolve_handles(parameter, parameter_ring.arena, copy=not zero_copy)
+            elif isinstance(parameter, ExecutorBatch) and parameter_ring.arena:
+                parameter = parameter._replace(
+                    parameter=resolve_handles(parameter.parameter, parameter_ring.arena, copy=not zero_copy)
+                )
+        except Exception as e:
+            parameter = SendError(f'Receive parameter failed: <{type(e).__name__}> {e}')
+        received_queue.put(parameter)
 
 
 def execute_thread_callback(
@@ -185,22 +793,162 @@ def execute_thread_callback(
         execute_thread_parameter_queue.task_done()
 
 
-class Executor(Process):
+class ExecuteRunner(object):
+    """execute callback in the execute thread with timeout, the thread is killed when timeout."""
+    _execute_thread: Thread = None
+    _execute_thread_parameter_queue: queue.Queue
+    _execute_thread_result_queue: queue.Queue
+
+    def __init__(self, execute_callback: Callable[[Any], Any], execute_timeout: Union[int, float]):
+        self.execute_callback = execute_callback
+        self.execute_timeout = execute_timeout
+
+    def execute(self, parameter: dict) -> ExecutorResult:
+        start_time = time.time()
+
+        # restart execute thread
+        if not self._execute_thread or not self._execute_thread.is_alive():
+            self._execute_thread_parameter_queue = queue.Queue()
+            self._execute_thread_result_queue = queue.Queue()
+
+            self._execute_thread = Thread(
+                target=execute_thread_callback,
+                args=(
+                    self.execute_callback,
+                    self._execute_thread_parameter_queue,
+                    self._execute_thread_result_queue,
+                ),
+                daemon=True,
+            )
+            self._execute_thread.start()
+
+        self._execute_thread_parameter_queue.put(parameter)
+
+        try:
+            result = self._execute_thread_result_queue.get(timeout=self.execute_timeout)
+            if isinstance(result, Exception):
+                return ExecutorResult(exception=result, start_time=start_time, end_time=time.time())
+            else:
+                return ExecutorResult(result=result, start_time=start_time, end_time=time.time())
+        except queue.Empty:
+            exception = TimeoutError(f'Executor execute timeout: {self.execute_timeout}')
+
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_long(self._execute_thread.ident),
+                ctypes.py_object(SystemExit),
+            )
+            # the thread may be blocked out of Python (e.g. sleep), leave it and start a new one for next task.
+            self._execute_thread = None
+            return ExecutorResult(exception=exception, start_time=start_time, end_time=time.time())
+
+
+def check_callbacks(execute_callback: Callable[[Any], Any], initial_callback: Callable[[], Any]) -> None:
+    assert callable(execute_callback), F'executor_callback: {execute_callback} must be callable.'
+    assert callable(initial_callback), f'_initial_callback: {initial_callback} must be callable.'
+
+    # initial callback with no parameter
+    assert signature(initial_callback).parameters == {}, \
+        '_initial_callback must have no parameter.'
+
+    # execute callback must have variable parameter
+    execute_parameter = signature(execute_callback).parameters
+    assert Parameter.VAR_KEYWORD in [_.kind for _ in execute_parameter.values()], \
+        'executor_callback must have variable parameter.'
+
+
+class ExecutorMixin(object):
+    """Submit tasks and count the tasks in flight, the tasks are sent by ``_send``."""
+    name: str
+    action_inputs: Optional[List[str]]
+
+    submit_lock: threading.Lock
+    _outstanding: int = 0
+    """number of tasks submitted and not finished."""
+    _execution_time: Optional[float] = None
+    """moving average of execution time."""
+
+    @property
+    def outstanding(self) -> int:
+        """number of tasks in flight."""
+        return self._outstanding
+
+    @property
+    def execution_time(self) -> Optional[float]:
+        """exponential moving average of execution time in seconds, None before any task is finished."""
+        return self._execution_time
+
+    def _task_done(self, future: ExecutorFuture) -> None:
+        with self.submit_lock:
+            self._outstanding -= 1
+
+            if (result := future._result) is not None and result.end_time:
+                execution_time = result.end_time - result.start_time
+                self._execution_time = execution_time if self._execution_time is None else \
+                    EXECUTION_TIME_ALPHA * execution_time + (1 - EXECUTION_TIME_ALPHA) * self._execution_time
+
+    def _send(self,
+              parameter: Union[dict, ExecutorBatch],
+              futures: Union[ExecutorFuture, List[ExecutorFuture]],
+              ) -> None:
+        """send the parameter (or batch) and its future (or futures), in order of submitted."""
+        raise NotImplementedError
+
+    def submit(self, parameter: dict):
+        # only the declared inputs are sent.
+        parameter = select_action_inputs(parameter, self.action_inputs)
+
+        with self.submit_lock:
+            future = ExecutorFuture()
+            # TODO: extra properties
+            future._name = str(self.name)
+            future.add_done_callback(self._task_done)
+            self._outstanding += 1
+
+            self._send(parameter, future)
+            return future
+
+    async def submit_async(self, parameter: dict) -> Any:
+        """submit a task and await the result in event loop."""
+        return await wrap_executor_future(self.submit(parameter))
+
+    def submit_batch(self, parameter: dict, expends: Iterable[Any]) -> List[ExecutorFuture]:
+        """submit a task for each expend, the parameter is sent once and the results are received in one message."""
+        # only the declared inputs are sent.
+        parameter = select_action_inputs(parameter, self.action_inputs)
+
+        if not (expends := list(expends)):
+            return []
+
+        with self.submit_lock:
+            futures = [ExecutorFuture() for _ in expends]
+            for future in futures:
+                future._name = str(self.name)
+                future.add_done_callback(self._task_done)
+            self._outstanding += len(futures)
+
+            self._send(ExecutorBatch(parameter=parameter, expends=expends), futures)
+            return futures
+
+
+class Executor(ExecutorMixin, Process):
+    """Run the action in a sub process, the parameters and results are sent by shared memory.
+
+    The arrays in parameter are copied out of shared memory by default. With ``zero_copy``, they are views of shared
+    memory, which are only valid until the call returns (the slot and blocks are reused by the next frames), so the
+    action must copy the inputs it keeps (e.g. the previous frame of a tracker).
+    """
+
     # properties in sub process by inheritance
     execute_timeout: Union[int, float]
 
-    _parameter_shared_value: SharedValue
-    _result_shared_value: SharedValue
+    pipeline_depth: int
+
+    _parameter_ring: SharedRing
+    _result_ring: SharedRing
 
     _initial_callback: Callable[[], Any]
     _execute_callback: Callable[[Any], Any]
 
-    # events
-    _parameter_ready_event: multiprocessing.Event
-    _parameter_received_event: multiprocessing.Event
-    _result_ready_event: multiprocessing.Event
-    _result_received_event: multiprocessing.Event
-
     # queue in main process
     parameter_queue: queue.Queue
     future_queue: """queue.Queue[ExecutorFuture]"""
@@ -209,6 +957,9 @@ class Executor(Process):
     _send_parameter_thread: Thread = None
     _send_result_thread: Thread = None
 
+    # execute thread in sub process
+    _execute_runner: ExecuteRunner = None
+
     def __init__(self,
 
                  execute_callback: Callable[[Any], Any],
@@ -218,16 +969,34 @@ class Executor(Process):
 
                  initial_timeout: Union[int, float] = 10,
                  execute_timeout: Union[int, float] = 10,
+                 pipeline_depth: int = DEFAULT_PIPELINE_DEPTH,
+                 arena: SharedArena = None,
+                 action_inputs: List[str] = None,
                  name=None,
+                 wait: bool = True,
+                 direct_results: bool = False,
+                 zero_copy: bool = False,
                  ):
+        """
+        Args:
+            wait: wait for the initial callback. Otherwise ``wait_ready`` must be called before submitting, so
+                executors could be initialed concurrently.
+            zero_copy: the arrays in parameter are views of shared memory instead of copies, see above.
+            direct_results: save the large results into the arena (``share_result``) and send their handles back,
+                the handles must be adopted by a SharedObjectStore of the arena. Arena is required.
+        """
+        assert not direct_results or arena is not None, 'direct_results requires arena.'
+
         # properties in sub process by inheritance
-        self._parameter_shared_value = SharedValue()
-        self._result_shared_value = SharedValue()
+        self.pipeline_depth = pipeline_depth
+        self.action_inputs = action_inputs
+        self._arena = arena
+        self._direct_results = direct_results
+        self._zero_copy = zero_copy
 
-        self._parameter_ready_event = multiprocessing.Event()
-        self._parameter_received_event = multiprocessing.Event()
-        self._result_ready_event = multiprocessing.Event()
-        self._result_received_event = multiprocessing.Event()
+        # large messages are saved in the arena (shared by executors) if provided.
+        self._parameter_ring = SharedRing(depth=pipeline_depth, arena=arena)
+        self._result_ring = SharedRing(depth=pipeline_depth, arena=arena)
 
         self._execute_callback = execute_callback
         self._initial_callback = initial_callback
@@ -236,17 +1005,7 @@ class Executor(Process):
         self.execute_timeout = execute_timeout
 
         # check parameters
-        assert callable(self._execute_callback), F'executor_callback: {self._execute_callback} must be callable.'
-        assert callable(self._initial_callback), f'_initial_callback: {self._initial_callback} must be callable.'
-
-        # initial callback with no parameter
-        assert signature(self._initial_callback).parameters == {}, \
-            '_initial_callback must have no parameter.'
-
-        # execute callback must have variable parameter
-        execute_parameter = signature(self._execute_callback).parameters
-        assert Parameter.VAR_KEYWORD in [_.kind for _ in execute_parameter.values()], \
-            'executor_callback must have variable parameter.'
+        check_callbacks(self._execute_callback, self._initial_callback)
 
         # properties in main process
         self.parameter_queue = queue.Queue()
@@ -258,9 +1017,7 @@ class Executor(Process):
             target=send_parameter,
             args=(
                 self.parameter_queue,
-                self._parameter_shared_value,
-                self._parameter_ready_event,
-                self._parameter_received_event,
+                self._parameter_ring,
             ),
             daemon=True,
         )
@@ -269,9 +1026,7 @@ class Executor(Process):
             target=send_result,
             args=(
                 self.future_queue,
-                self._result_shared_value,
-                self._result_ready_event,
-                self._result_received_event,
+                self._result_ring,
             ),
             daemon=True,
         )
@@ -279,82 +1034,89 @@ class Executor(Process):
 
         # start sync
         self._barrier = Barrier(2)
+        self._initial_duration = RawValue('d', -1)
+        self.initial_timeout = initial_timeout
 
         Process.__init__(self, daemon=True, name=name)
         self.start()
 
+        if wait:
+            self.wait_ready()
+
+    def wait_ready(self, timeout: Union[int, float] = None) -> 'Executor':
+        """wait for the initial callback in sub process, exit when timeout (initial_timeout by default)."""
         try:
-            self._barrier.wait(initial_timeout)
+            self._barrier.wait(self.initial_timeout if timeout is None else timeout)
         except:
             self.exit()
             raise TimeoutError('Executor initial timeout.')
+        return self
+
+    @property
+    def initial_duration(self) -> Optional[float]:
+        """seconds of the initial callback in sub process, None before it's finished."""
+        return self._initial_duration.value if self._initial_duration.value >= 0 else None
 
     def run(self) -> None:
 
+        start_time = time.time()
         self._initial_callback()
+        self._initial_duration.value = time.time() - start_time
         self._barrier.wait()
 
-        execute_thread: Thread = None
-        execute_thread_parameter_queue = queue.Queue()
-        execute_thread_result_queue = queue.Queue()
+        # receive the next parameters while the current task is running.
+        received_queue = queue.Queue()
+        Thread(
+            target=receive_parameter, args=(self._parameter_ring, received_queue, self._zero_copy), daemon=True,
+        ).start()
 
         while True:
-            self._parameter_ready_event.wait()
-            self._parameter_ready_event.clear()
-
-            start_time = time.time()
-            parameter = self._parameter_shared_value.get_object()
-
-            self._parameter_received_event.set()
-
-            # restart execute thread
-            if not execute_thread or not execute_thread.is_alive():
-                execute_thread_parameter_queue = queue.Queue()
-                execute_thread_result_queue = queue.Queue()
-
-                execute_thread = Thread(
-                    target=execute_thread_callback,
-                    args=(
-                        self._execute_callback,
-                        execute_thread_parameter_queue,
-                        execute_thread_result_queue,
-                    ),
-                    daemon=True,
-                )
-                execute_thread.start()
-
-            execute_thread_parameter_queue.put(parameter)
-
+            parameter = received_queue.get()
+
+            if isinstance(parameter, SendError):
+                # failed in main process, no execution.
+                executor_result = ExecutorResult(exception=parameter, start_time=time.time(), end_time=time.time())
+            elif isinstance(parameter, ExecutorBatch):
+                # results of all expends are sent in one message.
+                executor_result = [
+                    self._execute({**parameter.parameter, 'expend': expend}) for expend in parameter.expends
+                ]
+            else:
+                executor_result = self._execute(parameter)
+
+            if self._direct_results:
+                executor_result = [self._share(_) for _ in executor_result] \
+                    if isinstance(executor_result, list) else self._share(executor_result)
+
+            # result may be a view of parameter, release the parameter slot after the result is saved.
+            del parameter
             try:
-                result = execute_thread_result_queue.get(timeout=self.execute_timeout)
-                if isinstance(result, Exception):
-                    executor_result = ExecutorResult(exception=result, start_time=start_time, end_time=time.time())
-                else:
-                    executor_result = ExecutorResult(result=result, start_time=start_time, end_time=time.time())
-            except queue.Empty:
-                exception = TimeoutError(f'Executor execute timeout: {self.execute_timeout}')
-
-                ctypes.pythonapi.PyThreadState_SetAsyncExc(
-                    ctypes.c_long(execute_thread.ident),
-                    ctypes.py_object(SystemExit),
-                )
-                executor_result = ExecutorResult(exception=exception, start_time=start_time, end_time=time.time())
-
-            self._result_shared_value.set_object(executor_result)
-
-            self._result_ready_event.set()
-
-            self._result_received_event.wait()
-            self._result_received_event.clear()
-
-    def submit(self, parameter: dict):
-        with self.submit_lock:
-            future = ExecutorFuture()
-            # TODO: extra properties
-            future._name = str(self.name)
-            self.parameter_queue.put(parameter)
-            self.future_queue.put(future)
-            return future
+                self._result_ring.put(executor_result)
+            except Exception as e:
+                self._result_ring.put(ExecutorResult(
+                    exception=SendError(f'Send result failed: <{type(e).__name__}> {e}'),
+                    start_time=time.time(),
+                    end_time=time.time(),
+                ))
+            self._parameter_ring.release()
+
+    def _share(self, executor_result: ExecutorResult) -> ExecutorResult:
+        if executor_result.exception is not None:
+            return executor_result
+        return executor_result._replace(result=share_result(executor_result.result, self._arena))
+
+    def _execute(self, parameter: dict) -> ExecutorResult:
+        """execute callback in the execute thread with timeout, the thread is killed when timeout."""
+        if self._execute_runner is None:
+            self._execute_runner = ExecuteRunner(self._execute_callback, self.execute_timeout)
+        return self._execute_runner.execute(parameter)
+
+    def _send(self,
+              parameter: Union[dict, ExecutorBatch],
+              futures: Union[ExecutorFuture, List[ExecutorFuture]],
+              ) -> None:
+        self.parameter_queue.put(parameter)
+        self.future_queue.put(futures)
 
     def exit(self):
         self.kill()
@@ -369,40 +1131,693 @@ class Executor(Process):
         )
 
 
+class ThreadExecutor(ExecutorMixin):
+    """Run the action in threads of main process, with the same contract (``submit``, futures and timeout) of
+    ``Executor``.
+
+    The parameters are not pickled or copied into shared memory, the handles of object store are resolved to the
+    original objects. For the actions releasing GIL (e.g. numpy, OpenCV).
+    """
+
+    def __init__(self,
+
+                 execute_callback: Callable[[Any], Any],
+
+                 initial_callback: Callable[[], Any] = DEFAULT_INITIAL_CALLBACK,
+                 final_callback: Callable[[], Any] = DEFAULT_FINAL_CALLBACK,
+
+                 initial_timeout: Union[int, float] = 10,
+                 execute_timeout: Union[int, float] = 10,
+                 pipeline_depth: int = DEFAULT_PIPELINE_DEPTH,
+                 object_store: SharedObjectStore = None,
+                 action_inputs: List[str] = None,
+                 name=None,
+                 wait: bool = True,
+                 ):
+        """
+        Args:
+            pipeline_depth: number of threads executing the tasks.
+            object_store: resolve the handles in parameters.
+        """
+        check_callbacks(execute_callback, initial_callback)
+
+        self._execute_callback = execute_callback
+        self._initial_callback = initial_callback
+        self._final_callback = final_callback
+
+        self.initial_timeout = initial_timeout
+        self.execute_timeout = execute_timeout
+        self.pipeline_depth = pipeline_depth
+        self.object_store = object_store
+        self.action_inputs = action_inputs
+        self.name = name or f'ThreadExecutor-{id(self)}'
+
+        self.submit_lock = threading.Lock()
+        self._task_queue: 'queue.Queue[Optional[Tuple]]' = queue.Queue()
+        self._ready_event = threading.Event()
+        self._initial_duration: Optional[float] = None
+        self._exited = False
+
+        self._threads = [Thread(target=self._initial, daemon=True, name=f'{self.name}_initial')]
+        self._threads[0].start()
+
+        if wait:
+            self.wait_ready()
+
+    def _initial(self) -> None:
+        start_time = time.time()
+        self._initial_callback()
+        self._initial_duration = time.time() - start_time
+
+        # the tasks submitted before ready are waiting in queue.
+        for index in range(self.pipeline_depth):
+            thread = Thread(target=self._work, daemon=True, name=f'{self.name}_{index}')
+            thread.start()
+            self._threads.append(thread)
+        self._ready_event.set()
+
+    def _work(self) -> None:
+        runner = ExecuteRunner(self._execute_callback, self.execute_timeout)
+
+        while (task := self._task_queue.get()) is not None:
+            parameter, futures = task
+
+            if isinstance(parameter, ExecutorBatch):
+                for future, expend in zip(futures, parameter.expends):
+                    future.set_result(runner.execute({**parameter.parameter, 'expend': expend}))
+            else:
+                futures.set_result(runner.execute(parameter))
+
+    def _send(self,
+              parameter: Union[dict, ExecutorBatch],
+              futures: Union[ExecutorFuture, List[ExecutorFuture]],
+              ) -> None:
+        if self.object_store is not None:
+            if isinstance(parameter, ExecutorBatch):
+                parameter = parameter._replace(parameter=map_handles(parameter.parameter, self.object_store.get))
+            else:
+                parameter = map_handles(parameter, self.object_store.get)
+        self._task_queue.put((parameter, futures))
+
+    def wait_ready(self, timeout: Union[int, float] = None) -> 'ThreadExecutor':
+        """wait for the initial callback, exit when timeout (initial_timeout by default)."""
+        if not self._ready_event.wait(self.initial_timeout if timeout is None else timeout):
+            self.exit()
+            raise TimeoutError('Executor initial timeout.')
+        return self
+
+    @property
+    def initial_duration(self) -> Optional[float]:
+        """seconds of the initial callback, None before it's finished."""
+        return self._initial_duration
+
+    @property
+    def pid(self) -> int:
+        return os.getpid()
+
+    def is_alive(self) -> bool:
+        return not self._exited and any(thread.is_alive() for thread in self._threads)
+
+    def join(self, timeout: Union[int, float] = None) -> None:
+        [thread.join(timeout) for thread in self._threads]
+
+    def exit(self):
+        """the threads exit after the current tasks."""
+        self._exited = True
+        [self._task_queue.put(None) for _ in range(self.pipeline_depth)]
+
+
+class MicroBatchExecutor(ExecutorMixin):
+    """Collect the tasks submitted to an action in ``batch_delay`` seconds (``batch_size`` at most), and run them by one
+    task of the executor, whose action is called with ``frames`` (the list of parameters) and returns a list of results.
+
+    The concurrent frames of plans (e.g. of many streams) are batched at runtime for the actions vectorized across
+    frames, such as ObserverHost. The results are returned by value (the executor is created without direct results).
+    """
+
+    def __init__(self,
+                 executor: Union[Executor, ThreadExecutor],
+                 batch_size: int,
+                 batch_delay: Union[int, float] = DEFAULT_MICRO_BATCH_DELAY,
+                 action_inputs: List[str] = None,
+                 ):
+        """
+        Args:
+            executor: executor of the action receiving ``frames``, with all the inputs (no action_inputs).
+            action_inputs: keys of parameter of each frame.
+        """
+        assert batch_size > 0, 'batch_size must be positive.'
+
+        self.executor = executor
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.action_inputs = action_inputs
+        self.name = executor.name
+
+        self.submit_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._pending: List[Tuple[dict, ExecutorFuture]] = []
+        self._exited = False
+
+        self._batch_thread = Thread(target=self._batch, daemon=True, name=f'{self.name}_batch')
+        self._batch_thread.start()
+
+    def _send(self,
+              parameter: Union[dict, ExecutorBatch],
+              futures: Union[ExecutorFuture, List[ExecutorFuture]],
+              ) -> None:
+        if isinstance(parameter, ExecutorBatch):
+            tasks = [({**parameter.parameter, 'expend': expend}, future)
+                     for expend, future in zip(parameter.expends, futures)]
+        else:
+            tasks = [(parameter, futures)]
+
+        with self._condition:
+            self._pending.extend(tasks)
+            self._condition.notify()
+
+    def _batch(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._exited)
+                if self._exited:
+                    return
+
+                # wait for more frames from the first one of batch.
+                deadline = time.time() + self.batch_delay
+                while len(self._pending) < self.batch_size and (timeout := deadline - time.time()) > 0:
+                    self._condition.wait(timeout)
+
+                tasks, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+
+            frames, futures = zip(*tasks)
+            executor_future = self.executor.submit({'frames': list(frames)})
+            executor_future.add_done_callback(functools.partial(self._split, futures))
+
+    @staticmethod
+    def _split(futures: Tuple[ExecutorFuture, ...], executor_future: ExecutorFuture) -> None:
+        """set the result of each frame from the result of batch."""
+        executor_result = executor_future._result
+
+        if executor_result.exception is None and (
+                not isinstance(executor_result.result, (list, tuple)) or len(executor_result.result) != len(futures)
+        ):
+            executor_result = executor_result._replace(result=None, exception=ValueError(
+                f'Micro batch action must return a list of {len(futures)} results.'
+            ))
+
+        for index, future in enumerate(futures):
+            if executor_result.exception is not None:
+                future.set_result(executor_result)
+            else:
+                future.set_result(executor_result._replace(result=executor_result.result[index]))
+
+    def wait_ready(self, timeout: Union[int, float] = None) -> 'MicroBatchExecutor':
+        self.executor.wait_ready(timeout)
+        return self
+
+    @property
+    def initial_duration(self) -> Optional[float]:
+        return self.executor.initial_duration
+
+    @property
+    def pid(self) -> int:
+        return self.executor.pid
+
+    def is_alive(self) -> bool:
+        return self.executor.is_alive()
+
+    def join(self, timeout: Union[int, float] = None) -> None:
+        self.executor.join(timeout)
+
+    def exit(self):
+        with self._condition:
+            self._exited = True
+            self._condition.notify()
+        self.executor.exit()
+
+
+def initial_actions(action_names: Tuple[str, ...]) -> None:
+    """initial callback of plan workers, initial the actions once."""
+    [get_action(action_name).action_initial_function() for action_name in action_names]
+
+
+def execute_plan_callback(plan: Tuple[Tuple[str, Tuple[str, ...]], ...], parameter: dict, **kwargs) -> Dict[str, Any]:
+    """execute callback of plan workers, run the whole plan (``CompiledPlan.spec``) locally."""
+    return execute_plan(plan_from_spec(plan), parameter)
+
+
+EXECUTOR_MODES: Dict[str, type] = {
+    'process': Executor,
+    'thread': ThreadExecutor,
+}
+"""execution mode of action: executor class."""
+
+
+def route_least_outstanding(executors: List[Executor], index: int) -> Executor:
+    """the replica with the least tasks in flight, ties are broken in turn."""
+    offset = index % len(executors)
+    return min(executors[offset:] + executors[:offset], key=lambda executor: executor.outstanding)
+
+
+def route_round_robin(executors: List[Executor], index: int) -> Executor:
+    """the replicas in turn."""
+    return executors[index % len(executors)]
+
+
+def route_power_of_two(executors: List[Executor], index: int) -> Executor:
+    """the one with less tasks in flight of two random replicas."""
+    if len(executors) == 1:
+        return executors[0]
+    return min(random.sample(executors, 2), key=lambda executor: executor.outstanding)
+
+
+ROUTING_POLICIES: Dict[str, Callable[[List[Executor], int], Executor]] = {
+    'least_outstanding': route_least_outstanding,
+    'round_robin': route_round_robin,
+    'power_of_two': route_power_of_two,
+}
+"""routing policy: (replicas, index of routing) -> replica."""
+
+
+def _split_expends(expends: List[Any], number: int) -> List[List[Any]]:
+    """split expends into number of contiguous chunks with nearly equal length."""
+    size, rest = divmod(len(expends), number)
+    bounds = [index * size + min(index, rest) for index in range(number + 1)]
+    return [expends[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class AutoscalePolicy(NamedTuple):
+    """Bounds and thresholds of autoscaling the replicas of an action."""
+    min_number: int = 1
+    max_number: int = 4
+    scale_up_outstanding: float = 2.0
+    """scale up when the average tasks in flight of replicas is above it."""
+    scale_down_outstanding: float = 0.5
+    """scale down when the average tasks in flight of replicas is below it."""
+    latency_limit: Optional[float] = None
+    """scale up when the average execution time (seconds) is above it."""
+    scale_up_ticks: int = 3
+    """consecutive ticks over the thresholds before scaling up."""
+    scale_down_ticks: int = 10
+    """consecutive ticks under the thresholds before scaling down."""
+    cooldown: float = 5.0
+    """seconds without scaling after scaled."""
+
+
 class ExecutorManager(object):
     executor_mapper: Dict[str, List[Executor]]
+    """replicas of actions. The list is replaced (not modified) when it's scaled, so it's safe to be read."""
+
+    _arena: SharedArena = None
+    _object_store: SharedObjectStore = None
 
     def __init__(self,
                  execute_timeout: int = 5,
                  initial_timeout: int = 5,
+                 pipeline_depth: int = DEFAULT_PIPELINE_DEPTH,
+                 arena_size: int = DEFAULT_SHARED_ARENA_SIZE,
+                 routing_policy: Union[str, Callable[[List[Executor], int], Executor]] = 'least_outstanding',
+                 direct_results: bool = False,
                  ):
+        """
+        Args:
+            direct_results: the process executors save their large results into the arena and send back handles,
+                so the results are sent to the next steps without a round trip through main process. The handles
+                are adopted and released by ``PlanRun``, the results of ``submit`` and ``submit_batch`` may be
+                handles which should be adopted by ``object_store``.
+        """
         self.execute_timeout = execute_timeout
         self.initial_timeout = initial_timeout
+        self.pipeline_depth = pipeline_depth
+        self.arena_size = arena_size
+        self.direct_results = direct_results
+
+        self.routing_policy = ROUTING_POLICIES[routing_policy] if isinstance(routing_policy, str) else routing_policy
+        assert callable(self.routing_policy), f'routing_policy: {routing_policy} must be callable.'
+        self._routing_counter = itertools.count()
 
         self.executor_mapper = {}
+        self.plan_workers: List[Executor] = []
+        """workers running the whole plans, see ``start_plan_workers``."""
+        self.plan_worker_actions: frozenset = frozenset()
+        self.executor_modes: Dict[str, str] = {}
+        """execution mode of actions, 'process' by default."""
+        self.action_mapper: Dict[str, Action] = {}
+        self._name_counters: Dict[str, Iterable[int]] = {}
+
+        # autoscale
+        self.autoscale_policies: Dict[str, AutoscalePolicy] = {}
+        self._autoscale_states: Dict[str, List] = {}
+        """name: [ticks over thresholds, ticks under thresholds, last scaled time]"""
+        self._autoscale_lock = threading.Lock()
+        self._autoscale_thread: Thread = None
+        self._autoscale_stop_event = threading.Event()
+
+    @property
+    def arena(self) -> SharedArena:
+        """shared memory of all executors, created when the first executor is registered."""
+        if self._arena is None:
+            self._arena = SharedArena(size=self.arena_size)
+        return self._arena
+
+    @property
+    def object_store(self) -> SharedObjectStore:
+        """objects shared by steps of frames, in the arena."""
+        if self._object_store is None:
+            self._object_store = SharedObjectStore(arena=self.arena)
+        return self._object_store
+
+    def register_action(self, action: Union[str, Action], number: int = 1, mode: str = 'process'):
+        """register an action into manager with number of executors
+
+        Args:
+            mode: 'process' runs the action in sub processes (``Executor``), 'thread' runs it in threads of main
+                process (``ThreadExecutor``) without IPC, for the actions releasing GIL.
+        """
+        action_name = action if isinstance(action, str) else action.name
+        self.register_actions({action: number}, action_mode_mapper={action_name: mode})
+
+    def register_actions(
+            self,
+            action_number_mapper: Dict[Union[str, Action], int],
+            action_mode_mapper: Dict[str, str] = None,
+    ) -> Dict[str, List[float]]:
+        """register actions with number of executors, all the executors are initialed concurrently.
+
+        Return the initial durations of replicas of the actions.
+        """
+        for action_name, mode in (action_mode_mapper or {}).items():
+            assert mode in EXECUTOR_MODES, f'mode of {action_name} must be one of {list(EXECUTOR_MODES)}.'
+            self.executor_modes[action_name] = mode
 
-    def register_action(self, action: Union[str, Action], number: int = 1):
-        """register an action into manager with number of executors"""
         # find by name
-        if isinstance(action, str):
-            action = get_registered_actions().get(action)
+        actions = [
+            (get_registered_actions().get(action) if isinstance(action, str) else action, number)
+            for action, number in action_number_mapper.items()
+        ]
 
         # assert
-        assert isinstance(action, Action), 'Need an Action instance.'
+        for action, _ in actions:
+            assert isinstance(action, Action), 'Need an Action instance.'
+
+        # start all executors, then wait for them with the same deadline.
+        deadline = time.time() + self.initial_timeout
+        executors_list = []
+        try:
+            for action, number in actions:
+                self._name_counters[action.name] = itertools.count()
+                executors_list.append([self._create_executor(action, wait=False) for _ in range(number)])
+
+            for executors in executors_list:
+                for executor in executors:
+                    executor.wait_ready(max(deadline - time.time(), 0))
+        except:
+            for executor in itertools.chain.from_iterable(executors_list):
+                executor.exit()
+            raise
 
         # register
-        self.executor_mapper[action.name] = [Executor(
+        for (action, _), executors in zip(actions, executors_list):
+            self.action_mapper[action.name] = action
+            self.executor_mapper[action.name] = executors
+
+        return {action.name: self.initial_durations[action.name] for action, _ in actions}
+
+    @property
+    def initial_durations(self) -> Dict[str, List[float]]:
+        """seconds of the initial callbacks of replicas of actions."""
+        return {
+            action_name: [executor.initial_duration for executor in executors]
+            for action_name, executors in self.executor_mapper.items()
+        }
+
+    def register_fused(self, plan: StepPlan, number: int = 1) -> List[str]:
+        """register the fused actions of plan (see ``StepPlan.fuse``) not registered yet, return their names."""
+        fused_actions = [
+            step.action for step in plan.compile().steps
+            if step.action.fused_outputs is not None and step.name not in self.executor_mapper
+        ]
+        if fused_actions:
+            self.register_actions({action: number for action in fused_actions})
+        return [action.name for action in fused_actions]
+
+    def _create_executor(self, action: Action, wait: bool = True) -> Union[Executor, ThreadExecutor, MicroBatchExecutor]:
+        """create and initial a replica of action."""
+        if action.micro_batch_size > 1:
+            return MicroBatchExecutor(
+                self._create_action_executor(action, wait=wait, micro_batch=True),
+                batch_size=action.micro_batch_size,
+                batch_delay=action.micro_batch_delay,
+                action_inputs=action.action_inputs,
+            )
+        return self._create_action_executor(action, wait=wait)
+
+    def _create_action_executor(self, action: Action, wait: bool = True, micro_batch: bool = False
+                                ) -> Union[Executor, ThreadExecutor]:
+        """create the executor of action, which receives ``frames`` with all their inputs if micro batched."""
+        action_inputs = None if micro_batch else action.action_inputs
+
+        if self.executor_modes.get(action.name) == 'thread':
+            return ThreadExecutor(
+                execute_callback=action.action_function,
+                initial_callback=action.action_initial_function,
+                final_callback=action.action_final_function,
+
+                execute_timeout=self.execute_timeout,
+                initial_timeout=self.initial_timeout,
+                pipeline_depth=self.pipeline_depth,
+                object_store=self.object_store,
+                action_inputs=action_inputs,
+
+                name=f'{action.name}_{next(self._name_counters[action.name])}',
+                wait=wait,
+            )
+
+        return Executor(
             execute_callback=action.action_function,
             initial_callback=action.action_initial_function,
             final_callback=action.action_final_function,
 
             execute_timeout=self.execute_timeout,
             initial_timeout=self.initial_timeout,
+            pipeline_depth=self.pipeline_depth,
+            arena=self.arena,
+            action_inputs=action_inputs,
+
+            name=f'{action.name}_{next(self._name_counters[action.name])}',
+            wait=wait,
+            direct_results=self.direct_results and not micro_batch,
+            zero_copy=action.zero_copy_inputs,
+        )
+
+    def set_autoscale_policy(self, action_name: str, policy: AutoscalePolicy = None, **kwargs) -> None:
+        """autoscale the replicas of a registered action by policy (or the fields of AutoscalePolicy)."""
+        assert action_name in self.executor_mapper, f'action {action_name} is not registered.'
+
+        policy = policy or AutoscalePolicy(**kwargs)
+        assert 0 < policy.min_number <= policy.max_number, f'wrong bounds of policy {policy}.'
+        assert policy.scale_down_outstanding < policy.scale_up_outstanding, f'wrong thresholds of policy {policy}.'
+
+        self.autoscale_policies[action_name] = policy
+        self._autoscale_states[action_name] = [0, 0, 0]
 
-            name=f'{action.name}_{_}',
-        ) for _ in range(number)]
+    def start_autoscaler(self, interval: Union[int, float] = DEFAULT_AUTOSCALE_INTERVAL) -> None:
+        """check the policies every interval seconds in a thread."""
+        if self._autoscale_thread and self._autoscale_thread.is_alive():
+            return
+
+        def _autoscale_loop():
+            while not self._autoscale_stop_event.wait(interval):
+                self.autoscale()
+
+        self._autoscale_stop_event.clear()
+        self._autoscale_thread = Thread(target=_autoscale_loop, daemon=True)
+        self._autoscale_thread.start()
+
+    def stop_autoscaler(self) -> None:
+        self._autoscale_stop_event.set()
+
+    def autoscale(self) -> Dict[str, int]:
+        """check the policies once, add or retire replicas. Return the changes of number.
+
+        A failed action (e.g. the new replica is timeout in initial) is logged and retried after the cooldown, the
+        other actions are not affected.
+        """
+        changes = {}
+        with self._autoscale_lock:
+            for action_name, policy in list(self.autoscale_policies.items()):
+                if executors := self.executor_mapper.get(action_name):
+                    try:
+                        change = self._autoscale_action(action_name, policy, executors)
+                    except Exception as e:
+                        DEFAULT_LOGGER.error(f'autoscale action {action_name} failed.', exc_info=e)
+                        self._autoscale_states[action_name][:] = [0, 0, time.time()]
+                        continue
+                    if change:
+                        changes[action_name] = change
+        return changes
+
+    def _autoscale_action(self, action_name: str, policy: AutoscalePolicy, executors: List[Executor]) -> int:
+        state = self._autoscale_states[action_name]
+
+        outstanding = sum(executor.outstanding for executor in executors) / len(executors)
+        execution_times = [executor.execution_time for executor in executors if executor.execution_time is not None]
+        execution_time = sum(execution_times) / len(execution_times) if execution_times else 0
+
+        # hysteresis: count the consecutive ticks over / under the thresholds.
+        over = outstanding > policy.scale_up_outstanding or \
+            (policy.latency_limit is not None and execution_time > policy.latency_limit)
+        under = outstanding < policy.scale_down_outstanding and \
+            (policy.latency_limit is None or execution_time <= policy.latency_limit)
+        state[0] = state[0] + 1 if over else 0
+        state[1] = state[1] + 1 if under else 0
+
+        if time.time() - state[2] < policy.cooldown:
+            return 0
+
+        if (state[0] >= policy.scale_up_ticks and len(executors) < policy.max_number) or \
+                len(executors) < policy.min_number:
+            # warmed by the initial function before it takes traffic.
+            self.executor_mapper[action_name] = [*executors, self._create_executor(self.action_mapper[action_name])]
+            change = 1
+        elif (state[1] >= policy.scale_down_ticks and len(executors) > policy.min_number) or \
+                len(executors) > policy.max_number:
+            # not routed anymore, exit after its tasks are finished.
+            *self.executor_mapper[action_name], retired_executor = executors
+            Thread(target=self._retire_executor, args=(retired_executor,), daemon=True).start()
+            change = -1
+        else:
+            return 0
+
+        state[:] = [0, 0, time.time()]
+        return change
+
+    def _retire_executor(self, executor: Executor) -> None:
+        deadline = time.time() + self.execute_timeout * (executor.outstanding + 1)
+        while executor.outstanding and time.time() < deadline:
+            time.sleep(RETIRE_CHECK_INTERVAL)
+        executor.exit()
+
+    def start_plan_workers(self, number: int = 1, actions: Iterable[Union[str, Action]] = None) -> List[Executor]:
+        """start workers running the whole plans for frames, instead of a process for each step.
+
+        Each worker initials the actions (all registered ones by default) once, and runs the plans of them locally.
+        Only the parameter and the final result mapper are sent. For the light plans, whose IPC costs more than
+        compute.
+        """
+        actions = [
+            get_registered_actions().get(action) if isinstance(action, str) else action
+            for action in (get_registered_actions().values() if actions is None else actions)
+        ]
+        for action in actions:
+            assert isinstance(action, Action), 'Need an Action instance.'
+        action_names = tuple(action.name for action in actions)
+
+        self.stop_plan_workers()
+
+        # the workers are initialed concurrently.
+        deadline = time.time() + self.initial_timeout
+        workers = [
+            Executor(
+                execute_callback=execute_plan_callback,
+                initial_callback=functools.partial(initial_actions, action_names),
+
+                # the steps are executed in sequence
+                execute_timeout=self.execute_timeout * max(len(action_names), 1),
+                initial_timeout=self.initial_timeout,
+                pipeline_depth=self.pipeline_depth,
+                arena=self.arena,
+
+                name=f'plan_worker_{index}',
+                wait=False,
+            )
+            for index in range(number)
+        ]
+        try:
+            [worker.wait_ready(max(deadline - time.time(), 0)) for worker in workers]
+        except:
+            [worker.exit() for worker in workers]
+            raise
+
+        self.plan_workers = workers
+        self.plan_worker_actions = frozenset(action_names)
+        return workers
+
+    def stop_plan_workers(self) -> None:
+        workers, self.plan_workers = self.plan_workers, []
+        self.plan_worker_actions = frozenset()
+        [worker.exit() for worker in workers]
+
+    def plan_mode(self, plan: Union[StepPlan, CompiledPlan]) -> str:
+        """'plan' if the whole plan could be run by plan workers, otherwise 'steps'."""
+        compiled_plan = plan.compile() if isinstance(plan, StepPlan) else plan
+        if self.plan_workers and compiled_plan.steps and self.plan_worker_actions.issuperset(compiled_plan.name_index):
+            return 'plan'
+        return 'steps'
+
+    def shared_keys(self, plan: Union[StepPlan, CompiledPlan]) -> Optional[Set[str]]:
+        """keys of parameter and results sent to sub processes by the plan, None means all of them.
+
+        The values of the other keys are sent to threads (``ThreadExecutor``) only, which don't need the object store.
+        """
+        compiled_plan = plan.compile() if isinstance(plan, StepPlan) else plan
+        if self.plan_mode(compiled_plan) == 'plan':
+            return None
+
+        keys = set()
+        for step in compiled_plan.steps:
+            if self.executor_modes.get(step.name) == 'thread':
+                continue
+            # the results of all steps are sent in result_mapper.
+            if step.action.action_inputs is None or 'result_mapper' in step.action.action_inputs:
+                return None
+            keys.update(step.action.action_inputs)
+        return keys
+
+    def submit_plan(self, plan: Union[StepPlan, CompiledPlan], parameter: dict) -> ExecutorFuture:
+        """run the whole plan in a plan worker, the result is the result mapper.
+
+        The parameter may have the handles of object store.
+        """
+        compiled_plan = plan.compile() if isinstance(plan, StepPlan) else plan
+        worker = self.routing_policy(self.plan_workers, next(self._routing_counter))
+        return self.object_store.submit(worker, {'plan': compiled_plan.spec, 'parameter': parameter})
+
+    def route(self, action_name: str, worker_id: Optional[int] = None) -> Executor:
+        """the pinned replica of action, or one chosen by routing policy."""
+        executors = self.executor_mapper[action_name]
+        if worker_id is not None:
+            return executors[worker_id]
+        return self.routing_policy(executors, next(self._routing_counter))
+
+    def submit_batch(
+            self,
+            action_name: str,
+            parameter: dict,
+            expends: Iterable[Any],
+            worker_id: Optional[int] = None,
+    ) -> List[ExecutorFuture]:
+        """submit expends of a step with the object store.
+
+        The expends are sent to the pinned replica in one batch, or split into chunks over the replicas.
+        """
+        expends = list(expends)
+        if worker_id is not None:
+            return self.object_store.submit_batch(self.route(action_name, worker_id), parameter, expends)
+
+        chunk_number = max(min(len(self.executor_mapper[action_name]), len(expends)), 1)
+        return [
+            future
+            for chunk in _split_expends(expends, chunk_number)
+            for future in self.object_store.submit_batch(self.route(action_name), parameter, chunk)
+        ]
 
     def clear(self):
+        self.stop_autoscaler()
+        self.autoscale_policies.clear()
+        self.stop_plan_workers()
+
         while self.executor_mapper:
             _, executors = self.executor_mapper.popitem()
             for executor in executors:
@@ -1,18 +1,42 @@
 # coding: utf-8
-from typing import Optional
+from typing import Dict, List, Type
 
 from observer_toolkit import Observer
+from observer_toolkit.observer import ObserverHost
 
-GLOBAL_OBSERVER: Optional[Observer] = None
+GLOBAL_OBSERVER_MAPPER: Dict[str, Observer] = {}
+"""observers in process by action name, a process (plan worker or fused action) may run many of them."""
+
+GLOBAL_OBSERVER_HOST_MAPPER: Dict[str, ObserverHost] = {}
+"""observer hosts in process by action name."""
 
 
 def initial_observer_wrapper(observer_class):
     def _inner_initial_observer():
-        global GLOBAL_OBSERVER
-        GLOBAL_OBSERVER = observer_class()
+        GLOBAL_OBSERVER_MAPPER[observer_class.name] = observer_class()
 
     return _inner_initial_observer
 
 
-def execute_observer(**kwargs):
-    return GLOBAL_OBSERVER.do_action(kwargs)
+def execute_observer_wrapper(observer_class):
+    def _inner_execute_observer(**kwargs):
+        return GLOBAL_OBSERVER_MAPPER[observer_class.name].do_action(kwargs)
+
+    return _inner_execute_observer
+
+
+def initial_observer_host_wrapper(name: str, observer_classes: List[Type[Observer]], stream_key: str):
+    def _inner_initial_observer_host():
+        GLOBAL_OBSERVER_HOST_MAPPER[name] = ObserverHost(observer_classes, stream_key=stream_key)
+
+    return _inner_initial_observer_host
+
+
+def execute_observer_host_wrapper(name: str):
+    def _inner_execute_observer_host(frames: List[dict] = None, **kwargs):
+        # frames of a micro batch (MicroBatchExecutor), or a frame of plan worker / fused action.
+        if frames is not None:
+            return GLOBAL_OBSERVER_HOST_MAPPER[name].do_batch(frames)
+        return GLOBAL_OBSERVER_HOST_MAPPER[name].do_action(kwargs)
+
+    return _inner_execute_observer_host
@@ -1,29 +1,53 @@
 # coding: utf-8
+import asyncio
 import ctypes
 import gc
+import heapq
+import itertools
+import threading
 import time
 from logging import getLogger, Logger
-from queue import Queue
-from threading import Thread
-from typing import Dict, Union, Callable, List, Type, Tuple, Any
+from queue import Queue, Empty
+from threading import Thread, Semaphore
+from typing import Dict, Union, Callable, List, Type, Tuple, Any, Optional, AsyncIterable
 
 from observer_toolkit import get_registered_actions, Step, StepPlan, Observer, get_action
-from observer_toolkit.step import Action
+from observer_toolkit.step import Action, DEFAULT_MICRO_BATCH_DELAY
 from observer_toolkit.utils import GLOBAL_EXECUTOR_MANAGER, ExecutorManager
 from observer_toolkit.utils import detect_action, detect_observer
-from observer_toolkit.utils._executor import ExecutorFuture
-from observer_toolkit.utils._observer_action import execute_observer, initial_observer_wrapper
+from observer_toolkit.utils._executor import ExecutorFuture, ExecutorResult, SharedObjectHandle, collect_handles, \
+    map_handles, wrap_executor_future
+from observer_toolkit.observer import OBSERVER_HOST_NAME, FRAME_ID_KEY
+from observer_toolkit.utils._observer_action import execute_observer_wrapper, initial_observer_wrapper, \
+    execute_observer_host_wrapper, initial_observer_host_wrapper
 
 """default stdout logger"""
 DEFAULT_LOGGER = getLogger(__name__)
 
+WHOLE_PLAN_INDEX = -1
+"""index of the whole plan run by a plan worker, in PlanRun."""
+
+FRAME_IDS = itertools.count()
+"""frame ids of the runs in process, unless the parameter has one."""
+
 
 def smart_launch(
         action_package: str = 'actions',
         observer_package: str = 'observers',
         action_number_mapper: Dict[str, int] = None,
+        action_mode_mapper: Dict[str, str] = None,
+        observer_host_number: int = 0,
+        observer_host_batch_size: int = 1,
 ) -> Tuple[List[Action], List['Type[Observer]']]:
-    """smart launch """
+    """smart launch
+
+    Args:
+        action_mode_mapper: execution mode ('process' or 'thread') of actions, see ``ExecutorManager.register_action``.
+        observer_host_number: number of ObserverHost executors running the observers of all streams (see
+            ``register_observer_host``), instead of an executor of each observer. The plans should be merged with
+            ``observer_host=OBSERVER_HOST_NAME``.
+        observer_host_batch_size: frames of many streams judged by one call of ObserverHost at most.
+    """
 
     # 0: initial arguments
     action_number_mapper = action_number_mapper or {}
@@ -34,62 +58,388 @@ def smart_launch(
     # 2.1: get registered actions
     registered_actions = get_registered_actions().values()
 
-    # 2.2: register global manager
+    # 2.2: register global manager, the executors are initialed concurrently.
     GLOBAL_EXECUTOR_MANAGER.clear()
-    for action in registered_actions:
-        GLOBAL_EXECUTOR_MANAGER.register_action(action=action, number=action_number_mapper.get(action.name, 1))
+    initial_durations = GLOBAL_EXECUTOR_MANAGER.register_actions(
+        {action: action_number_mapper.get(action.name, 1) for action in registered_actions},
+        action_mode_mapper=action_mode_mapper,
+    )
+    for action_name, durations in initial_durations.items():
+        DEFAULT_LOGGER.info(f'Action {action_name} initialed in {max(durations, default=0):.3f}s.')
 
     # 3: detect observer
     observers = list(detect_observer(package_path=observer_package))
 
     # 4. register observer action
-    [register_observer_action(observer_class=observer_class) for observer_class in observers]
+    if observer_host_number:
+        register_observer_host(observers, number=observer_host_number, batch_size=observer_host_batch_size)
+    else:
+        [register_observer_action(observer_class=observer_class) for observer_class in observers]
 
     return actions, observers
 
 
-def smart_run(
+class PlanRun(object):
+    """Run of a plan for a frame.
+
+    Each step is submitted as soon as all of its dependencies are finished, so a fast branch is not stalled by the
+    slowest step of its level. And each step is timeout in ``timeout`` seconds after it's submitted.
+
+    The run is driven by ``finish_step``: ``(run, index of step)`` is put into ``finished_queue`` once for each
+    finished future, so the runs of many frames could share a queue and be driven by one thread.
+
+    Large values of parameter and results sent to sub processes are written once into the object store of manager,
+    the steps receive handles of them instead of the values. The handles are released by ``release``. With
+    ``ExecutorManager.direct_results``, the large results are saved into the store by executors, the run adopts the
+    handles and loads the results into ``result_mapper`` once in ``release``.
+
+    The parameter has the frame id (``FRAME_ID_KEY``) of the run, unless it's given by the caller.
+
+    If the manager has plan workers for all the steps (``ExecutorManager.plan_mode``), the whole plan is run by a
+    worker as one task, timeout in ``timeout`` seconds for each level.
+    """
+
+    def __init__(
+            self,
+            plan: StepPlan,
+            executor_manager: ExecutorManager = GLOBAL_EXECUTOR_MANAGER,
+            parameter: Dict = None,
+            timeout: Union[int, float] = 5,
+            finished_queue: 'Queue[Tuple[PlanRun, int]]' = None,
+            sequence: int = 0,
+    ):
+        self.sequence = sequence
+        """sequence number of frame."""
+
+        # steps are referred by their indexes in compiled plan
+        self.compiled_plan = plan.compile()
+        self.executor_manager = executor_manager
+        self.object_store = executor_manager.object_store
+        # the results of concurrent frames are buffered by frame id in observers.
+        self.parameter = {FRAME_ID_KEY: next(FRAME_IDS), **(parameter or {})}
+        self.timeout = timeout
+        self.finished_queue = Queue() if finished_queue is None else finished_queue
+
+        self.result_mapper = {}
+
+        # value or its handle, the values sent to threads only are not put into store.
+        self.shared_keys = executor_manager.shared_keys(self.compiled_plan)
+        self.put_handles: List[SharedObjectHandle] = []
+        """handles returned by ``put``, a handle is repeated for each put of the same content."""
+        self.shared_parameter = {key: self._put(key, value) for key, value in self.parameter.items()}
+        self.shared_result_mapper = {}
+        self.adopted_handles: List[SharedObjectHandle] = []
+        self._adopt_lock = threading.Lock()
+        self._released = False
+        self._loaded_objects: Dict[bytes, Any] = {}
+        """key of adopted handle: result loaded in main process"""
+
+        self.dependency_counts = [len(dependencies) for dependencies in self.compiled_plan.dependencies]
+        if executor_manager.plan_mode(self.compiled_plan) == 'plan':
+            self.ready_steps: List[int] = [WHOLE_PLAN_INDEX]
+        else:
+            self.ready_steps: List[int] = [index for index, count in enumerate(self.dependency_counts) if not count]
+        self.running_step_mapper: Dict[int, List[ExecutorFuture]] = {}
+        self.step_remaining_mapper: Dict[int, int] = {}
+        self.step_deadline_mapper: Dict[int, float] = {}
+
+    @property
+    def finished(self) -> bool:
+        return not self.ready_steps and not self.running_step_mapper
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """the earliest deadline of running steps."""
+        return min(self.step_deadline_mapper.values(), default=None)
+
+    def submit(self) -> None:
+        """submit the ready steps."""
+        if not self.ready_steps:
+            return
+
+        # the hooks of steps run in main process, they receive the results instead of the adopted handles.
+        current_parameter = {**self.parameter, **(
+            self._load_results() if self.executor_manager.direct_results else self.result_mapper
+        )}
+
+        # only the results used by the next steps are put into store.
+        self.shared_result_mapper.update({
+            key: self._put(key, value) for key, value in self.result_mapper.items()
+            if key not in self.shared_result_mapper
+        })
+        shared_current_parameter = {**self.shared_parameter, **self.shared_result_mapper}
+
+        ready_steps, self.ready_steps = self.ready_steps, []
+        for index in ready_steps:
+            if index == WHOLE_PLAN_INDEX:
+                self._submit_whole_plan()
+                continue
+
+            step = self.compiled_plan.steps[index]
+
+            worker_id = step.action.step_fixed_worker_function(**current_parameter)
+            expends = step.action.step_task_expend_function(**current_parameter)
+
+            # only the declared inputs of action are sent, once for all expends (of each replica).
+            step_futures = self.executor_manager.submit_batch(step.name, step.action.select_inputs({
+                **shared_current_parameter,
+                'result_mapper': {**self.shared_result_mapper},
+            }), expends, worker_id=worker_id)
+
+            self.running_step_mapper[index] = step_futures
+            self.step_deadline_mapper[index] = time.time() + self.timeout
+            self.step_remaining_mapper[index] = len(step_futures) or 1
+
+            for step_future in step_futures:
+                if self.executor_manager.direct_results:
+                    step_future.add_done_callback(self._adopt)
+                step_future.add_done_callback(lambda _, _index=index: self._notify(_index))
+            if not step_futures:
+                self._notify(index)
+
+    def _put(self, key: str, value: Any) -> Any:
+        """value or its handle, each put adds a reference released by ``release``."""
+        if self.shared_keys is not None and key not in self.shared_keys:
+            return value
+
+        shared_value = self.object_store.put(value)
+        # the adopted handles are returned as they are, without reference.
+        if shared_value is not value and isinstance(shared_value, SharedObjectHandle):
+            self.put_handles.append(shared_value)
+        return shared_value
+
+    def _submit_whole_plan(self) -> None:
+        step_future = self.executor_manager.submit_plan(self.compiled_plan, self.shared_parameter)
+
+        self.running_step_mapper[WHOLE_PLAN_INDEX] = [step_future]
+        self.step_deadline_mapper[WHOLE_PLAN_INDEX] = time.time() + self.timeout * len(self.compiled_plan.levels)
+        self.step_remaining_mapper[WHOLE_PLAN_INDEX] = 1
+        step_future.add_done_callback(lambda _: self._notify(WHOLE_PLAN_INDEX))
+
+    def _adopt(self, step_future: ExecutorFuture) -> None:
+        """own the handles in the result, which are released with the frame (at once if the frame is released)."""
+        if not (handles := collect_handles({'result': step_future.get_result(auto_raise=False)})):
+            return
+
+        self.object_store.adopt(*handles)
+        with self._adopt_lock:
+            if not self._released:
+                self.adopted_handles.extend(handles)
+                return
+        self.object_store.release(*handles)
+
+    def _load_results(self) -> Dict:
+        """result mapper with the adopted handles loaded, each of them is loaded once."""
+        return map_handles(self.result_mapper, self._load)
+
+    def _load(self, handle: SharedObjectHandle) -> Any:
+        if handle.key not in self._loaded_objects:
+            self._loaded_objects[handle.key] = self.object_store.get(handle)
+        return self._loaded_objects[handle.key]
+
+    def _notify(self, index: int) -> None:
+        """a future of step is finished."""
+        self.finished_queue.put((self, index))
+
+    def finish_step(self, index: int) -> None:
+        """a future of step is finished, save the result and submit the next steps when all of them are finished."""
+        self.step_remaining_mapper[index] -= 1
+        if self.step_remaining_mapper[index]:
+            return
+
+        step_futures = self.running_step_mapper.pop(index)
+        self.step_deadline_mapper.pop(index)
+
+        if index == WHOLE_PLAN_INDEX:
+            self.result_mapper.update(step_futures[0].get_result(timeout=self.timeout))
+            return
+
+        step = self.compiled_plan.steps[index]
+        step_results = [step_future.get_result(timeout=self.timeout) for step_future in step_futures]
+
+        # expend
+        if step.action.fused_outputs is not None:
+            self.result_mapper.update(step_results[0])
+        elif not step.action.step_merged_flag:
+            self.result_mapper[step.name] = step_results[0]
+        else:
+            self.result_mapper[step.name] = step_results
+
+        for dependent in self.compiled_plan.dependents[index]:
+            self.dependency_counts[dependent] -= 1
+            if not self.dependency_counts[dependent]:
+                self.ready_steps.append(dependent)
+        self.submit()
+
+    def check_timeout(self) -> None:
+        """raise as timeout of ExecutorFuture if any step is expired."""
+        for index, deadline in list(self.step_deadline_mapper.items()):
+            if deadline <= time.time():
+                for step_future in self.running_step_mapper[index]:
+                    if not step_future.has_result:
+                        step_future.get_result(timeout=0)
+
+    def release(self) -> None:
+        """release the references of frame, the blocks are freed after the last task is finished."""
+        with self._adopt_lock:
+            self._released = True
+            adopted_handles, self.adopted_handles = self.adopted_handles, []
+
+        if adopted_handles:
+            # in place, the mapper may be referred already.
+            self.result_mapper.update(self._load_results())
+        self._loaded_objects = {}
+
+        # once for each reference, the same content may be put many times (e.g. a result equal to its input).
+        put_handles, self.put_handles = self.put_handles, []
+        self.object_store.release(*adopted_handles, *put_handles)
+        self.shared_parameter, self.shared_result_mapper = {}, {}
+
+
+class DeadlineWatcher(object):
+    """Call the callbacks at their deadlines in a thread."""
+
+    def __init__(self, logger: Logger = DEFAULT_LOGGER):
+        self.logger = logger
+
+        self._heap: List[Tuple[float, int, Callable[[], Any]]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Thread = None
+
+    def watch(self, deadline: float, callback: Callable[[], Any]) -> None:
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._counter), callback))
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._condition.wait(self._heap[0][0] - time.time() if self._heap else None)
+                _, _, callback = heapq.heappop(self._heap)
+
+            try:
+                callback()
+            except Exception as e:
+                self.logger.error('deadline callback failed.', exc_info=e)
+
+
+GLOBAL_DEADLINE_WATCHER = DeadlineWatcher()
+"""checks the timeout of continuation runs."""
+
+
+class ContinuationPlanRun(PlanRun):
+    """Run of a plan driven by the done callbacks of futures, no thread is blocked by it.
+
+    The next steps are submitted in the thread finishing the last future of their dependencies (the ``send_result``
+    thread of executors), and the timeouts are checked by ``GLOBAL_DEADLINE_WATCHER``. The result mapper (or the
+    exception) is set into ``future``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.future = ExecutorFuture()
+        self.future._name = f'plan run {self.sequence}'
+
+        self._start_time = None
+        self._closed = False
+        # the callbacks of finished futures are called at once in submit
+        self._lock = threading.RLock()
+
+    def start(self) -> ExecutorFuture:
+        self._start_time = time.time()
+        self._advance(self.submit)
+        return self.future
+
+    def submit(self) -> None:
+        super().submit()
+        if self.step_deadline_mapper:
+            # the latest deadline is of the steps submitted just now.
+            GLOBAL_DEADLINE_WATCHER.watch(
+                max(self.step_deadline_mapper.values()), lambda: self._advance(self.check_timeout),
+            )
+
+    def _notify(self, index: int) -> None:
+        self._advance(self.finish_step, index)
+
+    def _advance(self, method: Callable, *args) -> None:
+        with self._lock:
+            if self._closed:
+                return
+
+            try:
+                method(*args)
+            except Exception as e:
+                self._close(ExecutorResult(exception=e, start_time=self._start_time, end_time=time.time()))
+            else:
+                if self.finished:
+                    self._close(ExecutorResult(
+                        result=self.result_mapper, start_time=self._start_time, end_time=time.time(),
+                    ))
+
+    def _close(self, result: ExecutorResult) -> None:
+        self._closed = True
+        self.release()
+        self.future.set_result(result)
+
+
+def smart_submit(
         plan: StepPlan,
         executor_manager: ExecutorManager = GLOBAL_EXECUTOR_MANAGER,
         parameter: Dict = None,
         timeout: Union[int, float] = 5,
-) -> Dict[str, Any]:
-    """smart run"""
-
-    parameter = parameter or {}
-
-    result_mapper = {}
-
-    for level_steps in plan.walk():
+) -> ExecutorFuture:
+    """smart run in continuation style
 
-        current_parameter = {**parameter, **result_mapper}
+    Return the future of result mapper at once, use ``add_done_callback`` of it instead of waiting.
+    """
+    return ContinuationPlanRun(
+        plan=plan, executor_manager=executor_manager, parameter=parameter, timeout=timeout,
+    ).start()
 
-        step_future_mapper: Dict[Step, List[ExecutorFuture]] = {}
 
-        for step in level_steps:
-            worker_id = step.action.step_fixed_worker_function(**current_parameter)
-            expends = step.action.step_task_expend_function(**current_parameter)
+async def async_smart_run(
+        plan: StepPlan,
+        executor_manager: ExecutorManager = GLOBAL_EXECUTOR_MANAGER,
+        parameter: Dict = None,
+        timeout: Union[int, float] = 5,
+) -> Dict[str, Any]:
+    """smart run in event loop, by ``smart_submit``."""
+    return await wrap_executor_future(smart_submit(
+        plan=plan, executor_manager=executor_manager, parameter=parameter, timeout=timeout,
+    ))
 
-            step_future_mapper[step] = [
-                executor_manager.executor_mapper[step.name][worker_id].submit({
-                    **current_parameter,
-                    'result_mapper': result_mapper,
-                    'expend': expend,
-                })
 
-                for expend in expends
-            ]
+def smart_run(
+        plan: StepPlan,
+        executor_manager: ExecutorManager = GLOBAL_EXECUTOR_MANAGER,
+        parameter: Dict = None,
+        timeout: Union[int, float] = 5,
+) -> Dict[str, Any]:
+    """smart run
 
-        for step, step_futures in step_future_mapper.items():
-            step_results = [step_future.get_result(timeout=timeout) for step_future in step_futures]
+    Run the plan by ``PlanRun`` and wait for it.
+    """
+    run = PlanRun(plan=plan, executor_manager=executor_manager, parameter=parameter, timeout=timeout)
 
-            # expend
-            if not step.action.step_merged_flag:
-                result_mapper[step.name] = step_results[0]
-            else:
-                result_mapper[step.name] = step_results
+    try:
+        run.submit()
+        while not run.finished:
+            # wait for the next finished future, until the earliest deadline of running steps.
+            try:
+                _, index = run.finished_queue.get(timeout=max(run.deadline - time.time(), 0))
+            except Empty:
+                run.check_timeout()
+                continue
+            run.finish_step(index)
+    finally:
+        run.release()
 
-    return result_mapper
+    return run.result_mapper
 
 
 def dispatch_parameter(
@@ -146,18 +496,190 @@ def dispatcher_execute(
     logger.info(f'Dispatch execute thread exit.')
 
 
+def feed_frames(
+        dispatch_queue: Queue,
+        event_queue: Queue,
+        frame_semaphore: Semaphore,
+):
+    """move the dispatched parameters into the event queue of pipeline, when there is a free slot of frame."""
+    while True:
+        frame_semaphore.acquire()
+        parameter = dispatch_queue.get()
+        event_queue.put((None, parameter))
+        if not parameter:
+            break
+
+
+def pipeline_execute(
+        event_queue: Queue,
+        dispatch_queue: Queue,
+        frame_semaphore: Semaphore,
+        executor_manager: ExecutorManager,
+        finish_callback: Callable[[Dict], None] = None,
+        timeout: Union[int, float] = 3.0,
+        logger: Logger = DEFAULT_LOGGER,
+):
+    """run the frames in flight (limited by frame_semaphore) in one thread, and finish them in order.
+
+    The events are the dispatched parameters ``(None, parameter)`` and the finished steps ``(run, index)``.
+    """
+    sequences = itertools.count()
+    next_sequence = 0
+
+    running_mapper: Dict[int, PlanRun] = {}
+    completed_mapper: Dict[int, Optional[Dict]] = {}
+    """result mappers to be finished by sequence, None if failed."""
+
+    def advance(run: PlanRun, method: Callable, *args):
+        try:
+            method(*args)
+        except Exception as e:
+            logger.error('execute plan failed.', exc_info=e)
+            completed_mapper[run.sequence] = None
+        else:
+            if not run.finished:
+                return
+            completed_mapper[run.sequence] = run.result_mapper
+        running_mapper.pop(run.sequence)
+        run.release()
+
+    exhausted = False
+    while not exhausted or running_mapper:
+        deadline = min(filter(None, [run.deadline for run in running_mapper.values()]), default=None)
+
+        try:
+            run, event = event_queue.get(timeout=None if deadline is None else max(deadline - time.time(), 0))
+        except Empty:
+            [advance(run, run.check_timeout) for run in list(running_mapper.values())]
+        else:
+            if run is None:
+                if not (parameter := event):
+                    exhausted = True
+                    dispatch_queue.task_done()
+                    continue
+
+                sequence = next(sequences)
+                if plan := parameter.pop('plan', StepPlan()):
+                    try:
+                        run = PlanRun(plan, executor_manager, parameter, timeout, event_queue, sequence)
+                    except Exception as e:
+                        logger.error('execute plan failed.', exc_info=e)
+                        completed_mapper[sequence] = None
+                    else:
+                        running_mapper[sequence] = run
+                        advance(run, run.submit)
+                else:
+                    completed_mapper[sequence] = None
+
+            # the steps of failed frames are ignored.
+            elif running_mapper.get(run.sequence) is run:
+                advance(run, run.finish_step, event)
+
+        # finish in order of sequence
+        while next_sequence in completed_mapper:
+            if (result_mapper := completed_mapper.pop(next_sequence)) is not None and finish_callback:
+                try:
+                    finish_callback(result_mapper)
+                except Exception as e:
+                    logger.error('finish callback failed.', exc_info=e)
+            next_sequence += 1
+            frame_semaphore.release()
+            dispatch_queue.task_done()
+
+    logger.info(f'Pipeline execute thread exit.')
+
+
+async def async_dispatch(
+        frames: AsyncIterable[Dict],
+        executor_manager: ExecutorManager = GLOBAL_EXECUTOR_MANAGER,
+        finish_callback: Callable[[Dict], Any] = None,
+        timeout: Union[int, float] = 3.0,
+        max_frames: int = 128,
+        logger: Logger = DEFAULT_LOGGER,
+):
+    """run the parameters (with ``plan``) from async iterator in event loop, until it's exhausted or a falsy one.
+
+    At most ``max_frames`` frames are in flight. The finish_callback may be a coroutine function.
+    """
+    frame_semaphore = asyncio.Semaphore(max_frames)
+    tasks = set()
+
+    async def _execute(parameter: Dict):
+        try:
+            if plan := parameter.pop('plan', StepPlan()):
+                result_mapper = await async_smart_run(
+                    plan=plan,
+                    executor_manager=executor_manager,
+                    timeout=timeout,
+                    parameter=parameter,
+                )
+                if finish_callback and asyncio.iscoroutine(finished := finish_callback(result_mapper)):
+                    await finished
+        except Exception as e:
+            logger.error('execute plan failed.', exc_info=e)
+        finally:
+            frame_semaphore.release()
+
+    async for dispatched_parameter in frames:
+        if not dispatched_parameter:
+            break
+
+        await frame_semaphore.acquire()
+        task = asyncio.ensure_future(_execute(dispatched_parameter))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.wait(tasks)
+    logger.info(f'Async dispatch exit.')
+
+
 def register_observer_action(
         observer_class: Type[Observer],
         executor_manger: ExecutorManager = GLOBAL_EXECUTOR_MANAGER,
         do_duplicate=False):
     observer_action = get_action(observer_class.name)
 
-    observer_action.action_function = execute_observer
+    observer_action.action_function = execute_observer_wrapper(observer_class)
     observer_action.action_initial_function = initial_observer_wrapper(observer_class)
 
     executor_manger.register_action(action=observer_action, number=1)
 
 
+def register_observer_host(
+        observer_classes: List[Type[Observer]],
+        executor_manger: ExecutorManager = GLOBAL_EXECUTOR_MANAGER,
+        name: str = OBSERVER_HOST_NAME,
+        number: int = 1,
+        stream_key: str = 'stream_id',
+        batch_size: int = 1,
+        batch_delay: float = DEFAULT_MICRO_BATCH_DELAY,
+) -> Action:
+    """register an action of ObserverHost, which runs the observers of all streams by one call for each frame.
+
+    The frames of a stream are always sent to the same replica (by ``stream_key`` in parameter), which holds the
+    states of observers of the stream.
+
+    With ``batch_size`` > 1, the frames of concurrent plans (e.g. of many streams by dispatcher workers) reaching a
+    replica in ``batch_delay`` seconds are run by one ``ObserverHost.do_batch`` call, so the observers with
+    batch_judge_callback are judged across streams in bulk.
+    """
+    observer_host_action = get_action(name)
+
+    observer_host_action.action_function = execute_observer_host_wrapper(name)
+    observer_host_action.action_initial_function = initial_observer_host_wrapper(name, observer_classes, stream_key)
+    observer_host_action.micro_batch_size = batch_size
+    observer_host_action.micro_batch_delay = batch_delay
+
+    def fixed_worker(**kwargs):
+        return hash(kwargs.get(stream_key)) % number
+
+    observer_host_action.step_fixed_worker_function = fixed_worker
+
+    executor_manger.register_action(action=observer_host_action, number=number)
+    return observer_host_action
+
+
 class DispatcherThreadList(List[Thread]):
 
     def __init__(self, dispatch_queue: Queue, threads: List[Thread], *args, **kwargs):
@@ -194,7 +716,15 @@ def create_dispatcher(
         worker=10,
         maxsize=128,
         logger: Logger = DEFAULT_LOGGER,
+        pipeline_frames: int = None,
 ) -> DispatcherThreadList:
+    """create threads to dispatch parameters and execute them.
+
+    Args:
+        worker: number of threads running ``smart_run``, the frames are finished out of order.
+        pipeline_frames: number of frames in flight of the pipeline. If it's provided, the frames are run by one
+            thread (instead of workers) and finished in order of dispatched.
+    """
     dispatch_queue = Queue(maxsize=maxsize)
 
     dispatch_parameter_thread = Thread(
@@ -203,14 +733,31 @@ def create_dispatcher(
         daemon=True
     )
 
-    dispatch_execute_threads = [
-        Thread(
-            target=dispatcher_execute,
-            args=(dispatch_queue, executor_manager, finish_callback, timeout, logger),
-            daemon=True
-        )
-        for _ in range(worker)
-    ]
+    if pipeline_frames:
+        event_queue = Queue()
+        frame_semaphore = Semaphore(pipeline_frames)
+
+        dispatch_execute_threads = [
+            Thread(
+                target=feed_frames,
+                args=(dispatch_queue, event_queue, frame_semaphore),
+                daemon=True
+            ),
+            Thread(
+                target=pipeline_execute,
+                args=(event_queue, dispatch_queue, frame_semaphore, executor_manager, finish_callback, timeout, logger),
+                daemon=True
+            ),
+        ]
+    else:
+        dispatch_execute_threads = [
+            Thread(
+                target=dispatcher_execute,
+                args=(dispatch_queue, executor_manager, finish_callback, timeout, logger),
+                daemon=True
+            )
+            for _ in range(worker)
+        ]
 
     threads = [dispatch_parameter_thread, *dispatch_execute_threads]
 
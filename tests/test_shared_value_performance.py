@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Performance
+
+Round-trip latency of SharedValue and Executor against frame size.
+"""
+import pickle
+import time
+
+import numpy
+
+from observer_toolkit.utils._executor import SharedValue, Executor
+
+FRAME_SIZES = {
+    '360p': (360, 640, 3),
+    '720p': (720, 1280, 3),
+    '1080p': (1080, 1920, 3),
+    '4k': (2160, 3840, 3),
+}
+
+
+def shape_callback(**kwargs):
+    return kwargs.get('image').shape
+
+
+def echo_callback(**kwargs):
+    return kwargs.get('image')
+
+
+if __name__ == '__main__':
+    number = 32
+
+    shared_value = SharedValue()
+    shape_executor = Executor(execute_callback=shape_callback)
+    echo_executor = Executor(execute_callback=echo_callback)
+
+    for frame_name, frame_size in FRAME_SIZES.items():
+        image = numpy.random.randint(0, 255, size=frame_size, dtype=numpy.uint8)
+        print(frame_name, 'bytes', image.nbytes)
+
+        # in-band pickle (protocol 4, the array is copied into pickle)
+        s = time.time()
+        for i in range(number):
+            pickle.loads(pickle.dumps({'image': image}, protocol=4))
+        cost = time.time() - s
+        print('\tin-band pickle', 'cost', round(cost, 6), 'average', round(cost / number, 6))
+
+        # shared value with copy
+        s = time.time()
+        for i in range(number):
+            shared_value.set_object({'image': image})
+            shared_value.get_object()
+        cost = time.time() - s
+        print('\tshared value copy', 'cost', round(cost, 6), 'average', round(cost / number, 6))
+
+        # shared value without copy
+        s = time.time()
+        for i in range(number):
+            shared_value.set_object({'image': image})
+            shared_value.get_object(copy=False)
+        cost = time.time() - s
+        print('\tshared value view', 'cost', round(cost, 6), 'average', round(cost / number, 6))
+
+        # executor: image in parameter only
+        s = time.time()
+        for i in range(number):
+            shape_executor.submit({'image': image}).get_result()
+        cost = time.time() - s
+        print('\texecutor parameter', 'cost', round(cost, 6), 'average', round(cost / number, 6))
+
+        # executor: image in both parameter and result
+        s = time.time()
+        for i in range(number):
+            echo_executor.submit({'image': image}).get_result()
+        cost = time.time() - s
+        print('\texecutor round trip', 'cost', round(cost, 6), 'average', round(cost / number, 6))
+
+    shape_executor.exit()
+    echo_executor.exit()
@@ -0,0 +1,16 @@
+# coding: utf-8
+
+
+def func(frames=None, **kwargs):
+    return [frame.get('image').shape for frame in frames]
+
+
+action_function = func
+
+action_name = 'batch'
+
+zero_copy_inputs = True
+
+micro_batch_size = 4
+
+micro_batch_delay = 0.01
@@ -0,0 +1,12 @@
+# coding: utf-8
+
+
+def func(**kwargs):
+    return kwargs.get('image').shape
+
+
+action_function = func
+
+action_name = 'input_shape'
+
+action_inputs = ['image']
@@ -0,0 +1,12 @@
+# coding: utf-8
+
+
+def func(**kwargs):
+    return list(range(5))
+
+
+action_function = func
+
+action_name = 'no_input'
+
+action_inputs = []
@@ -14,6 +14,21 @@ class DetectTestCase(unittest.TestCase):
 
         print(sub.step_task_expend_function)
 
+    def test_detect_action_options(self):
+        detect_action('tests.unittests.mock_packages.mock_option_actions')
+
+        with self.subTest('action inputs'):
+            self.assertIsNone(get_action('batch').action_inputs)
+            self.assertEqual(get_action('input_shape').action_inputs, ['image'])
+            self.assertEqual(get_action('no_input').action_inputs, [])
+
+        with self.subTest('micro batch'):
+            batch = get_action('batch')
+            self.assertTrue(batch.zero_copy_inputs)
+            self.assertEqual(batch.micro_batch_size, 4)
+            self.assertEqual(batch.micro_batch_delay, 0.01)
+            self.assertFalse(get_action('input_shape').zero_copy_inputs)
+
     def test_detect_error_action(self):
         with self.assertRaises(Exception) as e:
             detect_action('tests.unittests.mock_packages.mock_error_actions')
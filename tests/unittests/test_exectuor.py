@@ -1,7 +1,8 @@
+import asyncio
 import time
 import unittest
 
-from observer_toolkit.utils._executor import Executor
+from observer_toolkit.utils._executor import Executor, wrap_executor_future
 
 
 def mock_function(**kwargs):
@@ -36,6 +37,15 @@ def execute_wrong_callback(wrong_parameter) -> None:
     pass
 
 
+def execute_expend_callback(**kwargs):
+    expend = kwargs.get('expend')
+    if expend == 'error':
+        raise Exception("error")
+    if expend == 'timeout':
+        time.sleep(20)
+    return kwargs.get('base') + expend
+
+
 def execute_infinite_callback(**kwargs) -> None:
     while True:
         time.sleep(1)
@@ -121,6 +131,83 @@ class ExecutorTestCase(unittest.TestCase):
 
         print('cost:', time.time() - s)
 
+    def test_executor_pipeline(self):
+        """tasks in flight are returned in order"""
+        executor = Executor(execute_callback=mock_function, pipeline_depth=4)
+
+        futures = [executor.submit({'index': i}) for i in range(32)]
+
+        self.assertEqual([future.get_result(timeout=1) for future in futures], [{'index': i} for i in range(32)])
+
+        with self.subTest('error in pipeline'):
+            executor = Executor(execute_callback=execute_error_callback, pipeline_depth=4)
+            futures = [executor.submit({}) for _ in range(8)]
+
+            for future in futures:
+                with self.assertRaises(Exception):
+                    future.get_result(timeout=1)
+
+    def test_executor_action_inputs(self):
+        executor = Executor(execute_callback=mock_function, action_inputs=['image'])
+
+        self.assertEqual(
+            executor.submit({'image': 'image', 'other': 'other', 'expend': None}).get_result(timeout=1),
+            {'image': 'image', 'expend': None},
+        )
+
+    def test_executor_submit_batch(self):
+        executor = Executor(execute_callback=execute_expend_callback, execute_timeout=0.1)
+
+        with self.subTest('results in order'):
+            futures = executor.submit_batch({'base': 100}, range(5))
+            self.assertEqual([future.get_result(timeout=1) for future in futures], [100, 101, 102, 103, 104])
+
+        with self.subTest('empty'):
+            self.assertEqual(executor.submit_batch({'base': 100}, []), [])
+
+        with self.subTest('failed items'):
+            futures = executor.submit_batch({'base': 100}, [1, 'error', 'timeout', 2])
+
+            self.assertEqual(futures[0].get_result(timeout=1), 101)
+            with self.assertRaises(Exception):
+                futures[1].get_result(timeout=1)
+            with self.assertRaises(TimeoutError):
+                futures[2].get_result(timeout=1)
+            self.assertEqual(futures[3].get_result(timeout=1), 102)
+
+        with self.subTest('mixed with submit'):
+            future = executor.submit({'base': 100, 'expend': 10})
+            futures = executor.submit_batch({'base': 200}, range(2))
+
+            self.assertEqual(future.get_result(timeout=1), 110)
+            self.assertEqual([future.get_result(timeout=1) for future in futures], [200, 201])
+
+    def test_executor_submit_async(self):
+        executor = Executor(execute_callback=execute_expend_callback, execute_timeout=0.2)
+
+        async def main():
+            results = await asyncio.gather(*[
+                executor.submit_async({'base': 100, 'expend': i}) for i in range(5)
+            ])
+            awaited_result = await executor.submit({'base': 200, 'expend': 1})
+
+            with self.assertRaises(Exception):
+                await executor.submit_async({'base': 100, 'expend': 'error'})
+            return results, awaited_result
+
+        self.assertEqual(asyncio.run(main()), ([100, 101, 102, 103, 104], 201))
+
+        with self.subTest('event loop is closed'):
+            async def closed_main():
+                wrap_executor_future(executor.submit({'base': 100, 'expend': 'timeout'}))
+
+            asyncio.run(closed_main())
+
+            # the result of closed loop is ignored
+            self.assertEqual(executor.submit({'base': 100, 'expend': 1}).get_result(timeout=1), 101)
+
+        executor.exit()
+
     def test_todo(self):
         """TODO"""
 
@@ -0,0 +1,193 @@
+import unittest
+from unittest.mock import patch
+
+import numpy
+
+from observer_toolkit.utils import ExecutorManager
+from observer_toolkit.utils import _executor
+from observer_toolkit.utils._executor import SharedArena, SharedRing, ArenaBlock, Executor
+from observer_toolkit.step import get_action
+
+
+def mock_function(**kwargs):
+    return kwargs
+
+
+KEPT_INPUT = None
+
+
+def keep_function(**kwargs):
+    # keep the first input, as a tracker keeps the previous frame.
+    global KEPT_INPUT
+    if KEPT_INPUT is None:
+        KEPT_INPUT = kwargs.get('x')
+    return int(KEPT_INPUT[0])
+
+
+class SharedArenaTestCase(unittest.TestCase):
+
+    def test_allocate(self):
+        arena = SharedArena(size=1024 * 1024, block_size=64 * 1024)
+
+        self.assertEqual(arena.block_number, 16)
+        self.assertEqual(arena.used, 0)
+
+        with self.subTest('round up to blocks'):
+            block_1 = arena.allocate(1)
+            block_2 = arena.allocate(100 * 1024)
+
+            self.assertEqual(block_1, ArenaBlock(offset=0, size=64 * 1024))
+            self.assertEqual(block_2, ArenaBlock(offset=64 * 1024, size=128 * 1024))
+            self.assertEqual(arena.used, 192 * 1024)
+
+        with self.subTest('first fit'):
+            arena.free(block_1)
+            self.assertEqual(arena.allocate(10), block_1)
+
+            # too large for the freed hole
+            arena.free(block_1)
+            self.assertEqual(arena.allocate(65 * 1024).offset, 192 * 1024)
+
+        with self.subTest('full'):
+            with self.assertRaises(MemoryError):
+                arena.allocate(1024 * 1024, timeout=0.01)
+
+        with self.subTest('larger than arena'):
+            with self.assertRaises(AssertionError):
+                arena.allocate(2 * 1024 * 1024)
+
+    def test_shared_value(self):
+        arena = SharedArena(size=1024 * 1024, block_size=64 * 1024)
+        block = arena.allocate(10)
+
+        arena.shared_value(block).set_object({'name': 'name'})
+        self.assertEqual(arena.shared_value(block).get_object(), {'name': 'name'})
+
+    def test_ring_with_arena(self):
+        arena = SharedArena(size=16 * 1024 * 1024)
+        ring = SharedRing(depth=2, size=2 * 1024, arena=arena)
+
+        image = numpy.random.randint(0, 255, size=(480, 640, 3), dtype=numpy.uint8)
+
+        with self.subTest('small message in slot'):
+            ring.put({'name': 'name'})
+            self.assertEqual(arena.used, 0)
+            self.assertEqual(ring.get(), {'name': 'name'})
+
+        with self.subTest('large message in arena'):
+            ring.put({'image': image})
+            self.assertGreaterEqual(arena.used, image.nbytes)
+
+            obj = ring.get(copy=False, release=False)
+            self.assertTrue(numpy.array_equal(obj['image'], image))
+
+            ring.release()
+            self.assertEqual(arena.used, 0)
+
+    def test_ring_spill(self):
+        image = numpy.random.randint(0, 255, size=(480, 640, 3), dtype=numpy.uint8)
+
+        with self.subTest('without arena'):
+            ring = SharedRing(depth=2, size=2 * 1024)
+            ring.put({'image': image})
+            self.assertTrue(numpy.array_equal(ring.get()['image'], image))
+
+        with self.subTest('larger than arena'):
+            arena = SharedArena(size=256 * 1024)
+            ring = SharedRing(depth=2, size=2 * 1024, arena=arena)
+            ring.put({'image': image})
+            self.assertEqual(arena.used, 0)
+            self.assertTrue(numpy.array_equal(ring.get()['image'], image))
+
+        with self.subTest('arena is full'):
+            arena = SharedArena(size=1024 * 1024)
+            ring = SharedRing(depth=2, size=2 * 1024, arena=arena)
+            ring.put({'image': image})
+            ring.put({'image': image})
+
+            # only the first one is in arena
+            self.assertGreaterEqual(arena.used, image.nbytes)
+            self.assertLess(arena.used, image.nbytes * 2)
+
+            self.assertTrue(numpy.array_equal(ring.get()['image'], image))
+            self.assertTrue(numpy.array_equal(ring.get()['image'], image))
+            self.assertEqual(arena.used, 0)
+
+    def test_ring_put_error(self):
+        arena = SharedArena(size=16 * 1024 * 1024)
+        ring = SharedRing(depth=2, size=2 * 1024, arena=arena)
+        image = numpy.random.randint(0, 255, size=(480, 640, 3), dtype=numpy.uint8)
+
+        with self.subTest('value can not be pickled'):
+            for _ in range(ring.depth + 1):
+                with self.assertRaises(Exception):
+                    ring.put({'image': image, 'function': lambda: None})
+
+        with self.subTest('spill failed'):
+            ring_without_arena = SharedRing(depth=2, size=2 * 1024)
+            with patch.object(_executor, 'DEFAULT_SPILL_DIR', '/not/exists'):
+                for _ in range(ring_without_arena.depth + 1):
+                    with self.assertRaises(OSError):
+                        ring_without_arena.put({'image': image})
+
+            ring_without_arena.put({'image': image})
+            self.assertTrue(numpy.array_equal(ring_without_arena.get()['image'], image))
+
+        with self.subTest('arena block failed'):
+            with patch.object(_executor.SharedValue, '_set', side_effect=ValueError('failed')):
+                for _ in range(ring.depth + 1):
+                    with self.assertRaises(ValueError):
+                        ring.put({'image': image})
+            self.assertEqual(arena.used, 0)
+
+        # the slots are not leaked.
+        for index in range(ring.depth + 1):
+            ring.put({'index': index, 'image': image})
+            self.assertEqual(ring.get()['index'], index)
+        self.assertEqual(len(ring), 0)
+        self.assertEqual(arena.used, 0)
+
+    def test_executor_send_error(self):
+        executor = Executor(execute_callback=mock_function, arena=SharedArena(size=1024 * 1024))
+
+        with self.subTest('parameter can not be pickled'):
+            with self.assertRaises(Exception):
+                executor.submit({'function': lambda: None}).get_result(timeout=1)
+
+        with self.subTest('large parameter and result'):
+            image = numpy.random.randint(0, 255, size=(2160, 3840, 3), dtype=numpy.uint8)
+            result = executor.submit({'image': image}).get_result(timeout=1)
+            self.assertTrue(numpy.array_equal(result['image'], image))
+
+        executor.exit()
+
+    def test_executor_copy_inputs(self):
+        executor = Executor(execute_callback=keep_function, arena=SharedArena(size=1024 * 1024))
+
+        # the kept input is not changed when its slot is reused.
+        for value in [1000, 2000, 3000, 4000]:
+            self.assertEqual(executor.submit({'x': numpy.full(1000, value)}).get_result(timeout=1), 1000)
+
+        executor.exit()
+
+    def test_manager_arena(self):
+        manager = ExecutorManager()
+        action = get_action('arena_testcase')
+        action.action_function = mock_function
+
+        manager.register_action(action, number=2)
+
+        image = numpy.random.randint(0, 255, size=(1080, 1920, 3), dtype=numpy.uint8)
+
+        for executor in manager.executor_mapper['arena_testcase']:
+            result = executor.submit({'image': image}).get_result(timeout=1)
+            self.assertTrue(numpy.array_equal(result['image'], image))
+
+        # all blocks are released after the results are received.
+        self.assertEqual(manager.arena.used, 0)
+
+        manager.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
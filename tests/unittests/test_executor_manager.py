@@ -1,9 +1,77 @@
+import itertools
+import logging
+import os
+import threading
+import time
 import unittest
+from unittest.mock import patch
 
 from observer_toolkit.step import get_action
 
-from observer_toolkit import Step, StepPlan, detect_action, smart_launch, smart_run
+from observer_toolkit import Observer, Step, StepPlan, detect_action, smart_launch, smart_run, merge_plan
 from observer_toolkit.utils import ExecutorManager, GLOBAL_EXECUTOR_MANAGER
+from observer_toolkit.utils._executor import route_least_outstanding, route_round_robin, route_power_of_two, \
+    ThreadExecutor, Executor
+from observer_toolkit.utils.libs import register_observer_action
+
+
+def sleep_function(**kwargs):
+    time.sleep(kwargs.get('expend') or 0)
+
+
+def initial_function():
+    time.sleep(0.1)
+
+
+SLOW_INITIAL = False
+
+
+def slow_initial_function():
+    # the replicas forked after the flag is set are timeout in initial.
+    if SLOW_INITIAL:
+        time.sleep(1)
+
+
+def pid_function(**kwargs):
+    time.sleep(0.01)
+    return os.getpid()
+
+
+def true_judge_callback(**kwargs):
+    return True
+
+
+def false_judge_callback(**kwargs):
+    return False
+
+
+class PlanWorkerTrueObserver(Observer):
+    steps = [Step('plan_worker_observed')]
+    judge_callback = true_judge_callback
+
+
+class PlanWorkerFalseObserver(Observer):
+    steps = [Step('plan_worker_observed')]
+    judge_callback = false_judge_callback
+
+
+class ErrorCountHandler(logging.Handler):
+    """set the event after the number of error records."""
+
+    def __init__(self, number: int):
+        super().__init__(level=logging.ERROR)
+        self.number = number
+        self.event = threading.Event()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.number -= 1
+        if self.number <= 0:
+            self.event.set()
+
+
+class MockExecutor(object):
+    def __init__(self, outstanding):
+        self.outstanding = outstanding
 
 
 class ExecutorManagerTestCase(unittest.TestCase):
@@ -25,6 +93,267 @@ class ExecutorManagerTestCase(unittest.TestCase):
     def test_register_action(self):
         """Test that the register_action method works as expected."""
 
+    def test_register_actions(self):
+        actions = [get_action(f'parallel_startup_testcase_{index}') for index in range(3)]
+        for action in actions:
+            action.action_function = pid_function
+            action.action_initial_function = lambda: time.sleep(0.3)
+
+        with self.subTest('initialed concurrently'):
+            manager = ExecutorManager()
+
+            # all the replicas are started before waiting for any of them.
+            events = []
+            create_executor, wait_ready = manager._create_executor, Executor.wait_ready
+
+            def _create_executor(*args, **kwargs):
+                events.append('create')
+                return create_executor(*args, **kwargs)
+
+            def _wait_ready(executor, timeout=None):
+                events.append('wait')
+                return wait_ready(executor, timeout)
+
+            with patch.object(manager, '_create_executor', _create_executor), \
+                    patch.object(Executor, 'wait_ready', _wait_ready):
+                durations = manager.register_actions({actions[0]: 2, actions[1]: 1, actions[2].name: 1})
+            self.assertEqual(events, ['create'] * 4 + ['wait'] * 4)
+
+            self.assertEqual(list(durations), [action.name for action in actions])
+            self.assertEqual([len(_) for _ in durations.values()], [2, 1, 1])
+            for duration in itertools.chain.from_iterable(durations.values()):
+                self.assertGreaterEqual(duration, 0.3)
+            self.assertEqual(manager.initial_durations, durations)
+            self.assertTrue(all(
+                executor.is_alive() for executor in itertools.chain.from_iterable(manager.executor_mapper.values())
+            ))
+
+            self.assertIsInstance(manager.submit_batch(actions[0].name, {}, [0])[0].get_result(timeout=1), int)
+            manager.clear()
+
+        with self.subTest('initial timeout'):
+            manager = ExecutorManager(initial_timeout=0.2)
+            with self.assertRaises(TimeoutError):
+                manager.register_actions({action: 1 for action in actions})
+            self.assertEqual(manager.executor_mapper, {})
+
+    def test_thread_mode(self):
+        action = get_action('thread_mode_testcase')
+        action.action_function = pid_function
+        action.action_initial_function = initial_function
+
+        manager = ExecutorManager(execute_timeout=0.1)
+        manager.register_action(action, number=2, mode='thread')
+
+        executors = manager.executor_mapper['thread_mode_testcase']
+        self.assertTrue(all(isinstance(executor, ThreadExecutor) for executor in executors))
+        self.assertGreaterEqual(manager.initial_durations['thread_mode_testcase'][0], 0.1)
+
+        with self.subTest('in main process'):
+            futures = manager.submit_batch('thread_mode_testcase', {}, range(4))
+            self.assertEqual([future.get_result(timeout=1) for future in futures], [os.getpid()] * 4)
+
+        with self.subTest('timeout'):
+            action.action_function = sleep_function
+            executor = manager._create_executor(action)
+            with self.assertRaises(TimeoutError):
+                executor.submit({'expend': 0.3}).get_result(timeout=1)
+            self.assertIsNone(executor.submit({'expend': 0}).get_result(timeout=1))
+            executor.exit()
+
+        with self.subTest('unknown mode'):
+            with self.assertRaises(AssertionError):
+                manager.register_action(action, mode='unknown')
+
+        manager.clear()
+
+    def test_plan_workers(self):
+        for name in ['plan_worker_1', 'plan_worker_2', 'plan_worker_other']:
+            get_action(name).action_function = pid_function
+
+        manager = ExecutorManager()
+        manager.register_actions({'plan_worker_1': 1, 'plan_worker_2': 1, 'plan_worker_other': 1})
+        workers = manager.start_plan_workers(2, actions=['plan_worker_1', 'plan_worker_2'])
+        worker_pids = [worker.pid for worker in workers]
+
+        plan = StepPlan()
+        plan.append(Step('plan_worker_1'))
+        plan.append(Step('plan_worker_2', dependency_actions=['plan_worker_1']))
+
+        with self.subTest('whole plan in a worker'):
+            self.assertEqual(manager.plan_mode(plan), 'plan')
+
+            result_mapper = smart_run(plan, executor_manager=manager)
+            self.assertEqual(result_mapper['plan_worker_1'], result_mapper['plan_worker_2'])
+            self.assertIn(result_mapper['plan_worker_1'], worker_pids)
+
+            result_mapper = manager.submit_plan(plan, {}).get_result(timeout=1)
+            self.assertEqual(set(result_mapper), {'plan_worker_1', 'plan_worker_2'})
+
+        with self.subTest('steps out of workers'):
+            plan.append(Step('plan_worker_other', dependency_actions=['plan_worker_2']))
+            self.assertEqual(manager.plan_mode(plan), 'steps')
+
+            result_mapper = smart_run(plan, executor_manager=manager)
+            self.assertEqual(
+                list(result_mapper.values()),
+                [manager.executor_mapper[name][0].pid for name in result_mapper],
+            )
+
+        with self.subTest('stopped'):
+            manager.stop_plan_workers()
+            self.assertEqual(manager.plan_mode(StepPlan.from_spec([('plan_worker_1', ())])), 'steps')
+
+        manager.clear()
+
+    def test_plan_workers_observers(self):
+        get_action('plan_worker_observed').action_function = pid_function
+
+        manager = ExecutorManager()
+        manager.register_action('plan_worker_observed')
+        [register_observer_action(observer, manager) for observer in [PlanWorkerTrueObserver, PlanWorkerFalseObserver]]
+
+        plan = merge_plan([PlanWorkerTrueObserver(), PlanWorkerFalseObserver()])
+
+        for mode in ['steps', 'plan']:
+            with self.subTest(mode):
+                if mode == 'plan':
+                    manager.start_plan_workers(1, actions=plan.names)
+                self.assertEqual(manager.plan_mode(plan), mode)
+
+                # each observer runs its own instance in the worker.
+                result_mapper = smart_run(plan, executor_manager=manager)
+                self.assertEqual(result_mapper['PlanWorkerTrueObserver'][0], (1, True))
+                self.assertEqual(result_mapper['PlanWorkerFalseObserver'][0], (1, False))
+
+        manager.clear()
+
+    def test_routing_policy(self):
+        executors = [MockExecutor(2), MockExecutor(1), MockExecutor(1), MockExecutor(3)]
+
+        with self.subTest('least outstanding'):
+            self.assertIs(route_least_outstanding(executors, 0), executors[1])
+            self.assertIs(route_least_outstanding(executors, 2), executors[2])
+            self.assertIs(route_least_outstanding(executors, 3), executors[1])
+
+        with self.subTest('round robin'):
+            self.assertEqual([route_round_robin(executors, _) for _ in range(5)], [*executors, executors[0]])
+
+        with self.subTest('power of two'):
+            self.assertIsNot(route_power_of_two(executors, 0), executors[3])
+            self.assertIs(route_power_of_two(executors[:1], 0), executors[0])
+
+    def test_submit_batch(self):
+        get_action('routing_testcase').action_function = pid_function
+        manager = ExecutorManager()
+        manager.register_action('routing_testcase', number=3)
+        pids = [executor.pid for executor in manager.executor_mapper['routing_testcase']]
+
+        with self.subTest('spread over replicas'):
+            futures = manager.submit_batch('routing_testcase', {}, range(7))
+            self.assertEqual(sorted(set(future.get_result(timeout=1) for future in futures)), sorted(pids))
+
+            # chunks are contiguous
+            results = [future.get_result(timeout=1) for future in futures]
+            self.assertEqual([len(list(group)) for _, group in itertools.groupby(results)], [3, 2, 2])
+
+        with self.subTest('pinned'):
+            futures = manager.submit_batch('routing_testcase', {}, range(7), worker_id=1)
+            self.assertEqual(set(future.get_result(timeout=1) for future in futures), {pids[1]})
+
+        with self.subTest('outstanding'):
+            self.assertEqual([executor.outstanding for executor in manager.executor_mapper['routing_testcase']],
+                             [0, 0, 0])
+
+        manager.clear()
+
+
+    def test_autoscale_failed_replica(self):
+        global SLOW_INITIAL
+        action = get_action('autoscale_failed_testcase')
+        action.action_function = sleep_function
+        action.action_initial_function = slow_initial_function
+
+        manager = ExecutorManager(initial_timeout=0.2)
+        manager.register_action(action, number=1)
+        manager.set_autoscale_policy('autoscale_failed_testcase', min_number=2, max_number=2, cooldown=0.3)
+
+        SLOW_INITIAL = True
+        try:
+            with self.assertLogs('observer_toolkit.utils._executor', level='ERROR'):
+                self.assertEqual(manager.autoscale(), {})
+            self.assertEqual(len(manager.executor_mapper['autoscale_failed_testcase']), 1)
+
+            # the loop is alive, and retries after the cooldown.
+            handler = ErrorCountHandler(2)
+            logger = logging.getLogger('observer_toolkit.utils._executor')
+            logger.addHandler(handler)
+            try:
+                manager.start_autoscaler(interval=0.05)
+                self.assertTrue(handler.event.wait(timeout=10))
+            finally:
+                logger.removeHandler(handler)
+            self.assertTrue(manager._autoscale_thread.is_alive())
+            self.assertEqual(len(manager.executor_mapper['autoscale_failed_testcase']), 1)
+        finally:
+            SLOW_INITIAL = False
+            manager.stop_autoscaler()
+
+        manager.clear()
+
+    def test_autoscale(self):
+        action = get_action('autoscale_testcase')
+        action.action_function = sleep_function
+        action.action_initial_function = initial_function
+
+        manager = ExecutorManager()
+        manager.register_action(action, number=1)
+        manager.set_autoscale_policy(
+            'autoscale_testcase',
+            min_number=1, max_number=2,
+            scale_up_outstanding=2, scale_down_outstanding=0.5,
+            scale_up_ticks=2, scale_down_ticks=2, cooldown=0,
+        )
+
+        with self.subTest('hysteresis'):
+            futures = manager.submit_batch('autoscale_testcase', {}, [0.2] * 4)
+            self.assertEqual(manager.autoscale(), {})
+
+        with self.subTest('scale up'):
+            self.assertEqual(manager.autoscale(), {'autoscale_testcase': 1})
+            self.assertEqual(len(manager.executor_mapper['autoscale_testcase']), 2)
+
+            # warmed before routed
+            new_executor = manager.executor_mapper['autoscale_testcase'][-1]
+            self.assertTrue(new_executor.is_alive())
+            self.assertEqual(new_executor.name, 'autoscale_testcase_1')
+
+        with self.subTest('max number'):
+            manager.autoscale()
+            manager.autoscale()
+            self.assertEqual(len(manager.executor_mapper['autoscale_testcase']), 2)
+
+        [future.get_result(timeout=2) for future in futures]
+
+        with self.subTest('scale down'):
+            self.assertEqual(manager.autoscale(), {})
+            self.assertEqual(manager.autoscale(), {'autoscale_testcase': -1})
+            self.assertEqual(len(manager.executor_mapper['autoscale_testcase']), 1)
+
+            new_executor.join(timeout=1)
+            self.assertFalse(new_executor.is_alive())
+
+        with self.subTest('min number'):
+            manager.autoscale()
+            manager.autoscale()
+            self.assertEqual(len(manager.executor_mapper['autoscale_testcase']), 1)
+
+        with self.subTest('latency'):
+            manager.set_autoscale_policy('autoscale_testcase', latency_limit=0.05, scale_up_ticks=1, cooldown=0)
+            manager.submit_batch('autoscale_testcase', {}, [0.1])[0].get_result(timeout=1)
+            self.assertEqual(manager.autoscale(), {'autoscale_testcase': 1})
+
+        manager.clear()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,293 @@
+import unittest
+from unittest.mock import patch
+
+import numpy
+
+from observer_toolkit import Step, StepPlan, smart_run
+from observer_toolkit.step import get_action
+from observer_toolkit.utils import ExecutorManager
+from observer_toolkit.utils._executor import SharedArena, SharedObjectStore, SharedObjectHandle, Executor, \
+    collect_handles, resolve_handles
+
+
+def shape_function(**kwargs):
+    return kwargs.get('image').shape
+
+
+def crop_function(**kwargs):
+    return kwargs.get('image')[:200, :200].copy()
+
+
+def check_function(**kwargs):
+    assert isinstance(kwargs.get('crop'), numpy.ndarray)
+    assert isinstance(kwargs.get('result_mapper').get('crop'), numpy.ndarray)
+    return kwargs.get('crop').shape, kwargs.get('shape')
+
+
+def crops_function(**kwargs):
+    return [kwargs.get('image')[:200, index * 100:index * 100 + 200].copy() for index in range(5)]
+
+
+def crops_expend_function(**kwargs):
+    return kwargs.get('crops')
+
+
+def expend_shape_function(**kwargs):
+    assert isinstance(kwargs.get('expend'), numpy.ndarray)
+    return kwargs.get('expend').shape
+
+
+def fill_function(**kwargs):
+    kwargs.get('image')[:] = 0
+
+
+def sum_function(**kwargs):
+    return int(kwargs.get('image').sum())
+
+
+def identity_function(**kwargs):
+    return id(kwargs.get('image'))
+
+
+def echo_image_function(**kwargs):
+    return kwargs.get('image')
+
+
+def compare_function(**kwargs):
+    return bool((kwargs.get('echo_image') == kwargs.get('image_copy')).all())
+
+
+class SharedObjectStoreTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.arena = SharedArena(size=16 * 1024 * 1024)
+        self.store = SharedObjectStore(arena=self.arena, threshold=1024)
+        self.image = numpy.random.randint(0, 255, size=(480, 640, 3), dtype=numpy.uint8)
+
+    def test_put(self):
+        with self.subTest('small object'):
+            self.assertEqual(self.store.put({'name': 'name'}), {'name': 'name'})
+            self.assertEqual(len(self.store), 0)
+
+        with self.subTest('large object'):
+            handle = self.store.put(self.image)
+            self.assertIsInstance(handle, SharedObjectHandle)
+            self.assertGreaterEqual(self.arena.used, self.image.nbytes)
+
+        with self.subTest('same object'):
+            self.assertEqual(self.store.put(self.image), handle)
+
+        with self.subTest('same content'):
+            self.assertEqual(self.store.put(self.image.copy()), handle)
+            self.assertEqual(len(self.store), 1)
+
+        with self.subTest('other content'):
+            self.assertNotEqual(self.store.put(numpy.zeros_like(self.image)), handle)
+            self.assertEqual(len(self.store), 2)
+
+    def test_reference(self):
+        handle = self.store.put(self.image)
+        self.store.acquire(handle)
+
+        self.store.release(handle)
+        self.assertEqual(len(self.store), 1)
+
+        self.store.release(handle)
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.arena.used, 0)
+
+    def test_resolve(self):
+        handle = self.store.put(self.image)
+        parameter = {'image': handle, 'result_mapper': {'image': handle, 'name': 'name'}, 'expend': None}
+
+        self.assertEqual(collect_handles(parameter), [handle])
+
+        resolved = resolve_handles(parameter, self.arena)
+        self.assertTrue(numpy.array_equal(resolved['image'], self.image))
+        self.assertIs(resolved['image'], resolved['result_mapper']['image'])
+        self.assertEqual(resolved['result_mapper']['name'], 'name')
+
+    def test_submit(self):
+        executor = Executor(execute_callback=shape_function, arena=self.arena)
+
+        handle = self.store.put(self.image)
+        future = self.store.submit(executor, {'image': handle})
+        self.store.release(handle)
+
+        self.assertEqual(future.get_result(timeout=1), self.image.shape)
+
+        # the block is freed after the task is finished.
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.arena.used, 0)
+
+        executor.exit()
+
+    def test_smart_run(self):
+        manager = ExecutorManager()
+        for name, function in [('shape', shape_function), ('crop', crop_function), ('check', check_function)]:
+            get_action(name).action_function = function
+            manager.register_action(name)
+
+        plan = StepPlan()
+        plan.append(Step('shape'))
+        plan.append(Step('crop'))
+        plan.append(Step('check', dependency_actions=['shape', 'crop']))
+
+        result_mapper = smart_run(plan, executor_manager=manager, parameter={'image': self.image})
+
+        self.assertEqual(result_mapper['check'], ((200, 200, 3), self.image.shape))
+        self.assertEqual(len(manager.object_store), 0)
+        self.assertEqual(manager.arena.used, 0)
+
+        manager.clear()
+
+    def test_duplicate_content(self):
+        manager = ExecutorManager()
+        for name, function in [('echo_image', echo_image_function), ('compare', compare_function)]:
+            get_action(name).action_function = function
+            manager.register_action(name)
+
+        plan = StepPlan()
+        plan.append(Step('echo_image'))
+        plan.append(Step('compare', dependency_actions=['echo_image']))
+
+        # the same content of two parameters, and a result equal to its input.
+        for _ in range(3):
+            result_mapper = smart_run(plan, executor_manager=manager, parameter={
+                'image': self.image, 'image_copy': self.image.copy(),
+            })
+            self.assertTrue(result_mapper['compare'])
+            self.assertEqual(len(manager.object_store), 0)
+            self.assertEqual(manager.arena.used, 0)
+
+        manager.clear()
+
+    def test_direct_results(self):
+        with self.subTest('executor'):
+            executor = Executor(execute_callback=crop_function, arena=self.arena, direct_results=True)
+
+            handle = executor.submit({'image': self.image}).get_result(timeout=1)
+            self.assertIsInstance(handle, SharedObjectHandle)
+
+            self.store.adopt(handle)
+            self.assertTrue(numpy.array_equal(self.store.get(handle), self.image[:200, :200]))
+            self.assertEqual(collect_handles({'crop': [handle, 'name']}), [handle])
+
+            self.store.release(handle)
+            self.assertEqual(len(self.store), 0)
+
+            executor.exit()
+
+        with self.subTest('smart_run'):
+            manager = ExecutorManager(direct_results=True)
+            for name, function in [('shape', shape_function), ('crop', crop_function), ('check', check_function)]:
+                get_action(name).action_function = function
+                manager.register_action(name)
+
+            plan = StepPlan()
+            plan.append(Step('shape'))
+            plan.append(Step('crop'))
+            plan.append(Step('check', dependency_actions=['shape', 'crop']))
+
+            result_mapper = smart_run(plan, executor_manager=manager, parameter={'image': self.image})
+
+            self.assertEqual(result_mapper['check'], ((200, 200, 3), self.image.shape))
+            self.assertTrue(numpy.array_equal(result_mapper['crop'], self.image[:200, :200]))
+            self.assertEqual(len(manager.object_store), 0)
+            self.assertEqual(manager.arena.used, 0)
+
+            manager.clear()
+
+        with self.subTest('expend over a large result'):
+            get_action('crops').action_function = crops_function
+            crop_shape = get_action('crop_shape')
+            crop_shape.action_function = expend_shape_function
+            crop_shape.step_task_expend_function = crops_expend_function
+            crop_shape.step_merged_flag = True
+
+            manager = ExecutorManager(direct_results=True)
+            manager.register_action('crops')
+            manager.register_action('crop_shape')
+
+            plan = StepPlan()
+            plan.append(Step('crops'))
+            plan.append(Step('crop_shape', dependency_actions=['crops']))
+
+            result_mapper = smart_run(plan, executor_manager=manager, parameter={'image': self.image})
+
+            self.assertEqual(result_mapper['crop_shape'], [(200, 200, 3)] * 5)
+            self.assertEqual(len(result_mapper['crops']), 5)
+            self.assertEqual(len(manager.object_store), 0)
+
+            manager.clear()
+
+    def test_zero_copy_read_only(self):
+        filler = Executor(execute_callback=fill_function, arena=self.arena, zero_copy=True)
+        summer = Executor(execute_callback=sum_function, arena=self.arena, zero_copy=True)
+
+        handle = self.store.put(self.image)
+        with self.assertRaisesRegex(Exception, 'read-only'):
+            self.store.submit(filler, {'image': handle}).get_result(timeout=1)
+        self.assertEqual(self.store.submit(summer, {'image': handle}).get_result(timeout=1), int(self.image.sum()))
+        self.store.release(handle)
+
+        filler.exit()
+        summer.exit()
+
+    def test_reused_buffer(self):
+        # the buffer is reused for the next frame while the handle of the last frame is still referenced.
+        handle = self.store.put(self.image)
+        self.image[:] = 0
+        other_handle = self.store.put(self.image)
+
+        self.assertNotEqual(other_handle, handle)
+        self.assertFalse(resolve_handles({'image': other_handle}, self.arena)['image'].any())
+
+        self.store.release(handle, other_handle)
+
+    def test_thread_mode(self):
+        manager = ExecutorManager()
+        get_action('identity').action_function = identity_function
+        manager.register_action('identity', mode='thread')
+
+        plan = StepPlan()
+        plan.append(Step('identity'))
+
+        # the original object instead of a copy
+        result_mapper = smart_run(plan, executor_manager=manager, parameter={'image': self.image})
+        self.assertEqual(result_mapper['identity'], id(self.image))
+        self.assertEqual(len(manager.object_store), 0)
+
+        manager.clear()
+
+    def test_thread_mode_not_shared(self):
+        manager = ExecutorManager()
+        get_action('identity').action_function = identity_function
+        manager.register_action('identity', mode='thread')
+        shape = get_action('shape')
+        shape.action_function = shape_function
+        shape.action_inputs = ['image']
+        manager.register_action('shape')
+
+        plan = StepPlan()
+        plan.append(Step('identity'))
+
+        with patch.object(manager.object_store, 'put', wraps=manager.object_store.put) as put:
+            with self.subTest('threads only'):
+                smart_run(plan, executor_manager=manager, parameter={'image': self.image})
+                put.assert_not_called()
+
+            with self.subTest('inputs of process'):
+                plan.append(Step('shape'))
+                result_mapper = smart_run(plan, executor_manager=manager, parameter={
+                    'image': self.image, 'other_image': self.image.copy(),
+                })
+                self.assertEqual(result_mapper['shape'], self.image.shape)
+                self.assertEqual(put.call_count, 1)
+
+        shape.action_inputs = None
+        manager.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
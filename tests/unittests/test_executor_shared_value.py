@@ -7,6 +7,8 @@ import pickle
 import random
 from multiprocessing import Value, Array
 
+import numpy
+
 
 class MyTestCase(unittest.TestCase):
 
@@ -39,6 +41,59 @@ class MyTestCase(unittest.TestCase):
         #
         # pickle.loads(sv_bytes)
 
+    def test_shared_value_out_of_band(self):
+        sv = SharedValue(size=4 * 1024 * 1024)
+        image = numpy.random.randint(0, 255, size=(480, 640, 3), dtype=numpy.uint8)
+        obj = {
+            'image': image,
+            'sub_image': image[10:20, 10:20],
+            'random_bytes': os.urandom(1024),
+        }
+
+        sv.set_object(obj)
+
+        with self.subTest('copy'):
+            new_obj = sv.get_object()
+            self.assertTrue(numpy.array_equal(new_obj['image'], image))
+            self.assertTrue(numpy.array_equal(new_obj['sub_image'], image[10:20, 10:20]))
+            self.assertEqual(new_obj['random_bytes'], obj['random_bytes'])
+
+            # copied, not affected by the next set
+            sv.set_object({'image': numpy.zeros_like(image)})
+            self.assertTrue(numpy.array_equal(new_obj['image'], image))
+
+        with self.subTest('zero copy'):
+            sv.set_object(obj)
+            view_obj = sv.get_object(copy=False)
+            self.assertTrue(numpy.array_equal(view_obj['image'], image))
+
+            # read-only view of the shared memory
+            with self.assertRaises(ValueError):
+                view_obj['image'][:] = 0
+
+    def test_shared_value_bytes(self):
+        sv = SharedValue(size=1024)
+        sv.set_object(pickle.dumps({'name': 'name'}))
+        self.assertEqual(sv.get_object(), {'name': 'name'})
+
+    def test_shared_value_spill(self):
+        sv = SharedValue(size=1024)
+        image = numpy.random.randint(0, 255, size=(480, 640, 3), dtype=numpy.uint8)
+
+        with self.subTest('bytes'):
+            pickled = pickle.dumps(os.urandom(2048))
+            sv.set_object(pickled)
+            self.assertEqual(sv.get_object(), pickle.loads(pickled))
+
+        with self.subTest('object'):
+            sv.set_object({'image': image})
+            spilled = sv._get()
+
+            self.assertTrue(numpy.array_equal(sv.get_object(copy=False)['image'], image))
+
+            # the spilled file is removed after loaded
+            self.assertFalse(os.path.exists(pickle.loads(spilled[0]).path))
+
 
 if __name__ == '__main__':
     unittest.main()
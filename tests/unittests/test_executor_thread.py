@@ -1,9 +1,37 @@
 import threading
-import time
 import unittest
 import queue
 
-from observer_toolkit.utils._executor import SharedValue, send_parameter, send_result, ExecutorFuture, ExecutorResult
+from observer_toolkit.utils._executor import SharedValue, SharedRing, send_parameter, send_result, ExecutorFuture, \
+    ExecutorResult, Executor
+
+
+def raise_callback(future):
+    raise ValueError('callback failed')
+
+
+def echo_function(**kwargs):
+    return kwargs.get('i')
+
+
+class CountingQueue(queue.Queue):
+    """queue notifying the number of items got."""
+
+    def __init__(self):
+        super().__init__()
+        self.got_number = 0
+        self.condition = threading.Condition()
+
+    def get(self, *args, **kwargs):
+        item = super().get(*args, **kwargs)
+        with self.condition:
+            self.got_number += 1
+            self.condition.notify_all()
+        return item
+
+    def wait_got(self, number: int, timeout: float = None) -> bool:
+        with self.condition:
+            return self.condition.wait_for(lambda: self.got_number >= number, timeout)
 
 
 class ExecutorTestCase(unittest.TestCase):
@@ -19,104 +47,150 @@ class ExecutorTestCase(unittest.TestCase):
         sv.set_object(obj)
         assert sv.get_object() == obj
 
+    def test_shared_ring(self):
+        ring = SharedRing(depth=4, size=1024 * 1024)
+
+        [ring.put(i) for i in range(4)]
+        self.assertEqual(len(ring), 4)
+
+        with self.subTest('get and release'):
+            self.assertEqual(ring.get(), 0)
+            self.assertEqual(len(ring), 3)
+
+        with self.subTest('get and keep the slot'):
+            self.assertEqual(ring.get(release=False), 1)
+            self.assertEqual(ring.get(release=False), 2)
+            self.assertEqual(len(ring), 3)
+
+            ring.release()
+            ring.release()
+            self.assertEqual(len(ring), 1)
+
+        with self.subTest('wrap around'):
+            [ring.put(i) for i in range(4, 7)]
+            self.assertEqual([ring.get() for _ in range(4)], [3, 4, 5, 6])
+            self.assertEqual(len(ring), 0)
+
+        with self.subTest('release nothing'):
+            with self.assertRaises(AssertionError):
+                ring.release()
+
     def test_send_parameter(self):
-        q = queue.Queue()
-        sv = SharedValue()
-        parameter_ready_event = threading.Event()
-        parameter_received_event = threading.Event()
+        q = CountingQueue()
+        ring = SharedRing(depth=2, size=1024 * 1024)
 
         # put some items and start thread.
         [q.put(i) for i in range(10)]
-        threading.Thread(target=send_parameter, args=(q, sv, parameter_ready_event, parameter_received_event),
-                         daemon=True).start()
+        threading.Thread(target=send_parameter, args=(q, ring), daemon=True).start()
 
         # ----- cycle start -----
-        parameter_ready_event.wait()
-        parameter_ready_event.clear()
+        self.assertEqual(ring.get(release=False), 0)
 
-        self.assertEqual(sv.get_object(), 0)
-        self.assertEqual(q.qsize(), 9)
+        # the ring is full, the third item is taken and blocked in send_parameter.
+        self.assertTrue(q.wait_got(3, timeout=1))
+        self.assertEqual(len(ring), 2)
+        self.assertEqual(q.qsize(), 7)
 
-        parameter_received_event.set()
+        ring.release()
         # ----- cycle end -----
 
         for i in range(1, 10):
-            parameter_ready_event.wait()
-            parameter_ready_event.clear()
+            self.assertEqual(ring.get(release=False), i)
 
-            self.assertEqual(sv.get_object(), i)
-            self.assertEqual(q.qsize(), 9 - i)
+            # the next item is sent after the slot is released.
+            self.assertTrue(q.wait_got(min(i + 3, 10), timeout=1))
+            self.assertEqual(q.qsize(), max(7 - i, 0))
+            self.assertLessEqual(len(ring), 2)
 
-            parameter_received_event.set()
+            ring.release()
+
+        self.assertEqual(q.qsize(), 0)
+        self.assertEqual(len(ring), 0)
 
     def test_send_result_in_executor(self):
         q = queue.Queue()
-        sv = SharedValue()
-        result_ready_event = threading.Event()
-        result_received_event = threading.Event()
+        ring = SharedRing(depth=2, size=1024 * 1024)
 
         # create futures and start thread.
         futures = [ExecutorFuture() for _ in range(10)]
         [q.put(future) for future in futures]
-        threading.Thread(target=send_result, args=(q, sv, result_ready_event, result_received_event),
-                         daemon=True).start()
+        threading.Thread(target=send_result, args=(q, ring), daemon=True).start()
 
         # ----- cycle start -----
 
         # in sub process (executor)
-        sv.set_object(ExecutorResult(result=100 + 0))
-
-        result_ready_event.set()
-
-        result_received_event.wait()
-        result_received_event.clear()
+        ring.put(ExecutorResult(result=100 + 0))
 
         # in other thread.
-        self.assertEqual(futures[0].get_result(), 100 + 0)
+        self.assertEqual(futures[0].get_result(timeout=1), 100 + 0)
         self.assertTrue(futures[0].finished)
 
         # ----- cycle end -----
 
         for i in range(1, 10):
-            sv.set_object(ExecutorResult(result=100 + i))
-
-            result_ready_event.set()
-
-            result_received_event.wait()
-            result_received_event.clear()
+            ring.put(ExecutorResult(result=100 + i))
 
             # in other thread.
-            self.assertEqual(futures[i].get_result(), 100 + i)
+            self.assertEqual(futures[i].get_result(timeout=1), 100 + i)
             self.assertTrue(futures[i].finished)
 
         self.assertTrue(all([future.finished for future in futures]))
 
     def test_send_result_in_main(self):
         q = queue.Queue()
-        sv = SharedValue()
-        result_ready_event = threading.Event()
-        result_received_event = threading.Event()
+        ring = SharedRing(depth=2, size=1024 * 1024)
 
         # create futures and start thread.
         futures = [ExecutorFuture() for _ in range(10)]
         [q.put(future) for future in futures]
-        threading.Thread(target=send_result, args=(q, sv, result_ready_event, result_received_event),
-                         daemon=True).start()
+        threading.Thread(target=send_result, args=(q, ring), daemon=True).start()
 
         # simulate executor
         def executor_simulator():
-            for i in range(100):
-                sv.set_object(i + 100)
-                result_ready_event.set()
-                result_received_event.wait()
-                result_received_event.clear()
+            for i in range(10):
+                ring.put(ExecutorResult(result=i + 100))
 
         threading.Thread(target=executor_simulator, daemon=True).start()
 
-        time.sleep(0.001)
+        [future.get_result(timeout=1) for future in futures]
         self.assertTrue(all([future.finished for future in futures]))
 
+    def test_future_done_callback(self):
+        future = ExecutorFuture()
+        results = []
+
+        with self.subTest('called when the result is set'):
+            # the result is available in callback, before the waiters are notified.
+            future.add_done_callback(lambda f: results.append((f.finished, f.get_result(timeout=0))))
+            self.assertEqual(results, [])
+
+            future.set_result(ExecutorResult(result=100))
+            self.assertEqual(results, [(False, 100)])
+
+        with self.subTest('called at once when finished'):
+            future.add_done_callback(lambda f: results.append((f.finished, f.get_result(timeout=0))))
+            self.assertEqual(results[-1], (True, 100))
+
+        with self.subTest('failed callback'):
+            future = ExecutorFuture()
+            future.add_done_callback(raise_callback)
+            future.add_done_callback(lambda f: results.append(f.get_result(timeout=0)))
+
+            with self.assertLogs('observer_toolkit.utils._executor', level='ERROR'):
+                future.set_result(ExecutorResult(result=200))
+            self.assertEqual(results[-1], 200)
+            self.assertTrue(future.finished)
+
+        with self.subTest('failed callback in executor'):
+            executor = Executor(execute_callback=echo_function)
+
+            future = executor.submit({'i': 1})
+            future.add_done_callback(raise_callback)
+            self.assertEqual(future.get_result(timeout=1), 1)
 
+            # the send_result thread is alive.
+            self.assertEqual(executor.submit({'i': 2}).get_result(timeout=1), 2)
+            executor.exit()
 
 
 if __name__ == '__main__':
@@ -1,7 +1,15 @@
+import threading
+import time
 import unittest
+
+import numpy
 from unittest.mock import MagicMock
 
-from observer_toolkit import Observer, Step
+from observer_toolkit import Observer, ObserverHost, Step, StepPlan, merge_plan, smart_run, create_dispatcher
+from observer_toolkit.observer import OBSERVER_HOST_NAME, SlidingWindowDeque, SlidingWindowArray
+from observer_toolkit.step import get_action, update_action_generation
+from observer_toolkit.utils import ExecutorManager
+from observer_toolkit.utils.libs import register_observer_host
 
 
 class TestObserver(Observer):
@@ -35,6 +43,90 @@ class TestObserver3(Observer):
     trigger_callback = trigger_callback
 
 
+class TestObserver4(Observer):
+    steps = [
+        Step('step_3'),
+    ]
+
+    receive_action_names = ['step_2', 'step_3', 'step_missing']
+
+
+def host_echo_function(**kwargs):
+    return kwargs.get('stream_id')
+
+
+def count_judge_callback(**kwargs):
+    observer = kwargs.get('ob')
+    observer.count = getattr(observer, 'count', 0) + 1
+    return True
+
+
+def count_trigger_callback(**kwargs):
+    return kwargs.get('stream_id'), kwargs.get('ob').count
+
+
+class HostObserver(Observer):
+    steps = [
+        Step('observer_host_echo'),
+    ]
+
+    trigger_cache_length = 1
+
+    judge_callback = count_judge_callback
+    trigger_callback = count_trigger_callback
+
+
+def score_batch_judge_callback(observers, parameters, batch_score):
+    return batch_score > 0.5
+
+
+def stream_trigger_callback(**kwargs):
+    return kwargs.get('stream_id')
+
+
+class BatchObserver(Observer):
+    steps = [
+        Step('batch_score'),
+    ]
+
+    trigger_cache_length = 2
+    trigger_rate = 1
+
+    batch_judge_callback = score_batch_judge_callback
+    trigger_callback = stream_trigger_callback
+
+
+def pair_judge_callback(**kwargs):
+    kwargs.get('ob').pairs.append((kwargs.get('pipeline_a'), kwargs.get('pipeline_b')))
+    return True
+
+
+class PipelineObserver(Observer):
+    steps = [
+        Step('pipeline_a'),
+        Step('pipeline_b'),
+    ]
+
+    judge_callback = pair_judge_callback
+    trigger_callback = trigger_callback
+
+
+PIPELINE_OBSERVER = PipelineObserver()
+PIPELINE_OBSERVER.pairs = []
+PIPELINE_OBSERVER_LOCK = threading.Lock()
+
+
+def pipeline_function(name):
+    def _inner_pipeline_function(**kwargs):
+        # the results of a frame reach the observer at different times.
+        time.sleep(kwargs.get(f'{name}_delay'))
+        with PIPELINE_OBSERVER_LOCK:
+            PIPELINE_OBSERVER.judge({'frame_id': kwargs.get('frame_id'), name: kwargs.get('i')})
+        return kwargs.get('frame_id')
+
+    return _inner_pipeline_function
+
+
 class ObserverTestCase(unittest.TestCase):
 
     def test_observer_initial(self):
@@ -51,6 +143,57 @@ class ObserverTestCase(unittest.TestCase):
             for _ in TestObserver2().plan.walk():
                 print(_)
 
+    def test_sliding_window(self):
+        window = SlidingWindowDeque(maxlen=4, ewma_alpha=0.5, time_window=0.2)
+
+        with self.subTest('rate'):
+            [window.append(_) for _ in [True, True, False, True, True, True]]
+            self.assertEqual(list(window), [False, True, True, True])
+            self.assertEqual(window.get_rate(), 0.75)
+
+        with self.subTest('runs'):
+            self.assertEqual(window.current_run, 3)
+            self.assertEqual(window.longest_run, 3)
+
+            window.append(False)
+            self.assertEqual(window.current_run, 0)
+            self.assertEqual(window.longest_run, 3)
+
+        with self.subTest('ewma'):
+            self.assertAlmostEqual(window.ewma, 0.4609375)
+
+        with self.subTest('time window'):
+            self.assertAlmostEqual(window.get_time_rate(), 0.71)
+            time.sleep(0.25)
+            window.append(True)
+            self.assertEqual(window.get_time_rate(), 1)
+
+        with self.subTest('refill'):
+            window.refill(True)
+            self.assertEqual(list(window), [True] * 4)
+            self.assertEqual(window.get_rate(), 1)
+
+            window.clear()
+            window.append(True)
+            self.assertEqual(list(window), [False, False, False, True])
+            self.assertEqual((window.get_rate(), window.current_run, window.longest_run), (0.25, 1, 1))
+            self.assertEqual(window.get_time_rate(), 1)
+
+    def test_sliding_window_array(self):
+        window_array = SlidingWindowArray(maxlen=3, ewma_alpha=0.5)
+        rows = [window_array.add_row() for _ in range(3)]
+
+        window_array.append(rows, [True, False, True])
+        window_array.append(rows[:2], [True, True])
+        self.assertEqual(window_array.get_rates(rows).tolist(), [0.67, 0.33, 0.33])
+        self.assertEqual(window_array.current_runs[rows].tolist(), [2, 1, 1])
+        self.assertEqual(window_array.ewmas[rows].tolist(), [0.75, 0.5, 0.5])
+
+        with self.subTest('reuse row'):
+            window_array.remove_row(rows[0])
+            self.assertEqual(window_array.add_row(), rows[0])
+            self.assertEqual(window_array.get_rates(rows).tolist(), [0, 0.33, 0.33])
+
     def test_judge(self):
         observer = TestObserver()
         mock = MagicMock()
@@ -63,6 +206,45 @@ class ObserverTestCase(unittest.TestCase):
         observer.judge({'step_1': 'content'})
         mock.assert_called_once()
 
+    def test_frame_buffer(self):
+        observer = TestObserver2()
+        mock = MagicMock(return_value=True)
+        observer.judge_callback = mock
+
+        with self.subTest('concurrent frames'):
+            self.assertEqual(observer.judge({'frame_id': 1, 'step_1': 'frame_1'}), (0, None))
+            self.assertEqual(observer.judge({'frame_id': 2, 'step_1': 'frame_2'}), (0, None))
+
+            observer.judge({'frame_id': 2, 'step_2': 'frame_2'})
+            self.assertEqual(mock.call_args.kwargs['step_1'], 'frame_2')
+
+            observer.judge({'frame_id': 1, 'step_2': 'frame_1'})
+            self.assertEqual(mock.call_args.kwargs['step_1'], 'frame_1')
+            self.assertEqual(len(observer.frame_buffer_mapper), 0)
+
+        with self.subTest('pending arrays are copied'):
+            frame_buffer = numpy.ones(4)
+            observer.judge({'frame_id': 4, 'step_1': frame_buffer})
+            frame_buffer[:] = 0
+
+            observer.judge({'frame_id': 4, 'step_2': 'frame_4'})
+            self.assertTrue(mock.call_args.kwargs['step_1'].all())
+
+        with self.subTest('evict by number'):
+            observer.result_buffer_frames = 2
+            [observer.judge({'frame_id': frame_id, 'step_1': frame_id}) for frame_id in range(3)]
+
+            self.assertEqual(list(observer.frame_buffer_mapper), [1, 2])
+            self.assertEqual(observer.evicted_frame_count, 1)
+
+        with self.subTest('evict by timeout'):
+            observer.result_buffer_timeout = 0.05
+            time.sleep(0.1)
+            observer.judge({'frame_id': 3, 'step_1': 3})
+
+            self.assertEqual(list(observer.frame_buffer_mapper), [3])
+            self.assertEqual(observer.evicted_frame_count, 3)
+
     def test_trigger(self):
         observer = TestObserver()
         mock = MagicMock()
@@ -109,6 +291,199 @@ class ObserverTestCase(unittest.TestCase):
 
         mock.assert_called_once()
 
+    def test_merge_plan(self):
+        observers = [TestObserver(), TestObserver2()]
+
+        plan = merge_plan(observers)
+        self.assertEqual(plan.names, ['step_1', 'step_2', 'TestObserver', 'TestObserver2'])
+
+        with self.subTest('dependencies'):
+            compiled_plan = plan.compile()
+            self.assertEqual(compiled_plan.dependencies[compiled_plan.name_index['TestObserver']], (0,))
+            self.assertEqual(compiled_plan.dependencies[compiled_plan.name_index['TestObserver2']], (0, 1))
+
+        with self.subTest('receive_action_names'):
+            observer = TestObserver4()
+            self.assertEqual(observer.receive_action_names, ['step_2', 'step_3', 'step_missing'])
+
+            # missing actions are not dependencies.
+            compiled_plan = merge_plan([*observers, observer]).compile()
+            self.assertEqual(
+                {compiled_plan.names[_] for _ in compiled_plan.dependencies[compiled_plan.name_index['TestObserver4']]},
+                {'step_2', 'step_3'},
+            )
+
+        with self.subTest('cached'):
+            self.assertIs(merge_plan(observers), plan)
+            self.assertIs(merge_plan(list(observers)), plan)
+            self.assertIsNot(merge_plan(observers, observer_action=False), plan)
+
+        with self.subTest('ready status'):
+            observers[1].ready_status = False
+            not_ready_plan = merge_plan(observers)
+            self.assertEqual(not_ready_plan.names, ['step_1', 'TestObserver'])
+
+            observers[1].ready_status = True
+            self.assertIs(merge_plan(observers), plan)
+
+        with self.subTest('other observers'):
+            self.assertIsNot(merge_plan([TestObserver(), TestObserver2()]), plan)
+
+        with self.subTest('actions re-detected'):
+            update_action_generation()
+            self.assertIsNot(merge_plan(observers), plan)
+
+
+    def test_observer_host(self):
+        host = ObserverHost([HostObserver, TestObserver])
+
+        with self.subTest('observers of streams'):
+            result = host.do_action({'stream_id': 'cam_1', 'observer_host_echo': 'cam_1'})
+            self.assertEqual(result['HostObserver'], ((1, True), (1, ('cam_1', 1))))
+            self.assertEqual(result['TestObserver'], ((0, None), (0, None)))
+
+            host.do_action({'stream_id': 'cam_2', 'observer_host_echo': 'cam_2'})
+            result = host.do_action({'stream_id': 'cam_1', 'observer_host_echo': 'cam_1'})
+            self.assertEqual(result['HostObserver'][1], (1, ('cam_1', 2)))
+            self.assertEqual(len(host), 4)
+
+        with self.subTest('add and remove'):
+            host.add('cam_3', HostObserver())
+            self.assertEqual(list(host.get_observers('cam_3')), ['HostObserver'])
+
+            host.remove('cam_1', 'TestObserver')
+            host.remove('cam_2')
+            self.assertEqual(len(host), 2)
+
+        with self.subTest('merge plan'):
+            plan = merge_plan([HostObserver(), TestObserver()], observer_host=OBSERVER_HOST_NAME)
+            self.assertEqual(plan.names, ['observer_host_echo', 'step_1', OBSERVER_HOST_NAME])
+
+    def test_observer_host_batch(self):
+        host = ObserverHost([BatchObserver, TestObserver])
+
+        results = host.do_batch([
+            {'stream_id': 'cam_0', 'batch_score': 0.9},
+            {'stream_id': 'cam_1', 'batch_score': 0.1},
+            {'stream_id': 'cam_0', 'batch_score': 0.8},
+        ])
+
+        self.assertEqual([result['BatchObserver'] for result in results], [
+            ((1, True), (0, None)),
+            ((1, False), (0, None)),
+            ((1, True), (1, 'cam_0')),
+        ])
+        self.assertEqual(results[0]['TestObserver'], ((0, None), (0, None)))
+
+        with self.subTest('windows in array'):
+            window_array = host.window_array_mapper['BatchObserver']
+            self.assertEqual(window_array.true_counts[:2].tolist(), [0, 0])
+            self.assertIs(host.get_observers('cam_1')['BatchObserver'].judge_window.window_array, window_array)
+
+        with self.subTest('do_action'):
+            self.assertEqual(host.do_action({'stream_id': 'cam_1', 'batch_score': 0.7})['BatchObserver'][0], (1, True))
+
+        with self.subTest('batch judge error'):
+            status = host.do_action({'stream_id': 'cam_1', 'batch_score': None})['BatchObserver']
+            self.assertEqual(status[0][0], -1)
+
+        with self.subTest('trigger rate of observer'):
+            observer = BatchObserver()
+            observer.trigger_rate = 0.5
+            host.add('cam_2', observer)
+
+            # triggered by the half of window instead of the whole one of class.
+            result = host.do_action({'stream_id': 'cam_2', 'batch_score': 0.9})
+            self.assertEqual(result['BatchObserver'], ((1, True), (1, 'cam_2')))
+
+        with self.subTest('time window'):
+            observer = BatchObserver()
+            observer.trigger_time_window = 1
+            with self.assertRaises(AssertionError):
+                host.add('cam_3', observer)
+
+    def test_observer_host_executor(self):
+        get_action('observer_host_echo').action_function = host_echo_function
+
+        manager = ExecutorManager()
+        manager.register_action('observer_host_echo')
+        register_observer_host([HostObserver], executor_manger=manager, number=2)
+
+        plan = StepPlan()
+        plan.append(Step('observer_host_echo'))
+        plan.append(Step(OBSERVER_HOST_NAME, dependency_actions=['observer_host_echo']))
+
+        # the frames of a stream are sent to the same replica.
+        for count in range(1, 4):
+            for stream_id in ['cam_1', 'cam_2']:
+                result_mapper = smart_run(plan, executor_manager=manager, parameter={'stream_id': stream_id})
+                self.assertEqual(result_mapper[OBSERVER_HOST_NAME]['HostObserver'][1], (1, (stream_id, count)))
+
+        manager.clear()
+
+    def test_observer_pipeline_frames(self):
+        manager = ExecutorManager()
+        for name in ['pipeline_a', 'pipeline_b']:
+            get_action(name).action_function = pipeline_function(name)
+            manager.register_action(name, mode='thread')
+
+        plan = StepPlan()
+        plan.append(Step('pipeline_a'))
+        plan.append(Step('pipeline_b'))
+
+        def dispatch_func():
+            # the results of frames are interleaved.
+            for i in range(6):
+                yield {'i': i, 'pipeline_a_delay': 0.05 * (i % 2), 'pipeline_b_delay': 0.05 * (1 - i % 2), 'plan': plan}
+            yield None
+
+        frames = dispatch_func()
+        results = []
+        dispatcher = create_dispatcher(
+            dispatch_callback=lambda: next(frames),
+            executor_manager=manager,
+            finish_callback=results.append,
+            base_cycle=0,
+            pipeline_frames=4,
+        )
+        dispatcher.join(timeout=5)
+
+        with self.subTest('frame ids'):
+            self.assertEqual(len({result['pipeline_a'] for result in results}), 6)
+            self.assertEqual([result['pipeline_a'] for result in results], [result['pipeline_b'] for result in results])
+
+        with self.subTest('results of frame judged together'):
+            self.assertEqual(sorted(PIPELINE_OBSERVER.pairs), [(i, i) for i in range(6)])
+            self.assertEqual(len(PIPELINE_OBSERVER.frame_buffer_mapper), 0)
+
+        manager.clear()
+
+    def test_observer_host_micro_batch(self):
+        manager = ExecutorManager()
+        register_observer_host([BatchObserver], executor_manger=manager, name='batch_observer_host',
+                               batch_size=4, batch_delay=1)
+        executor = manager.executor_mapper['batch_observer_host'][0]
+
+        with self.subTest('frames of streams in one call'):
+            futures = [
+                executor.submit({'stream_id': f'cam_{index}', 'batch_score': 0.2 * index})
+                for index in range(4)
+            ]
+            results = [future.get_result() for future in futures]
+
+            self.assertEqual([result['BatchObserver'][0] for result in results],
+                             [(1, False), (1, False), (1, False), (1, True)])
+            self.assertEqual(len({future._result.start_time for future in futures}), 1)
+
+        with self.subTest('frame of plan'):
+            plan = StepPlan()
+            plan.append(Step('batch_observer_host'))
+
+            result_mapper = smart_run(plan, executor_manager=manager, parameter={'stream_id': 'cam_3', 'batch_score': 0.9})
+            self.assertEqual(result_mapper['batch_observer_host']['BatchObserver'][0], (1, True))
+
+        manager.clear()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,267 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from observer_toolkit import Step, StepPlan, smart_run, smart_submit, create_dispatcher, async_smart_run, \
+    async_dispatch
+from observer_toolkit.step import get_action
+from observer_toolkit.utils import ExecutorManager
+
+
+def iter_function(**kwargs):
+    return list(range(kwargs.get('number', 5)))
+
+
+def sub_function(**kwargs):
+    return kwargs.get('expend') + 100
+
+
+def sub_expend_function(**kwargs):
+    return kwargs.get('smart_run_iter')
+
+
+def sum_function(**kwargs):
+    return sum(kwargs.get('smart_run_sub'))
+
+
+def slow_function(**kwargs):
+    time.sleep(kwargs.get('delay', 0.3))
+    return time.time()
+
+
+def time_function(**kwargs):
+    return time.time()
+
+
+def span_function(**kwargs):
+    start_time = time.time()
+    time.sleep(kwargs.get('delay', 0))
+    return kwargs.get('i'), start_time, time.time()
+
+
+def echo_function(**kwargs):
+    if kwargs.get('fail'):
+        raise ValueError('failed frame')
+    time.sleep(kwargs.get('delay', 0))
+    return kwargs.get('i')
+
+
+class SmartRunTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        get_action('smart_run_iter').action_function = iter_function
+
+        sub = get_action('smart_run_sub')
+        sub.action_function = sub_function
+        sub.step_task_expend_function = sub_expend_function
+        sub.step_merged_flag = True
+
+        get_action('smart_run_sum').action_function = sum_function
+
+        get_action('smart_run_slow').action_function = slow_function
+        get_action('smart_run_fast').action_function = time_function
+        get_action('smart_run_fast_child').action_function = time_function
+        get_action('smart_run_echo').action_function = echo_function
+        get_action('smart_run_span').action_function = span_function
+
+        cls.manager = ExecutorManager()
+        cls.manager.register_actions({**{name: 1 for name in [
+            'smart_run_iter', 'smart_run_sub', 'smart_run_sum', 'smart_run_slow', 'smart_run_fast',
+            'smart_run_fast_child',
+        ]}, 'smart_run_echo': 4, 'smart_run_span': 4})
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.manager.clear()
+
+    def setUp(self) -> None:
+        self.plan = StepPlan()
+        self.plan.append(Step('smart_run_iter'))
+        self.plan.append(Step('smart_run_sub', dependency_actions=['smart_run_iter']))
+        self.plan.append(Step('smart_run_sum', dependency_actions=['smart_run_sub']))
+
+    def wait_idle(self, action_name: str, timeout: float = 5) -> None:
+        """wait for the tasks of action left by the timeout steps."""
+        deadline = time.time() + timeout
+        while any(executor.outstanding for executor in self.manager.executor_mapper[action_name]):
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+    def test_smart_run(self):
+        result_mapper = smart_run(self.plan, executor_manager=self.manager, parameter={'number': 3})
+
+        self.assertEqual(result_mapper, {
+            'smart_run_iter': [0, 1, 2],
+            'smart_run_sub': [100, 101, 102],
+            'smart_run_sum': 303,
+        })
+
+    def test_smart_run_empty_expend(self):
+        result_mapper = smart_run(self.plan, executor_manager=self.manager, parameter={'number': 0})
+
+        self.assertEqual(result_mapper['smart_run_sub'], [])
+        self.assertEqual(result_mapper['smart_run_sum'], 0)
+
+    def test_smart_run_eager(self):
+        plan = StepPlan()
+        plan.append(Step('smart_run_slow'))
+        plan.append(Step('smart_run_fast'))
+        plan.append(Step('smart_run_fast_child', dependency_actions=['smart_run_fast']))
+
+        with self.subTest('not stalled by the slow sibling'):
+            result_mapper = smart_run(plan, executor_manager=self.manager)
+            self.assertEqual(set(result_mapper), {'smart_run_slow', 'smart_run_fast', 'smart_run_fast_child'})
+            self.assertLess(result_mapper['smart_run_fast_child'], result_mapper['smart_run_slow'])
+
+        with self.subTest('timeout of step'):
+            with self.assertRaises(AssertionError):
+                smart_run(plan, executor_manager=self.manager, timeout=0.1)
+
+            self.wait_idle('smart_run_slow')
+            self.assertIn('smart_run_slow', smart_run(plan, executor_manager=self.manager, parameter={'delay': 0}))
+
+    def test_pipeline(self):
+        plan = StepPlan()
+        plan.append(Step('smart_run_echo'))
+        plan.append(Step('smart_run_span'))
+
+        def dispatch_func():
+            for i in range(8):
+                yield {'i': i, 'delay': 0.2 if i % 2 == 0 else 0, 'fail': i == 5, 'plan': plan}
+            yield None
+
+        frames = dispatch_func()
+        results = []
+        spans = {}
+
+        def finish_callback(result_mapper):
+            results.append(result_mapper['smart_run_echo'])
+            index, start_time, end_time = result_mapper['smart_run_span']
+            spans[index] = start_time, end_time
+
+        dispatcher = create_dispatcher(
+            dispatch_callback=lambda: next(frames),
+            executor_manager=self.manager,
+            finish_callback=finish_callback,
+            base_cycle=0,
+            pipeline_frames=4,
+        )
+        dispatcher.join(timeout=5)
+
+        with self.subTest('in order, without failed frame'):
+            self.assertEqual(results, [0, 1, 2, 3, 4, 6, 7])
+
+        with self.subTest('frames in flight'):
+            # the next frames start before the slow one is finished.
+            self.assertLess(spans[1][0], spans[0][1])
+            self.assertLess(spans[2][0], spans[0][1])
+
+    def test_smart_submit(self):
+        with self.subTest('result mapper'):
+            future = smart_submit(self.plan, executor_manager=self.manager, parameter={'number': 3})
+            self.assertEqual(future.get_result(timeout=2), {
+                'smart_run_iter': [0, 1, 2],
+                'smart_run_sub': [100, 101, 102],
+                'smart_run_sum': 303,
+            })
+
+        with self.subTest('frames in flight without threads'):
+            plan = StepPlan()
+            plan.append(Step('smart_run_echo'))
+
+            thread_number = threading.active_count()
+            results = []
+            done_event = threading.Event()
+
+            def done_callback(_future):
+                results.append(_future.get_result()['smart_run_echo'])
+                if len(results) == 100:
+                    done_event.set()
+
+            for i in range(100):
+                smart_submit(plan, executor_manager=self.manager, parameter={'i': i}).add_done_callback(done_callback)
+            self.assertLessEqual(threading.active_count(), thread_number + 1)
+
+            self.assertTrue(done_event.wait(timeout=5))
+            self.assertEqual(sorted(results), list(range(100)))
+
+        with self.subTest('timeout of step'):
+            plan = StepPlan()
+            plan.append(Step('smart_run_slow'))
+
+            future = smart_submit(plan, executor_manager=self.manager, parameter={'delay': 1}, timeout=0.1)
+            with self.assertRaises(AssertionError):
+                future.get_result(timeout=5)
+
+            # the future is failed before the slow step is finished.
+            self.assertEqual(self.manager.executor_mapper['smart_run_slow'][0].outstanding, 1)
+            self.wait_idle('smart_run_slow')
+
+    def test_async_smart_run(self):
+        async def main():
+            return await asyncio.gather(*[
+                async_smart_run(self.plan, executor_manager=self.manager, parameter={'number': number})
+                for number in range(4)
+            ])
+
+        self.assertEqual(
+            [result_mapper['smart_run_sum'] for result_mapper in asyncio.run(main())],
+            [0, 100, 201, 303],
+        )
+
+    def test_async_dispatch(self):
+        plan = StepPlan()
+        plan.append(Step('smart_run_echo'))
+
+        async def frames():
+            for i in range(20):
+                await asyncio.sleep(0)
+                yield {'i': i, 'fail': i == 5, 'plan': plan}
+
+        results = []
+
+        async def finish_callback(result_mapper):
+            await asyncio.sleep(0)
+            results.append(result_mapper['smart_run_echo'])
+
+        asyncio.run(async_dispatch(
+            frames(), executor_manager=self.manager, finish_callback=finish_callback, max_frames=4,
+        ))
+        self.assertEqual(sorted(results), [i for i in range(20) if i != 5])
+
+    def test_fused_steps(self):
+        with self.subTest('intermediate result is not returned'):
+            self.plan.fuse('smart_run_iter', 'smart_run_sub')
+            self.assertEqual(self.manager.register_fused(self.plan), ['smart_run_iter+smart_run_sub[smart_run_sub]'])
+
+            result_mapper = smart_run(self.plan, executor_manager=self.manager, parameter={'number': 3})
+            self.assertEqual(result_mapper, {'smart_run_sub': [100, 101, 102], 'smart_run_sum': 303})
+
+        with self.subTest('linear chains'):
+            plan = StepPlan(self.plan)
+            plan.fuse_linear_chains()
+            self.manager.register_fused(plan)
+
+            result_mapper = smart_run(plan, executor_manager=self.manager, parameter={'number': 4})
+            self.assertEqual(result_mapper, {'smart_run_sum': 406})
+
+        with self.subTest('same chain with other outputs'):
+            # the first plan returns the intermediate result.
+            plan = StepPlan(self.plan)
+            plan.fuse('smart_run_iter', 'smart_run_sub', outputs=['smart_run_iter', 'smart_run_sub'])
+            self.manager.register_fused(plan)
+
+            other_plan = StepPlan(self.plan)
+            other_plan.fuse('smart_run_iter', 'smart_run_sub')
+            self.manager.register_fused(other_plan)
+
+            result_mapper = smart_run(plan, executor_manager=self.manager, parameter={'number': 2})
+            self.assertEqual(result_mapper['smart_run_iter'], [0, 1])
+            result_mapper = smart_run(other_plan, executor_manager=self.manager, parameter={'number': 2})
+            self.assertEqual(result_mapper, {'smart_run_sub': [100, 101], 'smart_run_sum': 201})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -39,6 +39,17 @@ class StepTestCase(unittest.TestCase):
         self.assertIs(action_update_1.action_function, action_update_2.action_function)
         self.assertIs(action_update_2.action_function, action_function)
 
+    def test_action_inputs(self):
+        action = get_action('inputs_testcase')
+        parameter = {'image': 'image', 'other': 'other', 'expend': 'expend'}
+
+        with self.subTest('not declared'):
+            self.assertEqual(action.select_inputs(parameter), parameter)
+
+        with self.subTest('declared'):
+            action.action_inputs = ['image', 'missing']
+            self.assertEqual(action.select_inputs(parameter), {'image': 'image', 'expend': 'expend'})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -39,5 +39,102 @@ class StepPlanTestCase(unittest.TestCase):
         # id
         self.assertEqual(list(plan.walk()), list(plan.walk()))
 
+    def test_compile(self):
+        plan = StepPlan()
+        plan.append(Step('compile_1'))
+        plan.append(Step('compile_2_1', dependency_actions=['compile_1', 'compile_2']))
+        plan.append(Step('compile_2', dependency_actions=['compile_1']))
+        plan.append(Step('compile_0'))
+        plan.append(Step('compile_isolated', dependency_actions=['compile_missing']))
+        plan.append(Step('compile_cycle_1', dependency_actions=['compile_cycle_2']))
+        plan.append(Step('compile_cycle_2', dependency_actions=['compile_cycle_1', 'compile_1']))
+
+        compiled_plan = plan.compile()
+
+        with self.subTest('levels'):
+            self.assertEqual(
+                [[step.name for step in level] for level in compiled_plan.levels],
+                [['compile_1', 'compile_0'], ['compile_2'], ['compile_2_1']],
+            )
+            self.assertEqual(compiled_plan.names, ['compile_1', 'compile_0', 'compile_2', 'compile_2_1'])
+            self.assertEqual(plan.walk(), compiled_plan.levels)
+
+        with self.subTest('adjacency'):
+            self.assertEqual(compiled_plan.index('compile_2_1'), 3)
+            self.assertEqual(compiled_plan.dependencies[3], (0, 2))
+            self.assertEqual(compiled_plan.dependents[0], (2, 3))
+            self.assertEqual(compiled_plan.dependents[1], ())
+
+        with self.subTest('immutable and hashable'):
+            self.assertEqual(hash(compiled_plan), hash(plan.compile()))
+            with self.assertRaises(AttributeError):
+                compiled_plan.steps = ()
+
+        with self.subTest('cached'):
+            self.assertIs(plan.compile(), compiled_plan)
+
+        with self.subTest('invalidated by mutation'):
+            plan.append(Step('compile_missing'))
+            self.assertIn('compile_isolated', plan.compile().names)
+
+            plan.remove(plan[plan.name_index['compile_missing']])
+            self.assertNotIn('compile_isolated', plan.compile().names)
+            self.assertEqual(plan.names[-1], 'compile_cycle_2')
+
+            plan.append(Step('compile_2', dependency_actions=['compile_0']))
+            self.assertEqual(plan.compile().dependencies[plan.compile().index('compile_2')], (0, 1))
+
+        with self.subTest('invalidated manually'):
+            plan[plan.name_index['compile_0']].dependency_actions.add(get_action('compile_1'))
+            plan.invalidate()
+            self.assertEqual([len(level) for level in plan.walk()], [1, 1, 1, 1])
+
+    def test_fuse(self):
+        plan = StepPlan()
+        plan.append(Step('fuse_1'))
+        plan.append(Step('fuse_2', dependency_actions=['fuse_1']))
+        plan.append(Step('fuse_3', dependency_actions=['fuse_2']))
+        plan.append(Step('fuse_4', dependency_actions=['fuse_3', 'fuse_other']))
+        plan.append(Step('fuse_other'))
+        plan.append(Step('fuse_other_1', dependency_actions=['fuse_other']))
+
+        with self.subTest('linear chains'):
+            self.assertEqual(plan.compile().linear_chains(), [['fuse_1', 'fuse_2', 'fuse_3']])
+
+        with self.subTest('fused'):
+            plan.fuse('fuse_2', 'fuse_3')
+            compiled_plan = plan.compile()
+
+            self.assertEqual(compiled_plan.names, ['fuse_1', 'fuse_other', 'fuse_2+fuse_3[fuse_3]', 'fuse_other_1', 'fuse_4'])
+            self.assertEqual(get_action('fuse_2+fuse_3[fuse_3]').fused_outputs, ['fuse_3'])
+            self.assertEqual(compiled_plan.dependencies[compiled_plan.index('fuse_4')], (1, 2))
+
+            # steps are not changed
+            self.assertEqual(plan.names, ['fuse_1', 'fuse_2', 'fuse_3', 'fuse_4', 'fuse_other', 'fuse_other_1'])
+
+        with self.subTest('fused twice'):
+            with self.assertRaises(AssertionError):
+                plan.fuse('fuse_1', 'fuse_2')
+
+        with self.subTest('fuse linear chains'):
+            self.assertEqual(plan.fuse_linear_chains(), [])
+
+            plan = StepPlan(plan)
+            self.assertEqual(plan.fuse_linear_chains(), [['fuse_1', 'fuse_2', 'fuse_3']])
+            self.assertIn('fuse_1+fuse_2+fuse_3[fuse_3]', plan.compile().names)
+
+        with self.subTest('outputs'):
+            plan = StepPlan(plan)
+            plan.fuse('fuse_1', 'fuse_other_1')
+            plan.compile()
+            self.assertEqual(get_action('fuse_1+fuse_other_1[fuse_1,fuse_other_1]').fused_outputs, ['fuse_1', 'fuse_other_1'])
+
+        with self.subTest('depend on each other by other steps'):
+            plan = StepPlan(plan)
+            plan.fuse('fuse_1', 'fuse_3')
+            with self.assertRaises(ValueError):
+                plan.compile()
+
+
 if __name__ == '__main__':
     unittest.main()